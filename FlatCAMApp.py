@@ -1,5 +1,6 @@
 import Tkinter
 import getopt
+import glob
 import os
 import random
 import time  # Just used for debugging. Double check before removing.
@@ -22,6 +23,7 @@ from FlatCAMProcess import *
 from FlatCAMWorkerStack import WorkerStack
 from MeasurementTool import Measurement
 from DblSidedTool import DblSidedTool
+from FlatCAMParseCache import ParseCache, parse_file_encoded
 from multiprocessing import Pool
 import gc
 import tclCommands
@@ -170,6 +172,9 @@ class App(QtCore.QObject):
             json.dump([], f)
             f.close()
 
+        # Parsed files, see parse_with_cache()
+        self.parse_cache = ParseCache(self.data_path + '/parse_cache')
+
         # Application directory. Chdir to it. Otherwise, trying to load
         # GUI icons will fail as thir path is relative.
         # This will fail under cx_freeze ...
@@ -342,7 +347,19 @@ class App(QtCore.QObject):
             "zdownrate": None,
             "excellon_zeros": "L",
             "gerber_use_buffer_for_union": True,
-            "cncjob_coordinate_format": "X%.4fY%.4f"
+            "gerber_union_tiles": 1,
+            "gerber_union_workers": 0,
+            "gerber_build_workers": 1,
+            "gerber_ncc_workers": 1,
+            "gerber_iso_incremental": False,
+            "gerber_iso_workers": 1,
+            "gerber_arc_tolerance": 0.0,
+            "cncjob_coordinate_format": "X%.4fY%.4f",
+            "cncjob_arc_tolerance": 0.0,
+            "cncjob_modal_gcode": False,        # Leave out unchanged G-code words.
+            "cncjob_arc_fitting": 0.0,          # If not 0, cut arcs with G02/G03 within this distance.
+            "parse_cache_enabled": True,
+            "parse_cache_size": 256             # Megabytes of parsed files kept on disk.
         })
 
         ###############################
@@ -2053,6 +2070,160 @@ class App(QtCore.QObject):
             # GUI feedback
             self.inform.emit("Opened: " + filename)
 
+    def parse_with_cache(self, kind, obj, filename, parse, **settings):
+        """
+        Initializes ``obj`` from the persistent parse cache if
+        ``filename`` was parsed before with the same settings,
+        otherwise runs ``parse()`` and caches the result.
+
+        :param kind: One of 'gerber', 'excellon' and 'cncjob'.
+        :type kind: str
+        :param obj: Object being initialized.
+        :param filename: File to be parsed.
+        :type filename: str
+        :param parse: Function without arguments parsing the file into ``obj``.
+        :param settings: Additional settings affecting the result, like
+            follow mode for Gerber files.
+        :return: None
+        """
+
+        if not self.defaults["parse_cache_enabled"]:
+            parse()
+            return
+
+        settings = self.parse_settings(kind, obj, **settings)
+        self.parse_cache.max_size = int(self.defaults["parse_cache_size"] * 1024 * 1024)
+        if self.parse_cache.parse(obj, kind, filename, settings, parse):
+            self.inform.emit("Loaded from parse cache: " + filename)
+
+    @staticmethod
+    def parse_settings(kind, obj, **settings):
+        """
+        Parser settings the result of parsing a file into ``obj`` depends on.
+
+        :param kind: One of 'gerber', 'excellon' and 'cncjob'.
+        :type kind: str
+        :param obj: Object the file will be parsed into.
+        :param settings: Additional settings, like follow mode for Gerber files.
+        :return: Dictionary of settings.
+        :rtype: dict
+        """
+
+        settings["units"] = obj.units
+        if kind == "gerber":
+            settings["steps_per_circ"] = obj.steps_per_circ
+            settings["arc_tolerance"] = Gerber.defaults["arc_tolerance"]
+            settings["use_buffer_for_union"] = Gerber.defaults["use_buffer_for_union"]
+        elif kind == "excellon":
+            settings["zeros"] = Excellon.defaults["zeros"]
+        elif kind == "cncjob":
+            settings["steps_per_circ"] = obj.steps_per_circ
+            settings["arc_tolerance"] = CNCjob.defaults["arc_tolerance"]
+        return settings
+
+    def open_set(self, path):
+        """
+        Opens every Gerber, Excellon and G-Code file in a directory or
+        matching a glob pattern. The kind of each file is detected from
+        its content and extension. Files are parsed concurrently in
+        ``self.pool`` and only the resulting objects are created here.
+        Thread-safe.
+
+        :param path: Directory or glob pattern.
+        :type path: str
+        :return: Names of the new objects.
+        :rtype: list
+        """
+
+        App.log.debug("open_set()")
+
+        if os.path.isdir(path):
+            filenames = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        else:
+            filenames = sorted(glob.glob(path))
+
+        classdict = {
+            "gerber": Gerber,
+            "excellon": Excellon,
+            "cncjob": CNCjob
+        }
+
+        jobs = []
+        for filename in filenames:
+            if not os.path.isfile(filename):
+                continue
+            try:
+                kind = detect_file_kind(filename)
+            except IOError:
+                kind = None
+            if kind is None:
+                App.log.debug("open_set(): Skipping %s" % filename)
+                continue
+
+            obj = classdict[kind]()
+            obj.units = self.options["units"]
+            # Same settings as open_gerber() so the cache is shared.
+            extra = {"follow": False} if kind == "gerber" else {}
+            jobs.append((kind, filename, self.parse_settings(kind, obj, **extra)))
+
+        if len(jobs) == 0:
+            self.inform.emit("[error] No Gerber, Excellon or G-Code files in: " + path)
+            return []
+
+        names = []
+
+        def attach(kind, filename, data):
+            def obj_init(obj, app_obj):
+                ParseCache.restore(obj, kind, data)
+
+            name = filename.split('/')[-1].split('\\')[-1]
+            obj = self.new_object(kind, name, obj_init)
+            if obj.is_empty():
+                self.inform.emit("[error] No geometry found in file: " + filename)
+                self.collection.set_active(obj.options["name"])
+                self.collection.delete_active()
+                return
+
+            self.file_opened.emit(kind, filename)
+            names.append(obj.options["name"])
+
+        with self.proc_container.new("Opening %d files" % len(jobs)):
+
+            # Files already in the parse cache are not sent to the pool.
+            use_cache = self.defaults["parse_cache_enabled"]
+            self.parse_cache.max_size = int(self.defaults["parse_cache_size"] * 1024 * 1024)
+            pending = []
+            for kind, filename, settings in jobs:
+                data = None
+                key = None
+                if use_cache:
+                    key = self.parse_cache.key(filename, kind, settings)
+                    data = self.parse_cache.read(key)
+                if data is None:
+                    pending.append((kind, filename, settings, key))
+                else:
+                    attach(kind, filename, data)
+
+            results = self.pool.imap(parse_file_encoded, [job[:3] for job in pending])
+            for i, (kind, filename, settings, key) in enumerate(pending):
+                data, error = results.next()
+                self.progress.emit(100 * (i + 1) / len(pending))
+
+                if error is not None:
+                    self.inform.emit("[error] Failed to parse file: %s. %s" % (filename, error))
+                    continue
+
+                if key is not None:
+                    try:
+                        self.parse_cache.write(key, data)
+                    except (IOError, OSError) as e:
+                        App.log.warning("Could not cache %s: %s" % (filename, str(e)))
+
+                attach(kind, filename, data)
+
+        self.inform.emit("Opened %d of %d files from: %s" % (len(names), len(jobs), path))
+        return names
+
     def open_gerber(self, filename, follow=False, outname=None):
         """
         Opens a Gerber file, parses it and creates a new object for
@@ -2075,7 +2246,9 @@ class App(QtCore.QObject):
             # Opening the file happens here
             self.progress.emit(30)
             try:
-                gerber_obj.parse_file(filename, follow=follow)
+                self.parse_with_cache("gerber", gerber_obj, filename,
+                                      lambda: gerber_obj.parse_file(filename, follow=follow),
+                                      follow=follow)
 
             except IOError:
                 app_obj.inform.emit("[error] Failed to open file: " + filename)
@@ -2141,8 +2314,12 @@ class App(QtCore.QObject):
         def obj_init(excellon_obj, app_obj):
             #self.progress.emit(20)
 
-            try:
+            def parse():
                 excellon_obj.parse_file(filename)
+                excellon_obj.create_geometry()
+
+            try:
+                self.parse_with_cache("excellon", excellon_obj, filename, parse)
 
             except IOError:
                 app_obj.inform.emit("[error] Cannot open file: " + filename)
@@ -2155,15 +2332,6 @@ class App(QtCore.QObject):
                 app_obj.inform.emit(msg)
                 raise
 
-            try:
-                excellon_obj.create_geometry()
-
-            except:
-                msg = "[error] An internal error has ocurred. See shell.\n"
-                msg += traceback.format_exc()
-                app_obj.inform.emit(msg)
-                raise
-
             if excellon_obj.is_empty():
                 app_obj.inform.emit("[error] No geometry found in file: " + filename)
                 self.collection.set_active(excellon_obj.options["name"])
@@ -2206,23 +2374,26 @@ class App(QtCore.QObject):
 
             self.progress.emit(10)
 
-            try:
+            def parse():
                 f = open(filename)
                 gcode = f.read()
                 f.close()
+
+                job_obj.gcode = gcode
+
+                self.progress.emit(20)
+                job_obj.gcode_parse()
+
+                self.progress.emit(60)
+                job_obj.create_geometry()
+
+            try:
+                self.parse_with_cache("cncjob", job_obj, filename, parse)
             except IOError:
                 app_obj_.inform.emit("[error] Failed to open " + filename)
                 self.progress.emit(0)
                 raise IOError("Failed to open " + filename)
 
-            job_obj.gcode = gcode
-
-            self.progress.emit(20)
-            job_obj.gcode_parse()
-
-            self.progress.emit(60)
-            job_obj.create_geometry()
-
         with self.proc_container.new("Opening G-Code."):
 
             # Object name
@@ -2322,7 +2493,17 @@ class App(QtCore.QObject):
             "zdownrate": CNCjob,
             "excellon_zeros": Excellon,
             "gerber_use_buffer_for_union": Gerber,
-            "cncjob_coordinate_format": CNCjob
+            "gerber_union_tiles": Gerber,
+            "gerber_union_workers": Gerber,
+            "gerber_build_workers": Gerber,
+            "gerber_ncc_workers": Gerber,
+            "gerber_iso_incremental": Gerber,
+            "gerber_iso_workers": Gerber,
+            "gerber_arc_tolerance": Gerber,
+            "cncjob_coordinate_format": CNCjob,
+            "cncjob_arc_tolerance": CNCjob,
+            "cncjob_modal_gcode": CNCjob,
+            "cncjob_arc_fitting": CNCjob
             # "spindlespeed": CNCjob
         }
 
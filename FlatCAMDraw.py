@@ -1210,7 +1210,7 @@ class FlatCAMDraw(QtCore.QObject):
     def make_storage():
 
         ## Shape storage.
-        storage = FlatCAMRTreeStorage()
+        storage = FlatCAMKDTreeStorage()
         storage.get_points = DrawToolShape.get_pts
 
         return storage
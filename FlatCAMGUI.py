@@ -315,13 +315,21 @@ class FlatCAMActivityView(QtGui.QWidget):
 
         layout.addWidget(self.text)
 
+        self.cancel_button = QtGui.QToolButton(self)
+        self.cancel_button.setText("Cancel")
+        self.cancel_button.setToolTip("Stop the running processes that can be cancelled.")
+        self.cancel_button.hide()
+        layout.addWidget(self.cancel_button)
+
     def set_idle(self):
         self.movie.stop()
         self.text.setText("Idle.")
+        self.cancel_button.hide()
 
-    def set_busy(self, msg):
+    def set_busy(self, msg, cancellable=False):
         self.movie.start()
         self.text.setText(msg)
+        self.cancel_button.setVisible(cancellable)
 
 
 class FlatCAMInfoBar(QtGui.QWidget):
@@ -264,6 +264,19 @@ class FlatCAMObj(QtCore.QObject):
         else:
             self.shapes.add(tolerance=self.drawing_tolerance, **kwargs)
 
+    def add_instances(self, **kwargs):
+        if self.deleted:
+            raise ObjectDeleted()
+        else:
+            self.shapes.add_instances(tolerance=self.drawing_tolerance, **kwargs)
+
+    def add_toolpath(self, **kwargs):
+        if self.deleted:
+            raise ObjectDeleted()
+        else:
+            kwargs.setdefault('tolerance', self.drawing_tolerance)
+            self.shapes.add_toolpath(**kwargs)
+
     @property
     def visible(self):
         return self.shapes.visible
@@ -518,16 +531,15 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
             def geo_init(geo_obj, app_obj):
                 geo_obj.options["cnctooldia"] = tool
                 geo_obj.solid_geometry = []
-                for p in area.geoms:
-                    try:
-                        cp = self.clear_polygon(p, tool, over)
-                        geo_obj.solid_geometry.append(list(cp.get_objects()))
-                    except:
+                for paths in cleared_paths:
+                    if paths is None:
                         FlatCAMApp.App.log.warning("Polygon is ommited")
+                    else:
+                        geo_obj.solid_geometry.append(paths)
 
             # Generate area for each tool
             offset = sum(tools)
-            for tool in tools:
+            for k, tool in enumerate(tools):
                 # Get remaining tools offset
                 offset -= tool
 
@@ -543,6 +555,18 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
                     # Overall cleared area
                     cleared = empty.buffer(-offset * (1 + over)).buffer(-tool / 2).buffer(tool / 2)
 
+                    # Clear the polygons in worker processes
+                    def progress(done, total):
+                        self.app.progress.emit(100 * (k * total + done) / (len(tools) * total))
+
+                    cleared_paths = clear_polygons(list(area.geoms), tool, over,
+                                                   workers=self.ncc_workers,
+                                                   progress=progress,
+                                                   cancelled=proc.is_cancelled)
+                    if cleared_paths is None:
+                        self.app.inform.emit("Clear non-copper areas cancelled.")
+                        return
+
                     # Create geometry object
                     name = self.options["name"] + "_ncc_" + repr(tool) + "D"
                     self.app.new_object("geometry", name, geo_init)
@@ -550,7 +574,7 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
                     return
 
         # Do job in background
-        proc = self.app.proc_container.new("Clearing non-copper areas.")
+        proc = self.app.proc_container.new("Clearing non-copper areas.", cancellable=True)
 
         def job_thread(app_obj):
             try:
@@ -559,6 +583,7 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
                 proc.done()
                 raise e
             proc.done()
+            self.app.progress.emit(0)
 
         self.app.inform.emit("Clear non-copper areas started ...")
         self.app.worker_task.emit({'fcn': job_thread, 'params': [self.app]})
@@ -606,14 +631,13 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
         base_name = self.options["name"] + "_iso"
         base_name = outname or base_name
 
-        def generate_envelope(offset, invert):
+        def generate_envelope(geom, invert):
             # isolation_geometry produces an envelope that is going on the left of the geometry
             # (the copper features). To leave the least amount of burrs on the features
             # the tool needs to travel on the right side of the features (this is called conventional milling)
             # the first pass is the one cutting all of the features, so it needs to be reversed
             # the other passes overlap preceding ones and cut the left over copper. It is better for them
             # to cut on the right side of the left over copper i.e on the left side of the features. 
-            geom = self.isolation_geometry(offset)
             if invert:
                 if type(geom) is MultiPolygon:
                     pl = []
@@ -626,6 +650,11 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
                     raise "Unexpected Geometry"
             return geom
 
+        # All passes at once, so they can be derived one from another
+        # or buffered in parallel.
+        offsets = [(2 * i + 1) / 2.0 * dia - i * overlap * dia for i in range(passes)]
+        envelopes = self.isolation_passes(offsets, incremental=self.iso_incremental, workers=self.iso_workers)
+
         if combine:
             iso_name = base_name
 
@@ -635,8 +664,7 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
                 geo_obj.options["cnctooldia"] = self.options["isotooldia"]
                 geo_obj.solid_geometry = []
                 for i in range(passes):
-                    offset = (2 * i + 1) / 2.0 * dia - i * overlap * dia
-                    geom = generate_envelope (offset, i == 0)
+                    geom = generate_envelope(envelopes[i], i == 0)
                     geo_obj.solid_geometry.append(geom)
                 app_obj.info("Isolation geometry created: %s" % geo_obj.options["name"])
 
@@ -646,7 +674,6 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
         else:
             for i in range(passes):
 
-                offset = (2 * i + 1) / 2.0 * dia - i * overlap  * dia
                 if passes > 1:
                     iso_name = base_name + str(i + 1)
                 else:
@@ -656,7 +683,7 @@ class FlatCAMGerber(FlatCAMObj, Gerber):
                 def iso_init(geo_obj, app_obj):
                     # Propagate options
                     geo_obj.options["cnctooldia"] = self.options["isotooldia"]
-                    geo_obj.solid_geometry = generate_envelope (offset, i == 0)
+                    geo_obj.solid_geometry = generate_envelope(envelopes[i], i == 0)
                     app_obj.info("Isolation geometry created: %s" % geo_obj.options["name"])
 
                 # TODO: Do something if this is None. Offer changing name?
@@ -815,10 +842,8 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
                         except:
                             exc.app.log.warning("Failed to copy option.",option)
 
-                #deep copy of all drills,to avoid any references
-                for drill in exc.drills:
-                    point = Point(drill['point'].x,drill['point'].y)
-                    exc_final.drills.append({"point": point, "tool": drill['tool']})
+                #copy of all drills,to avoid any references
+                exc_final.drills.extend(exc.drills)
                 toolsrework=dict()
                 max_numeric_tool=0
                 for toolname in exc.tools.iterkeys():
@@ -957,12 +982,10 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
 
             geo_obj.solid_geometry = []
 
-            for hole in self.drills:
-                if hole['tool'] in tools:
-                    geo_obj.solid_geometry.append(
-                        Point(hole['point']).buffer(self.tools[hole['tool']]["C"] / 2 -
-                                                    tooldia / 2).exterior
-                    )
+            for tool in tools:
+                radius = self.tools[tool]["C"] / 2 - tooldia / 2
+                for x, y in self.drills.select(tool).tolist():
+                    geo_obj.solid_geometry.append(Point(x, y).buffer(radius).exterior)
 
         def geo_thread(app_obj):
             app_obj.new_object("geometry", outname, geo_init)
@@ -1059,6 +1082,21 @@ class FlatCAMExcellon(FlatCAMObj, Excellon):
         if not FlatCAMObj.plot(self):
             return
 
+        # Holes are drawn as copies of a circle per tool.
+        if self.instances is not None:
+            try:
+                for template, centers in self.instances.groups():
+                    if self.options["solid"]:
+                        self.add_instances(template=template, centers=centers, color='#750000BF',
+                                           face_color='#C40000BF', visible=self.options['plot'], layer=2)
+                    else:
+                        self.add_instances(template=template, centers=centers, color='red',
+                                           visible=self.options['plot'])
+                self.shapes.redraw()
+            except (ObjectDeleted, AttributeError):
+                self.shapes.clear(update=True)
+            return
+
         try:
             _ = iter(self.solid_geometry)
         except TypeError:
@@ -1087,6 +1125,10 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
 
     ui_type = CNCObjectUI
 
+    # Paths are plotted as buffered shapes when the view is zoomed
+    # in so far that at most this many are around it.
+    buffered_paths_max = 200
+
     def __init__(self, name, units="in", kind="generic", z_move=0.1,
                  feedrate=3.0, z_cut=-0.002, tooldia=0.0,
                  spindlespeed=None):
@@ -1117,6 +1159,10 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
 
         self.annotation = self.app.plotcanvas.new_text_group()
 
+        # Area plotted with buffered shapes, see buffered_view().
+        self.plotted_view = None
+        self.app.plotcanvas.view_changed.connect(self.on_view_changed)
+
     def set_ui(self, ui):
         FlatCAMObj.set_ui(self, ui)
 
@@ -1201,21 +1247,20 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
 
     def export_gcode(self, filename, preamble='', postamble=''):
 
-        lines = StringIO(self.gcode)
-
-        ## Post processing
-        # Dwell?
-        if self.options['dwell']:
-            log.debug("Will add G04!")
-            lines = self.dwell_generator(lines)
-
         ## Write
         with open(filename, 'w') as f:
             f.write(preamble + "\n")
 
-            for line in lines:
-
-                f.write(line)
+            ## Post processing
+            # Dwell?
+            if self.options['dwell']:
+                log.debug("Will add G04!")
+                writer = GCodeWriter(f)
+                for line in self.dwell_generator(StringIO(self.gcode)):
+                    writer.write(line)
+                writer.flush()
+            else:
+                f.write(self.gcode)
 
             f.write(postamble)
 
@@ -1233,6 +1278,44 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
             return
         self.read_form_item('plot')
 
+    def buffered_view(self):
+        """
+        Area around the visible one in which paths are plotted as
+        buffered shapes, or None if there are too many paths in it.
+        See ``CNCjob.plot2()``.
+
+        :return: (xmin, ymin, xmax, ymax) or None
+        """
+        if self.toolpath is None:
+            return None
+
+        xmin, ymin, xmax, ymax = self.app.plotcanvas.view_rect()
+        dx, dy = (xmax - xmin) / 2.0, (ymax - ymin) / 2.0
+        view = (xmin - dx, ymin - dy, xmax + dx, ymax + dy)
+
+        if len(self.toolpath.paths_in(view)) > self.buffered_paths_max:
+            return None
+        return view
+
+    def on_view_changed(self):
+        """
+        Plots again when the view was zoomed in or out past the point
+        where paths are plotted as buffered shapes, or moved away from
+        the buffered ones.
+        """
+        if self.deleted or not self.options['plot'] or self.toolpath is None:
+            return
+
+        if self.plotted_view is not None:
+            xmin, ymin, xmax, ymax = self.app.plotcanvas.view_rect()
+            pxmin, pymin, pxmax, pymax = self.plotted_view
+            if pxmin <= xmin and pymin <= ymin and xmax <= pxmax and ymax <= pymax:
+                return
+        elif self.buffered_view() is None:
+            return
+
+        self.plot()
+
     def plot(self):
 
         # Does all the required setup and returns False
@@ -1241,7 +1324,9 @@ class FlatCAMCNCjob(FlatCAMObj, CNCjob):
             return
 
         try:
-            self.plot2(tooldia=self.options["tooldia"], obj=self, visible=self.options['plot'])
+            self.plotted_view = self.buffered_view()
+            self.plot2(tooldia=self.options["tooldia"], obj=self, visible=self.options['plot'],
+                       view=self.plotted_view)
             self.shapes.redraw()
         except (ObjectDeleted, AttributeError):
             self.shapes.clear(update=True)
@@ -1434,7 +1519,10 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
                        spindlespeed=None,
                        multidepth=None,
                        depthperpass=None,
-                       use_thread=True):
+                       order=None,
+                       ordertime=1.0,
+                       use_thread=True,
+                       output=None):
         """
         Creates a CNCJob out of this Geometry object. The actual
         work is done by the target FlatCAMCNCjob object's
@@ -1446,7 +1534,11 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
         :param tooldia: Tool diameter
         :param outname: Name of the new object
         :param spindlespeed: Spindle speed (RPM)
-        :return: None
+        :param order: How to order the paths, see ``camlib.order_paths()``
+        :param ordertime: Time budget in seconds for improving the order
+        :param output: Name of a file to write the G-code to instead of
+            creating an object, in this thread.
+        :return: The CNCjob written to ``output``, otherwise None.
         """
 
         outname = outname if outname is not None else self.options["name"] + "_cnc"
@@ -1469,6 +1561,22 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             # int or None.
             spindlespeed = self.options['spindlespeed']
 
+        # The G-code goes to the file as it is generated, it is
+        # neither kept in memory nor plotted.
+        if output is not None:
+            job_obj = CNCjob(units=self.units, z_move=z_move, feedrate=feedrate, z_cut=z_cut,
+                             tooldia=tooldia, spindlespeed=spindlespeed)
+            with open(output, 'w') as f:
+                # TODO: The tolerance should not be hard coded. Just for testing.
+                job_obj.generate_from_geometry_2(self,
+                                                 multidepth=multidepth,
+                                                 depthpercut=depthperpass,
+                                                 tolerance=0.0005,
+                                                 order=order,
+                                                 order_time=ordertime,
+                                                 output=f)
+            return job_obj
+
         # Object initialization function for app.new_object()
         # RUNNING ON SEPARATE THREAD!
         def job_init(job_obj, app_obj):
@@ -1488,7 +1596,9 @@ class FlatCAMGeometry(FlatCAMObj, Geometry):
             job_obj.generate_from_geometry_2(self,
                                              multidepth=multidepth,
                                              depthpercut=depthperpass,
-                                             tolerance=0.0005)
+                                             tolerance=0.0005,
+                                             order=order,
+                                             order_time=ordertime)
 
             app_obj.progress.emit(50)
             job_obj.gcode_parse()
@@ -0,0 +1,358 @@
+import os
+import hashlib
+import logging
+import traceback
+import cPickle as pickle
+
+from shapely.geometry.base import BaseGeometry
+from shapely.wkb import loads as wkb_loads
+
+from camlib import ApertureMacro, DrillStore, GCodeToolpath, Gerber, Excellon, CNCjob, dict2obj, to_dict
+
+log = logging.getLogger('base2')
+
+
+class ParseCache(object):
+    """
+    Content-addressed on-disk cache of parsed fabrication files.
+
+    Entries are keyed by the SHA-1 of the file contents plus the
+    parser settings that affect the result, and hold the attributes
+    listed in ``ParseCache.attrs`` for the kind of object. Shapely
+    geometry is stored as WKB and the whole entry is pickled using
+    only built-in types. The total size of the cache is kept under
+    ``max_size`` bytes by evicting the least recently used entries,
+    using the modification time of the entry files as access time.
+    """
+
+    # Bump when the stored attributes or their encoding change.
+    version = 6
+
+    # Attributes set by the parser for every kind of object.
+    # Excellon and G-code geometry is cheaper to create again than to
+    # load. G-code paths are stored as arrays.
+    attrs = {
+        "gerber": ['units', 'int_digits', 'frac_digits', 'apertures',
+                   'aperture_macros', 'solid_geometry'],
+        "excellon": ['units', 'tools', 'drills', 'zeros'],
+        "cncjob": ['units', 'gcode', 'toolpath']
+    }
+
+    suffix = ".fcc"
+
+    def __init__(self, path, max_size=256 * 1024 * 1024):
+        """
+
+        :param path: Directory holding the cache entries. Created
+            when the first entry is stored.
+        :type path: str
+        :param max_size: Maximum total size of the entries in bytes.
+        :type max_size: int
+        """
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, filename, kind, settings):
+        """
+        Computes the cache key for a file.
+
+        :param filename: File to be parsed.
+        :param kind: One of the keys of ``ParseCache.attrs``.
+        :param settings: Dictionary of parser settings that affect
+            the result of parsing.
+        :return: Hexadecimal key.
+        :rtype: str
+        """
+        digest = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), ''):
+                digest.update(chunk)
+        digest.update(repr((self.version, kind, sorted(settings.items()))))
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + self.suffix)
+
+    @staticmethod
+    def encode(value):
+        """
+        Converts a value into built-in types only. Geometry is
+        stored as WKB, DrillStore and GCodeToolpath as their arrays
+        and ApertureMacro as in ``camlib.to_dict()``.
+        """
+        if isinstance(value, BaseGeometry):
+            if value.is_empty:
+                return to_dict(value)
+            return {"__class__": "WKB", "__inst__": value.wkb}
+        if isinstance(value, ApertureMacro):
+            return to_dict(value)
+        if isinstance(value, DrillStore):
+            return {"__class__": "DrillStore", "__inst__": value.to_dict()}
+        if isinstance(value, GCodeToolpath):
+            return {"__class__": "GCodeToolpath", "__inst__": value.to_dict()}
+        if isinstance(value, dict):
+            return dict((k, ParseCache.encode(v)) for k, v in value.items())
+        if isinstance(value, list):
+            return [ParseCache.encode(v) for v in value]
+        if isinstance(value, tuple):
+            return tuple(ParseCache.encode(v) for v in value)
+        return value
+
+    @staticmethod
+    def decode(value):
+        """
+        Inverse of ``ParseCache.encode()``.
+        """
+        if isinstance(value, dict):
+            if '__class__' in value and '__inst__' in value:
+                if value['__class__'] == "WKB":
+                    return wkb_loads(value['__inst__'])
+                if value['__class__'] == "DrillStore":
+                    return DrillStore.from_dict(value['__inst__'])
+                if value['__class__'] == "GCodeToolpath":
+                    return GCodeToolpath.from_dict(value['__inst__'])
+                return dict2obj(value)
+            return dict((k, ParseCache.decode(v)) for k, v in value.items())
+        if isinstance(value, list):
+            return [ParseCache.decode(v) for v in value]
+        if isinstance(value, tuple):
+            return tuple(ParseCache.decode(v) for v in value)
+        return value
+
+    @classmethod
+    def dump(cls, obj, kind):
+        """
+        Encoded parse results of ``obj``, as stored in the cache.
+
+        :rtype: dict
+        """
+        return dict((attr, cls.encode(getattr(obj, attr))) for attr in cls.attrs[kind])
+
+    @classmethod
+    def restore(cls, obj, kind, data):
+        """
+        Sets the attributes encoded by ``dump()`` on ``obj``.
+        """
+        for attr in cls.attrs[kind]:
+            setattr(obj, attr, cls.decode(data[attr]))
+
+        if kind in ("excellon", "cncjob"):
+            obj.create_geometry()
+
+    def read(self, key):
+        """
+        Encoded entry for ``key``, or None if not cached.
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except IOError:
+            return None
+        except Exception as e:
+            log.warning("Discarding unreadable parse cache entry %s: %s" % (key, str(e)))
+            self.remove(key)
+            return None
+
+        # Mark as recently used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def write(self, key, data):
+        """
+        Stores an encoded entry under ``key`` and evicts old
+        entries if the cache grew over ``max_size``.
+        """
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        # Write to a temporary file first so a partially written
+        # entry is never picked up.
+        path = self.entry_path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(data, f, 2)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+        self.evict()
+
+    def load(self, key, obj, kind):
+        """
+        Sets the cached attributes on ``obj``.
+
+        :return: Whether the entry was found.
+        :rtype: bool
+        """
+        data = self.read(key)
+        if data is None:
+            return False
+        self.restore(obj, kind, data)
+        return True
+
+    def store(self, key, obj, kind):
+        """
+        Stores the attributes of ``obj`` under ``key``.
+        """
+        self.write(key, self.dump(obj, kind))
+
+    def parse(self, obj, kind, filename, settings, parse):
+        """
+        Loads ``obj`` from the cache if ``filename`` was already
+        parsed with the same settings, otherwise calls ``parse()``
+        and stores the result.
+
+        :param obj: Object to initialize.
+        :param kind: One of the keys of ``ParseCache.attrs``.
+        :param filename: File to be parsed.
+        :param settings: Dictionary of parser settings that affect
+            the result of parsing.
+        :param parse: Function without arguments that parses the
+            file into ``obj``.
+        :return: Whether the object was loaded from the cache.
+        :rtype: bool
+        """
+        key = self.key(filename, kind, settings)
+
+        if self.load(key, obj, kind):
+            self.hits += 1
+            log.debug("Parse cache hit: %s (%s)" % (filename, key))
+            return True
+
+        self.misses += 1
+        parse()
+
+        try:
+            self.store(key, obj, kind)
+        except (IOError, OSError) as e:
+            log.warning("Could not store parse cache entry for %s: %s" % (filename, str(e)))
+
+        return False
+
+    def entries(self):
+        """
+        Entries in the cache, least recently used first.
+
+        :return: List of (key, size in bytes, last use time).
+        :rtype: list
+        """
+        if not os.path.isdir(self.path):
+            return []
+
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((name[:-len(self.suffix)], st.st_size, st.st_mtime))
+
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def remove(self, key):
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache
+        is not larger than ``max_size``.
+
+        :return: Number of entries removed.
+        :rtype: int
+        """
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for key, size, _ in entries:
+            if total <= self.max_size:
+                break
+            self.remove(key)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """
+        Removes all entries.
+
+        :return: Number of entries removed.
+        :rtype: int
+        """
+        entries = self.entries()
+        for key, _, _ in entries:
+            self.remove(key)
+        return len(entries)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'entries': len(self.entries()),
+            'size': self.size(),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+def parse_file_encoded(args):
+    """
+    Parses a file into its encoded cache entry. Meant to run in
+    a process pool, so nothing but built-in types cross the process
+    boundary.
+
+    :param args: (kind, filename, settings) where settings are as
+        used for the cache key, see ``App.parse_settings()``.
+    :return: (encoded entry, None) or (None, error message).
+    :rtype: tuple
+    """
+    kind, filename, settings = args
+
+    try:
+        if kind == "gerber":
+            obj = Gerber(steps_per_circle=settings["steps_per_circ"])
+            obj.arc_tolerance = settings["arc_tolerance"]
+            obj.use_buffer_for_union = settings["use_buffer_for_union"]
+            # Pool workers can not start processes of their own.
+            obj.union_workers = 1
+            obj.build_workers = 1
+            obj.units = settings["units"]
+            obj.parse_file(filename, follow=settings.get("follow", False))
+
+        elif kind == "excellon":
+            obj = Excellon(zeros=settings["zeros"])
+            obj.units = settings["units"]
+            obj.parse_file(filename)
+            obj.create_geometry()
+
+        elif kind == "cncjob":
+            obj = CNCjob(units=settings["units"])
+            obj.steps_per_circ = settings["steps_per_circ"]
+            obj.arc_tolerance = settings["arc_tolerance"]
+            with open(filename) as f:
+                obj.gcode = f.read()
+            obj.gcode_parse()
+            obj.create_geometry()
+
+        else:
+            return None, "Unknown file kind: %s" % kind
+
+    except Exception as e:
+        log.error("Failed to parse %s: %s" % (filename, traceback.format_exc()))
+        return None, "%s: %s" % (type(e).__name__, str(e))
+
+    return ParseCache.dump(obj, kind), None
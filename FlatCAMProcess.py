@@ -19,13 +19,19 @@ class FCProcess(object):
 
     app = None
 
-    def __init__(self, descr):
+    def __init__(self, descr, cancellable=False):
         self.callbacks = {
             "done": []
         }
         self.descr = descr
         self.status = "Active"
 
+        # Whether the job checks is_cancelled() and stops early.
+        self.cancellable = cancellable
+
+        # Set by cancel().
+        self.cancelled = False
+
     def __del__(self):
         self.done()
 
@@ -55,6 +61,15 @@ class FCProcess(object):
         except ValueError:
             pass
 
+    def cancel(self):
+        if not self.cancellable:
+            return
+        self.cancelled = True
+        self.set_status("Cancelling")
+
+    def is_cancelled(self):
+        return self.cancelled
+
     def set_status(self, status_string):
         self.status = status_string
 
@@ -82,8 +97,8 @@ class FCProcessContainer(object):
 
         self.procs.append(weakref.ref(proc))
 
-    def new(self, descr):
-        proc = FCProcess(descr)
+    def new(self, descr, cancellable=False):
+        proc = FCProcess(descr, cancellable)
 
         proc.connect(self.on_done, event="done")
 
@@ -99,6 +114,15 @@ class FCProcessContainer(object):
     def on_done(self, proc):
         self.remove(proc)
 
+    def cancel(self):
+        """
+        Asks all running processes that can be cancelled to stop.
+        """
+        for pref in self.procs:
+            proc = pref()
+            if proc is not None:
+                proc.cancel()
+
     def remove(self, proc):
 
         to_be_removed = []
@@ -124,6 +148,7 @@ class FCVisibleProcessContainer(QtCore.QObject, FCProcessContainer):
         self.view = view
 
         self.something_changed.connect(self.update_view)
+        self.view.cancel_button.clicked.connect(self.on_cancel)
 
     def on_done(self, proc):
         self.app.log.debug("FCVisibleProcessContainer.on_done()")
@@ -137,12 +162,21 @@ class FCVisibleProcessContainer(QtCore.QObject, FCProcessContainer):
 
         self.something_changed.emit()
 
+    def on_cancel(self):
+        self.app.log.debug("FCVisibleProcessContainer.on_cancel()")
+        self.cancel()
+        self.view.set_busy("Cancelling...", cancellable=False)
+
     def update_view(self):
+        # Cancel is only offered if something would stop.
+        procs = [pref() for pref in self.procs]
+        cancellable = any(proc.cancellable and not proc.cancelled for proc in procs if proc is not None)
+
         if len(self.procs) == 0:
             self.view.set_idle()
 
         elif len(self.procs) == 1:
-            self.view.set_busy(self.procs[0]().status_msg())
+            self.view.set_busy(self.procs[0]().status_msg(), cancellable)
 
         else:
-            self.view.set_busy("%d processes running." % len(self.procs))
\ No newline at end of file
+            self.view.set_busy("%d processes running." % len(self.procs), cancellable)
\ No newline at end of file
@@ -23,6 +23,9 @@ class PlotCanvas(QtCore.QObject):
     Class handling the plotting area in the application.
     """
 
+    # Emitted when the view stopped being zoomed or moved.
+    view_changed = QtCore.pyqtSignal()
+
     def __init__(self, container, app):
         """
         The constructor configures the Matplotlib figure that
@@ -61,6 +64,14 @@ class PlotCanvas(QtCore.QObject):
         # TODO: Should be setting to show/hide CNC job annotations (global or per object)
         self.text_collection.enabled = False
 
+        # Zooming and panning change the camera transform many times
+        # a second, only notify once it settles.
+        self.view_timer = QtCore.QTimer()
+        self.view_timer.setSingleShot(True)
+        self.view_timer.setInterval(300)
+        self.view_timer.timeout.connect(self.view_changed.emit)
+        self.vispy_canvas.view.camera.transform.changed.connect(lambda event: self.view_timer.start())
+
     def vis_connect(self, event_name, callback):
         return getattr(self.vispy_canvas.events, event_name).connect(callback)
 
@@ -80,6 +91,16 @@ class PlotCanvas(QtCore.QObject):
         """
         self.vispy_canvas.view.camera.zoom(factor, center)
 
+    def view_rect(self):
+        """
+        Visible area of the plot.
+
+        :return: (xmin, ymin, xmax, ymax)
+        :rtype: tuple
+        """
+        rect = self.vispy_canvas.view.camera.rect
+        return rect.left, rect.bottom, rect.right, rect.top
+
     def new_shape_group(self):
         return ShapeGroup(self.shape_collection)
 
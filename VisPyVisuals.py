@@ -77,6 +77,115 @@ def _update_shape_buffers(data, triangulation='glu'):
     return data
 
 
+def _instance_buffers(data):
+    """
+    Builds the internal buffers for many copies of a closed convex ring,
+    like drill holes, without tessellating every copy. The ring is
+    simplified and triangulated once and then moved to every center.
+    :param data: dict
+        Input shape data, with 'template' (closed ring, (k, 2) array)
+        and 'centers' ((n, 2) array) instead of 'geometry'
+    """
+    template, centers = data['template'], np.asarray(data['centers'], dtype=float).reshape(-1, 2)
+    color, face_color, tolerance = data['color'], data['face_color'], data['tolerance']
+
+    ring = LinearRing(template)
+    simple = np.asarray((ring.simplify(tolerance) if tolerance else ring).coords)
+    if len(simple) < 4:                                             # Too small to keep its shape
+        simple = np.asarray(ring.coords)
+
+    n = len(centers)
+    m = len(simple) - 1                                             # Vertices without the closing one
+
+    data['line_pts'] = []
+    data['line_colors'] = []
+    data['mesh_vertices'] = []
+    data['mesh_tris'] = []
+    data['mesh_colors'] = []
+
+    if n > 0 and face_color is not None:
+        # Triangle fan, valid as the ring is convex
+        fan = np.column_stack([np.zeros(m - 2), np.arange(1, m - 1), np.arange(2, m)]).ravel()
+        data['mesh_vertices'] = (centers[:, None, :] + simple[None, :-1, :]).reshape(-1, 2)
+        data['mesh_tris'] = (fan[None, :] + m * np.arange(n)[:, None]).ravel().astype(np.uint32)
+        data['mesh_colors'] = np.tile(Color(face_color).rgba, (n * (m - 2), 1))
+
+    if n > 0 and color is not None:
+        segments = np.empty((2 * m, 2))
+        segments[0::2] = simple[:-1]
+        segments[1::2] = simple[1:]
+        data['line_pts'] = (centers[:, None, :] + segments[None, :, :]).reshape(-1, 2)
+        data['line_colors'] = np.tile(Color(color).rgba, (n * 2 * m, 1))
+
+    del data['template']
+    del data['centers']
+
+    return data
+
+
+def _toolpath_buffers(data):
+    """
+    Builds the internal buffers for tool paths drawn as lines as wide
+    as the tool, in data units, without creating and tessellating a
+    buffered shape for every path. Every segment is a rectangle and
+    every vertex a disk, so joints and ends are round.
+    :param data: dict
+        Input shape data, with 'points' ((n, 2) array), 'path' (path
+        index of every point, consecutive points of the same path are
+        joined) and 'width' instead of 'geometry'
+    """
+    points = np.asarray(data['points'], dtype=float).reshape(-1, 2)
+    path = np.asarray(data['path'])
+    width, color, face_color, tolerance = data['width'], data['color'], data['face_color'], data['tolerance']
+
+    joined = path[1:] == path[:-1]
+    starts, ends = points[:-1][joined], points[1:][joined]
+    n = len(starts)
+
+    data['line_pts'] = []
+    data['line_colors'] = []
+    data['mesh_vertices'] = []
+    data['mesh_tris'] = []
+    data['mesh_colors'] = []
+
+    if n > 0 and width > 0 and face_color is not None:
+        radius = width / 2.0
+
+        # Rectangles, from the normal of every segment
+        delta = ends - starts
+        length = np.hypot(delta[:, 0], delta[:, 1])
+        length[length == 0] = np.inf                                # Only the disks for null segments
+        normal = np.column_stack([-delta[:, 1], delta[:, 0]]) * (radius / length)[:, None]
+        quads = np.stack([starts + normal, starts - normal, ends - normal, ends + normal], axis=1).reshape(-1, 2)
+        quad_tris = (np.array([0, 1, 2, 0, 2, 3])[None, :] + 4 * np.arange(n)[:, None]).ravel()
+
+        # Disks, as triangle fans, with sides as allowed by tolerance
+        if 0 < tolerance < radius:
+            sides = int(np.clip(np.ceil(np.pi / np.arccos(1 - tolerance / radius)), 6, 32))
+        else:
+            sides = 6 if tolerance >= radius else 16
+        angles = np.linspace(0, 2 * np.pi, sides, endpoint=False)
+        disk = radius * np.column_stack([np.cos(angles), np.sin(angles)])
+        vertices = np.flatnonzero(joined)
+        centers = points[np.union1d(vertices, vertices + 1)]
+        fan = np.column_stack([np.zeros(sides - 2), np.arange(1, sides - 1), np.arange(2, sides)]).ravel()
+        disk_tris = (fan[None, :] + sides * np.arange(len(centers))[:, None]).ravel() + len(quads)
+
+        data['mesh_vertices'] = np.concatenate([quads, (centers[:, None, :] + disk[None, :, :]).reshape(-1, 2)])
+        data['mesh_tris'] = np.concatenate([quad_tris, disk_tris]).astype(np.uint32)
+        data['mesh_colors'] = np.tile(Color(face_color).rgba, (len(data['mesh_tris']) / 3, 1))
+
+    if n > 0 and color is not None:
+        # Center lines
+        data['line_pts'] = np.stack([starts, ends], axis=1).reshape(-1, 2)
+        data['line_colors'] = np.tile(Color(color).rgba, (2 * n, 1))
+
+    del data['points']
+    del data['path']
+
+    return data
+
+
 def _linearring_to_segments(arr):
     # Close linear ring
     """
@@ -122,6 +231,22 @@ class ShapeGroup(object):
         """
         self._indexes.append(self._collection.add(**kwargs))
 
+    def add_instances(self, **kwargs):
+        """
+        Adds copies of a shape to collection and store index in group
+        :param kwargs: keyword arguments
+            Arguments for ShapeCollection.add_instances function
+        """
+        self._indexes.append(self._collection.add_instances(**kwargs))
+
+    def add_toolpath(self, **kwargs):
+        """
+        Adds tool paths to collection and store index in group
+        :param kwargs: keyword arguments
+            Arguments for ShapeCollection.add_toolpath function
+        """
+        self._indexes.append(self._collection.add_toolpath(**kwargs))
+
     def clear(self, update=False):
         """
         Removes group shapes from collection, clear indexes
@@ -253,6 +378,86 @@ class ShapeCollectionVisual(CompoundVisual):
 
         return key
 
+    def add_instances(self, template=None, centers=None, color=None, face_color=None, visible=True, update=False,
+                      layer=1, tolerance=0.01):
+        """
+        Adds copies of a closed convex ring, like drill holes, to collection.
+        Buffers are built at once, the ring is only triangulated once.
+        :param template: numpy.array
+            Closed ring around the origin
+        :param centers: numpy.array
+            Where to put the copies
+        :param color: str, tuple
+            Line/edge color
+        :param face_color: str, tuple
+            Polygon face color
+        :param visible: bool
+            Shape visibility
+        :param update: bool
+            Set True to redraw collection
+        :param layer: int
+            Layer number. 0 - lowest.
+        :param tolerance: float
+            Geometry simplifying tolerance
+        :return: int
+            Index of shape
+        """
+        # Get new key
+        self.key_lock.acquire(True)
+        self.last_key += 1
+        key = self.last_key
+        self.key_lock.release()
+
+        self.data[key] = _instance_buffers({'template': template, 'centers': centers, 'color': color,
+                                            'face_color': face_color, 'visible': visible, 'layer': layer,
+                                            'tolerance': tolerance})
+
+        if update:
+            self.redraw()
+
+        return key
+
+    def add_toolpath(self, points=None, path=None, width=0, color=None, face_color=None, visible=True, update=False,
+                     layer=1, tolerance=0.01):
+        """
+        Adds tool paths to collection, drawn as lines as wide as the tool.
+        Buffers are built at once from the coordinates.
+        :param points: numpy.array
+            Points of all paths, one after another
+        :param path: numpy.array
+            Path index of every point
+        :param width: float
+            Width of the lines in data units. Only center lines if 0.
+        :param color: str, tuple
+            Center line color
+        :param face_color: str, tuple
+            Line face color
+        :param visible: bool
+            Shape visibility
+        :param update: bool
+            Set True to redraw collection
+        :param layer: int
+            Layer number. 0 - lowest.
+        :param tolerance: float
+            Round joints simplifying tolerance
+        :return: int
+            Index of shape
+        """
+        # Get new key
+        self.key_lock.acquire(True)
+        self.last_key += 1
+        key = self.last_key
+        self.key_lock.release()
+
+        self.data[key] = _toolpath_buffers({'points': points, 'path': path, 'width': width, 'color': color,
+                                            'face_color': face_color, 'visible': visible, 'layer': layer,
+                                            'tolerance': tolerance})
+
+        if update:
+            self.redraw()
+
+        return key
+
     def remove(self, key, update=False):
         """
         Removes shape from collection
@@ -287,9 +492,12 @@ class ShapeCollectionVisual(CompoundVisual):
         """
         Merges internal buffers, sets data to visuals, redraws collection on scene
         """
+        # Buffers of every shape, merged with a single concatenation per layer.
+        # Shapes hold lists or, for instances, arrays.
         mesh_vertices = [[] for _ in range(0, len(self._meshes))]       # Vertices for mesh
         mesh_tris = [[] for _ in range(0, len(self._meshes))]           # Faces for mesh
         mesh_colors = [[] for _ in range(0, len(self._meshes))]         # Face colors
+        mesh_counts = [0] * len(self._meshes)                           # Vertices so far
         line_pts = [[] for _ in range(0, len(self._lines))]             # Vertices for line
         line_colors = [[] for _ in range(0, len(self._lines))]          # Line color
 
@@ -300,13 +508,17 @@ class ShapeCollectionVisual(CompoundVisual):
         for data in self.data.values():
             if data['visible'] and 'line_pts' in data:
                 try:
-                    line_pts[data['layer']] += data['line_pts']
-                    line_colors[data['layer']] += data['line_colors']
-                    mesh_tris[data['layer']] += [x + len(mesh_vertices[data['layer']])
-                                                 for x in data['mesh_tris']]
-
-                    mesh_vertices[data['layer']] += data['mesh_vertices']
-                    mesh_colors[data['layer']] += data['mesh_colors']
+                    layer = data['layer']
+                    if len(data['line_pts']) > 0:
+                        line_pts[layer].append(np.asarray(data['line_pts'], dtype=float).reshape((-1, 2)))
+                        line_colors[layer].append(np.asarray(data['line_colors'], dtype=float).reshape((-1, 4)))
+
+                    if len(data['mesh_vertices']) > 0:
+                        mesh_tris[layer].append(np.asarray(data['mesh_tris'], dtype=np.uint32) + mesh_counts[layer])
+                        mesh_vertices[layer].append(np.asarray(data['mesh_vertices'], dtype=float)
+                                                    .reshape((-1, 2)))
+                        mesh_colors[layer].append(np.asarray(data['mesh_colors'], dtype=float).reshape((-1, 4)))
+                        mesh_counts[layer] += len(mesh_vertices[layer][-1])
                 except Exception as e:
                     print "Data error", e
 
@@ -314,8 +526,8 @@ class ShapeCollectionVisual(CompoundVisual):
         for i, mesh in enumerate(self._meshes):
             if len(mesh_vertices[i]) > 0:
                 set_state(polygon_offset_fill=False)
-                mesh.set_data(np.asarray(mesh_vertices[i]), np.asarray(mesh_tris[i], dtype=np.uint32)
-                              .reshape((-1, 3)), face_colors=np.asarray(mesh_colors[i]))
+                mesh.set_data(np.concatenate(mesh_vertices[i]), np.concatenate(mesh_tris[i]).reshape((-1, 3)),
+                              face_colors=np.concatenate(mesh_colors[i]))
             else:
                 mesh.set_data()
 
@@ -324,7 +536,8 @@ class ShapeCollectionVisual(CompoundVisual):
         # Updating lines
         for i, line in enumerate(self._lines):
             if len(line_pts[i]) > 0:
-                line.set_data(np.asarray(line_pts[i]), np.asarray(line_colors[i]), self._line_width, 'segments')
+                line.set_data(np.concatenate(line_pts[i]), np.concatenate(line_colors[i]), self._line_width,
+                              'segments')
             else:
                 line.clear_data()
 
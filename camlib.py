@@ -13,14 +13,18 @@ from cStringIO import StringIO
 from numpy import arctan2, Inf, array, sqrt, pi, ceil, sin, cos, dot, float32, \
     transpose
 from numpy.linalg import solve, norm
+from math import hypot
+import os
 import re
 import sys
+import time
 import traceback
 from decimal import Decimal
 
 import collections
 import numpy as np
 #from scipy.spatial import Delaunay, KDTree
+from scipy.spatial import cKDTree
 
 from rtree import index as rtindex
 
@@ -29,9 +33,11 @@ from shapely.geometry import Polygon, LineString, Point, LinearRing
 from shapely.geometry import MultiPoint, MultiPolygon
 from shapely.geometry import box as shply_box
 from shapely.ops import cascaded_union
+from shapely.prepared import prep
 import shapely.affinity as affinity
 from shapely.wkt import loads as sloads
 from shapely.wkt import dumps as sdumps
+from shapely.wkb import loads as wkb_loads
 from shapely.geometry.base import BaseGeometry
 
 # Used for solid polygons in Matplotlib
@@ -46,6 +52,9 @@ import itertools
 from svgparse import *
 
 import logging
+import mmap
+import multiprocessing
+from multiprocessing import Pool
 
 log = logging.getLogger('base2')
 log.setLevel(logging.DEBUG)
@@ -83,6 +92,10 @@ class Geometry(object):
         # Flattened geometry (list of paths only)
         self.flat_geometry = []
 
+        # Offset, time and points of each pass of the last
+        # isolation_passes()
+        self.isolation_stats = None
+
     def add_circle(self, origin, radius):
         """
         Adds a circle to the object.
@@ -391,6 +404,78 @@ class Geometry(object):
         """
         return self.solid_geometry.buffer(offset)
 
+    def isolation_passes(self, offsets, incremental=False, workers=1):
+        """
+        Same as isolation_geometry() for each of the offsets.
+
+        The passes are either independent, run in ``workers``
+        processes, or, if ``incremental``, each one is the previous
+        pass buffered by the step between their offsets. Envelopes
+        have fewer and simpler polygons than the geometry, so outer
+        passes can get cheaper. Each envelope is simplified within
+        the error of its round joins before it is buffered again, so
+        that the number of points does not grow from pass to pass.
+        Offsets that do not grow are buffered from
+        ``self.solid_geometry``.
+
+        The offset, time in seconds and number of points of each
+        pass are left in ``self.isolation_stats``.
+
+        :param offsets: List of offset distances.
+        :param incremental: Derive each pass from the previous one.
+        :param workers: Number of processes for independent passes.
+            0 for one per CPU, 1 to buffer in this process.
+        :return: The buffered geometry for each offset.
+        :rtype: list
+        """
+
+        def count_points(geo):
+            polygons = geo.geoms if hasattr(geo, 'geoms') else [geo]
+            return sum(len(p.exterior.coords) + sum(len(i.coords) for i in p.interiors)
+                       for p in polygons if not p.is_empty)
+
+        passes = []
+        times = []
+        if incremental:
+            for k, offset in enumerate(offsets):
+                t0 = time.time()
+                step = offset - offsets[k - 1] if k > 0 else 0.0
+                if step > 0:
+                    # Within the error of the round joins of the
+                    # previous pass, 16 segments per quadrant, so the
+                    # points along its arcs are not all buffered again.
+                    tolerance = offsets[k - 1] * (1 - cos(pi / 64))
+                    geo = passes[-1].simplify(tolerance).buffer(step)
+                else:
+                    geo = self.isolation_geometry(offset)
+                passes.append(geo)
+                times.append(time.time() - t0)
+
+        elif workers == 1 or len(offsets) < 2 or self.solid_geometry.is_empty:
+            for offset in offsets:
+                t0 = time.time()
+                passes.append(self.isolation_geometry(offset))
+                times.append(time.time() - t0)
+
+        else:
+            geometry = self.solid_geometry.wkb
+            pool = Pool(processes=(workers or None))
+            try:
+                results = pool.map(isolation_geometry_wkb, [(geometry, offset) for offset in offsets])
+            finally:
+                pool.close()
+                pool.join()
+            for geo, seconds in results:
+                passes.append(wkb_loads(geo))
+                times.append(seconds)
+
+        self.isolation_stats = [{"offset": offset, "time": seconds, "points": count_points(geo)}
+                                for offset, seconds, geo in zip(offsets, times, passes)]
+        for stats in self.isolation_stats:
+            log.debug("Isolation pass at %(offset).4f: %(points)d points, %(time).3f s." % stats)
+
+        return passes
+
     def import_svg(self, filename, flip=True):
         """
         Imports shapes from an SVG file into the object's geometry.
@@ -469,7 +554,7 @@ class Geometry(object):
         # Index first and last points in paths
         def get_pts(o):
             return [o.coords[0], o.coords[-1]]
-        geoms = FlatCAMRTreeStorage()
+        geoms = FlatCAMKDTreeStorage()
         geoms.get_points = get_pts
 
         # Can only result in a Polygon or MultiPolygon
@@ -542,7 +627,7 @@ class Geometry(object):
         # Index first and last points in paths
         def get_pts(o):
             return [o.coords[0], o.coords[-1]]
-        geoms = FlatCAMRTreeStorage()
+        geoms = FlatCAMKDTreeStorage()
         geoms.get_points = get_pts
 
         # Path margin
@@ -621,13 +706,13 @@ class Geometry(object):
         within the paint area. This avoids unnecessary tool lifting.
 
         :param storage: Geometry to be optimized.
-        :type storage: FlatCAMRTreeStorage
+        :type storage: FlatCAMKDTreeStorage or FlatCAMRTreeStorage
         :param boundary: Polygon defining the limits of the paintable area.
         :type boundary: Polygon
         :param max_walk: Maximum allowable distance without lifting tool.
         :type max_walk: float or None
         :return: Optimized geometry.
-        :rtype: FlatCAMRTreeStorage
+        :rtype: FlatCAMKDTreeStorage
         """
 
         # If max_walk is not specified, the maximum allowed is
@@ -650,16 +735,25 @@ class Geometry(object):
         #         storage.insert(LineString(shape))
         #         #storage.insert(shape)
 
+        ## A straight move keeps the tool inside the boundary if the
+        # move itself is inside the boundary shrunk by the tool radius.
+        # Prepared once to test all the moves against it. Shrunk a
+        # little less, so moves along the edge of the shrunk boundary,
+        # as between the ends of the paths, are not rejected for
+        # rounding errors.
+        inside = prep(boundary.buffer(-tooldia / 2.0 * (1 - 1e-9)))
+
         ## Iterate over geometry paths getting the nearest each time.
-        #optimized_paths = []
-        optimized_paths = FlatCAMRTreeStorage()
+        optimized_paths = FlatCAMKDTreeStorage()
         optimized_paths.get_points = get_pts
         path_count = 0
         current_pt = (0, 0)
         pt, geo = storage.nearest(current_pt)
         storage.remove(geo)
-        geo = LineString(geo)
-        current_pt = geo.coords[-1]
+
+        # Coordinates of the path being joined.
+        coords = list(geo.coords)
+        current_pt = coords[-1]
         try:
             while True:
                 path_count += 1
@@ -667,54 +761,55 @@ class Geometry(object):
 
                 pt, candidate = storage.nearest(current_pt)
                 storage.remove(candidate)
-                candidate = LineString(candidate)
+                candidate = list(candidate.coords)
 
                 # If last point in geometry is the nearest
                 # then reverse coordinates.
                 # but prefer the first one if last == first
-                if pt != candidate.coords[0] and pt == candidate.coords[-1]:
-                    candidate.coords = list(candidate.coords)[::-1]
+                if pt != candidate[0] and pt == candidate[-1]:
+                    candidate.reverse()
 
                 # Straight line from current_pt to pt.
                 # Is the toolpath inside the geometry?
                 walk_path = LineString([current_pt, pt])
-                walk_cut = walk_path.buffer(tooldia / 2)
 
-                if walk_cut.within(boundary) and walk_path.length < max_walk:
+                if walk_path.length < max_walk and inside.covers(walk_path):
                     #log.debug("Walk to path #%d is inside. Joining." % path_count)
 
                     # Completely inside. Append...
-                    geo.coords = list(geo.coords) + list(candidate.coords)
-                    # try:
-                    #     last = optimized_paths[-1]
-                    #     last.coords = list(last.coords) + list(geo.coords)
-                    # except IndexError:
-                    #     optimized_paths.append(geo)
+                    coords.extend(candidate)
 
                 else:
 
                     # Have to lift tool. End path.
                     #log.debug("Path #%d not within boundary. Next." % path_count)
-                    #optimized_paths.append(geo)
-                    optimized_paths.insert(geo)
-                    geo = candidate
-
-                current_pt = geo.coords[-1]
+                    optimized_paths.insert(LineString(coords))
+                    coords = candidate
 
-                # Next
-                #pt, geo = storage.nearest(current_pt)
+                current_pt = coords[-1]
 
         except StopIteration:  # Nothing left in storage.
-            #pass
-            optimized_paths.insert(geo)
+            optimized_paths.insert(LineString(coords))
 
         return optimized_paths
 
     @staticmethod
     def path_connect(storage, origin=(0, 0)):
         """
+        Joins paths that end where another one starts or ends, so
+        they can be cut without lifting the tool.
 
-        :return: None
+        LineStrings are joined at exactly matching ends. Where more
+        than two ends meet, they are joined in pairs. Other geometry,
+        like LinearRings, is left as is. Every path is copied once,
+        into the joined path it belongs to.
+
+        :param storage: Paths to join. Emptied.
+        :type storage: FlatCAMKDTreeStorage or FlatCAMRTreeStorage
+        :param origin: Where the tool is before the first path. The
+            joined paths are in the order of ``greedy_path_order()``.
+        :return: Joined paths.
+        :rtype: FlatCAMKDTreeStorage
         """
 
         log.debug("path_connect()")
@@ -722,99 +817,62 @@ class Geometry(object):
         ## Index first and last points in paths
         def get_pts(o):
             return [o.coords[0], o.coords[-1]]
-        #
-        # storage = FlatCAMRTreeStorage()
-        # storage.get_points = get_pts
-        #
-        # for shape in pathlist:
-        #     if shape is not None:  # TODO: This shouldn't have happened.
-        #         storage.insert(shape)
 
-        path_count = 0
-        pt, geo = storage.nearest(origin)
-        storage.remove(geo)
-        #optimized_geometry = [geo]
-        optimized_geometry = FlatCAMRTreeStorage()
+        paths = list(storage.get_objects())
+        for geo in paths:
+            storage.remove(geo)
+
+        lines = [geo for geo in paths if type(geo) == LineString]
+        joined = [geo for geo in paths if type(geo) != LineString]
+
+        ## Ends meeting at every point. End 2 * i is the first
+        # point of lines[i] and 2 * i + 1 its last point.
+        ends_at = {}
+        for i, geo in enumerate(lines):
+            ends_at.setdefault(geo.coords[0], []).append(2 * i)
+            ends_at.setdefault(geo.coords[-1], []).append(2 * i + 1)
+
+        ## Join them in pairs, not to the other end of the same
+        # line if possible.
+        partner = [None] * (2 * len(lines))
+        for ends in ends_at.itervalues():
+            while len(ends) > 1:
+                a = ends.pop(0)
+                others = [e for e in ends if e // 2 != a // 2]
+                if not others:
+                    break
+                b = others[0]
+                ends.remove(b)
+                partner[a] = b
+                partner[b] = a
+
+        ## Walk the chains from their loose ends, then the loops.
+        done = [False] * len(lines)
+
+        def walk(end):
+            parts = []
+            while end is not None and not done[end // 2]:
+                done[end // 2] = True
+                coords = np.asarray(lines[end // 2].coords)
+                if end % 2 == 1:
+                    coords = coords[::-1]
+                # The joint is in both.
+                parts.append(coords[1:] if parts else coords)
+                end = partner[end ^ 1]
+            return np.concatenate(parts)
+
+        loose = [e for e in range(2 * len(lines)) if partner[e] is None]
+        for end in loose + range(0, 2 * len(lines), 2):
+            if not done[end // 2]:
+                joined.append(LineString(walk(end)))
+
+        log.debug("%d paths joined into %d" % (len(paths), len(joined)))
+
+        optimized_geometry = FlatCAMKDTreeStorage()
         optimized_geometry.get_points = get_pts
-        #optimized_geometry.insert(geo)
-        try:
-            while True:
-                path_count += 1
-
-                #print "geo is", geo
-
-                _, left = storage.nearest(geo.coords[0])
-                #print "left is", left
-
-                # If left touches geo, remove left from original
-                # storage and append to geo.
-                if type(left) == LineString:
-                    if left.coords[0] == geo.coords[0]:
-                        storage.remove(left)
-                        geo.coords = list(geo.coords)[::-1] + list(left.coords)
-                        continue
-
-                    if left.coords[-1] == geo.coords[0]:
-                        storage.remove(left)
-                        geo.coords = list(left.coords) + list(geo.coords)
-                        continue
-
-                    if left.coords[0] == geo.coords[-1]:
-                        storage.remove(left)
-                        geo.coords = list(geo.coords) + list(left.coords)
-                        continue
-
-                    if left.coords[-1] == geo.coords[-1]:
-                        storage.remove(left)
-                        geo.coords = list(geo.coords) + list(left.coords)[::-1]
-                        continue
-
-                _, right = storage.nearest(geo.coords[-1])
-                #print "right is", right
-
-                # If right touches geo, remove left from original
-                # storage and append to geo.
-                if type(right) == LineString:
-                    if right.coords[0] == geo.coords[-1]:
-                        storage.remove(right)
-                        geo.coords = list(geo.coords) + list(right.coords)
-                        continue
-
-                    if right.coords[-1] == geo.coords[-1]:
-                        storage.remove(right)
-                        geo.coords = list(geo.coords) + list(right.coords)[::-1]
-                        continue
-
-                    if right.coords[0] == geo.coords[0]:
-                        storage.remove(right)
-                        geo.coords = list(geo.coords)[::-1] + list(right.coords)
-                        continue
-
-                    if right.coords[-1] == geo.coords[0]:
-                        storage.remove(right)
-                        geo.coords = list(left.coords) + list(geo.coords)
-                        continue
-
-                # right is either a LinearRing or it does not connect
-                # to geo (nothing left to connect to geo), so we continue
-                # with right as geo.
-                storage.remove(right)
-
-                if type(right) == LinearRing:
-                    optimized_geometry.insert(right)
-                else:
-                    # Cannot exteng geo any further. Put it away.
-                    optimized_geometry.insert(geo)
-
-                    # Continue with right.
-                    geo = right
-
-        except StopIteration:  # Nothing found in storage.
+        for geo in greedy_path_order(joined, origin):
             optimized_geometry.insert(geo)
 
-        #print path_count
-        log.debug("path_count = %d" % path_count)
-
         return optimized_geometry
 
     def convert_units(self, units):
@@ -1079,16 +1137,32 @@ class ApertureMacro:
         return x
 
     @staticmethod
-    def make_circle(mods):
+    def make_circle(mods, max_error=0.0):
         """
 
         :param mods: (Exposure 0/1, Diameter >=0, X-coord, Y-coord)
+        :param max_error: See ``ApertureMacro.circle()``.
         :return:
         """
 
         pol, dia, x, y = ApertureMacro.default2zero(4, mods)
 
-        return {"pol": int(pol), "geometry": Point(x, y).buffer(dia/2)}
+        return {"pol": int(pol), "geometry": ApertureMacro.circle(x, y, dia/2, max_error)}
+
+    @staticmethod
+    def circle(x, y, radius, max_error=0.0):
+        """
+        Circle for the primitives. Shapely's default resolution
+        is used if ``max_error`` is 0, see ``circle_polygon()``
+        otherwise.
+
+        :return: Circle
+        :rtype: Polygon
+        """
+        if max_error > 0:
+            return circle_polygon((x, y), radius, max_error)
+
+        return Point(x, y).buffer(radius)
 
     @staticmethod
     def make_vectorline(mods):
@@ -1184,7 +1258,7 @@ class ApertureMacro:
         return {"pol": int(pol), "geometry": poly_rotated}
 
     @staticmethod
-    def make_moire(mods):
+    def make_moire(mods, max_error=0.0):
         """
         Note: Specs indicate that rotation is only allowed if the center
         (x, y) == (0, 0). I will tolerate breaking this rule.
@@ -1198,8 +1272,8 @@ class ApertureMacro:
         x, y, dia, thickness, gap, nrings, cross_th, cross_len, angle = ApertureMacro.default2zero(9, mods)
 
         r = dia/2 - thickness/2
-        result = Point((x, y)).buffer(r).exterior.buffer(thickness/2.0)
-        ring = Point((x, y)).buffer(r).exterior.buffer(thickness/2.0)  # Need a copy!
+        result = ApertureMacro.circle(x, y, r, max_error).exterior.buffer(thickness/2.0)
+        ring = ApertureMacro.circle(x, y, r, max_error).exterior.buffer(thickness/2.0)  # Need a copy!
 
         i = 1  # Number of rings created so far
 
@@ -1209,7 +1283,7 @@ class ApertureMacro:
             r -= thickness + gap
             if r <= 0:
                 break
-            ring = Point((x, y)).buffer(r).exterior.buffer(thickness/2.0)
+            ring = ApertureMacro.circle(x, y, r, max_error).exterior.buffer(thickness/2.0)
             result = cascaded_union([result, ring])
             i += 1
 
@@ -1221,7 +1295,7 @@ class ApertureMacro:
         return {"pol": 1, "geometry": result}
 
     @staticmethod
-    def make_thermal(mods):
+    def make_thermal(mods, max_error=0.0):
         """
         Note: Specs indicate that rotation is only allowed if the center
         (x, y) == (0, 0). I will tolerate breaking this rule.
@@ -1233,35 +1307,39 @@ class ApertureMacro:
 
         x, y, dout, din, t, angle = ApertureMacro.default2zero(6, mods)
 
-        ring = Point((x, y)).buffer(dout/2.0).difference(Point((x, y)).buffer(din/2.0))
+        ring = ApertureMacro.circle(x, y, dout/2.0, max_error).difference(
+            ApertureMacro.circle(x, y, din/2.0, max_error))
         hline = LineString([(x - dout/2.0, y), (x + dout/2.0, y)]).buffer(t/2.0, cap_style=3)
         vline = LineString([(x, y - dout/2.0), (x, y + dout/2.0)]).buffer(t/2.0, cap_style=3)
         thermal = ring.difference(hline.union(vline))
 
         return {"pol": 1, "geometry": thermal}
 
-    def make_geometry(self, modifiers):
+    def make_geometry(self, modifiers, max_error=0.0):
         """
         Runs the macro for the given modifiers and generates
         the corresponding geometry.
 
         :param modifiers: Modifiers (parameters) for this macro
         :type modifiers: list
+        :param max_error: Maximum error of circles, 0 for
+            Shapely's default resolution.
+        :type max_error: float
         :return: Shapely geometry
         :rtype: shapely.geometry.polygon
         """
 
         ## Primitive makers
         makers = {
-            "1": ApertureMacro.make_circle,
+            "1": lambda mods: ApertureMacro.make_circle(mods, max_error),
             "2": ApertureMacro.make_vectorline,
             "20": ApertureMacro.make_vectorline,
             "21": ApertureMacro.make_centerline,
             "22": ApertureMacro.make_lowerleftline,
             "4": ApertureMacro.make_outline,
             "5": ApertureMacro.make_polygon,
-            "6": ApertureMacro.make_moire,
-            "7": ApertureMacro.make_thermal
+            "6": lambda mods: ApertureMacro.make_moire(mods, max_error),
+            "7": lambda mods: ApertureMacro.make_thermal(mods, max_error)
         }
 
         ## Store modifiers as local variables
@@ -1295,6 +1373,366 @@ class ApertureMacro:
         return self.geometry
 
 
+# Drawing operation read from a Gerber file, see Gerber.parse_lines().
+#
+# * op: 'stroke', 'flash', 'region' (closed by G37), 'contour'
+#   (closed by D02 in region mode) or 'polarity' (start of a layer).
+# * aperture: Aperture id for strokes and flashes.
+# * shape: Width of a stroke or the aperture definition (dict)
+#   of a flash.
+# * polarity: 'D' or 'C'.
+# * coords: [x, y] points of the path or (x, y) of the flash.
+# * arcs: Arcs in the path as (index of first point, number of
+#   points, center, radius, start, stop, direction).
+# * line: Number of the line in the file, for error messages.
+GerberRecord = collections.namedtuple('GerberRecord',
+                                      ['op', 'aperture', 'shape', 'polarity', 'coords', 'arcs', 'line'])
+GerberRecord.__new__.__defaults__ = (None,)
+
+
+class FlashTemplateCache(object):
+    """
+    Cache of aperture shapes used by ``Gerber.parse_lines()`` for flashes
+    (D03). The shape of every aperture is built only once, centered at the
+    origin, and each flash is produced by adding the flash location to the
+    coordinate arrays of the template.
+
+    Templates are keyed by aperture id and, for aperture macros, by the
+    modifiers. A template is rebuilt when the definition of its aperture
+    changes and all templates are dropped when ``steps_per_circ`` changes.
+    """
+
+    def __init__(self):
+        # (apid, modifiers) -> {'signature': ..., 'parts': ..., 'geometry': ...}
+        self.templates = {}
+
+        # steps_per_circ and max_error the templates were built with.
+        self.steps_per_circ = None
+        self.max_error = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """
+        Drops all templates and resets the counters.
+
+        :return: None
+        """
+        self.templates = {}
+        self.steps_per_circ = None
+        self.max_error = None
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        :return: Number of templates, hits and misses.
+        :rtype: dict
+        """
+        return {'templates': len(self.templates),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    @staticmethod
+    def signature(aperture):
+        """
+        Hashable description of an aperture definition. Used to detect
+        that the aperture has changed since its template was built.
+
+        :param aperture: Aperture definition as in ``Gerber.apertures``.
+        :type aperture: dict
+        :return: Hashable signature.
+        :rtype: tuple
+        """
+        if aperture['type'] == 'AM':
+            return ('AM', aperture['macro'].name, aperture['macro'].raw,
+                    tuple(aperture['modifiers'] or []))
+
+        return tuple(sorted(aperture.items()))
+
+    def get(self, apid, aperture, steps_per_circ, max_error=0.0):
+        """
+        Returns the template for the given aperture, building it
+        if it is missing or out of date.
+
+        :param apid: Aperture id (key in ``Gerber.apertures``).
+        :param aperture: Aperture definition.
+        :param steps_per_circ: Circle discretization of the parser.
+        :param max_error: Arc tolerance of the parser.
+        :return: Template dictionary.
+        :rtype: dict
+        """
+        if steps_per_circ != self.steps_per_circ or max_error != self.max_error:
+            self.templates = {}
+            self.steps_per_circ = steps_per_circ
+            self.max_error = max_error
+
+        if aperture['type'] == 'AM':
+            key = (apid, tuple(aperture['modifiers'] or []))
+        else:
+            key = (apid, None)
+
+        signature = FlashTemplateCache.signature(aperture)
+        template = self.templates.get(key)
+        if template is not None and template['signature'] == signature:
+            self.hits += 1
+            return template
+
+        self.misses += 1
+        geo = Gerber.create_flash_geometry(Point(0, 0), aperture, max_error)
+        template = {'signature': signature, 'geometry': geo, 'parts': None}
+
+        # Polygons are stored as coordinate arrays. Anything else
+        # is translated with shapely.
+        if type(geo) == Polygon:
+            template['parts'] = [FlashTemplateCache.polygon_arrays(geo)]
+        elif type(geo) == MultiPolygon:
+            template['parts'] = [FlashTemplateCache.polygon_arrays(p) for p in geo]
+
+        self.templates[key] = template
+        return template
+
+    @staticmethod
+    def polygon_arrays(polygon):
+        """
+        :param polygon: Shapely polygon.
+        :return: Exterior and list of interiors as Nx2 arrays.
+        :rtype: tuple
+        """
+        if polygon.is_empty:
+            return None
+        return (np.array(polygon.exterior.coords),
+                [np.array(interior.coords) for interior in polygon.interiors])
+
+    def flash(self, apid, aperture, steps_per_circ, x, y, max_error=0.0):
+        """
+        Geometry of the given aperture flashed at (x, y).
+
+        :param apid: Aperture id (key in ``Gerber.apertures``).
+        :param aperture: Aperture definition.
+        :param steps_per_circ: Circle discretization of the parser.
+        :param x: X coordinate of the flash.
+        :param y: Y coordinate of the flash.
+        :param max_error: Arc tolerance of the parser.
+        :return: Flash geometry.
+        :rtype: Polygon or MultiPolygon
+        """
+        template = self.get(apid, aperture, steps_per_circ, max_error)
+        parts = template['parts']
+
+        if parts is None:
+            if template['geometry'] is None:
+                return None
+            return affinity.translate(template['geometry'], xoff=x, yoff=y)
+
+        offset = np.array([x, y])
+        polygons = [Polygon(part[0] + offset, [hole + offset for hole in part[1]])
+                    for part in parts if part is not None]
+
+        if len(polygons) == 0:
+            return Polygon()
+
+        if type(template['geometry']) == Polygon:
+            return polygons[0]
+
+        return MultiPolygon(polygons)
+
+
+class PolarityEngine(object):
+    """
+    Accumulates the dark (LPD) and clear (LPC) layers of a Gerber file
+    into solid geometry.
+
+    The dark geometry is kept as separate polygons indexed by their
+    bounds, so each layer is only combined with the polygons it can
+    touch instead of with the whole board.
+    """
+
+    def __init__(self, geometry=None):
+        """
+        :param geometry: Initial dark geometry.
+        :type geometry: Polygon or MultiPolygon
+        """
+        # id -> polygon
+        self.polygons = {}
+
+        # Bounds of self.polygons
+        self.index = rtindex.Index()
+
+        self.next_id = 0
+
+        if geometry is not None:
+            self.insert(PolarityEngine.explode(geometry))
+
+    @staticmethod
+    def explode(geometry):
+        """
+        :return: Non-empty polygons in the geometry.
+        :rtype: list
+        """
+        if geometry is None or geometry.is_empty:
+            return []
+
+        if type(geometry) == Polygon:
+            return [geometry]
+
+        return [geo for geo in getattr(geometry, 'geoms', [])
+                if type(geo) == Polygon and not geo.is_empty]
+
+    def insert(self, polygons):
+        for poly in polygons:
+            self.polygons[self.next_id] = poly
+            self.index.insert(self.next_id, poly.bounds)
+            self.next_id += 1
+
+    def remove(self, polyid):
+        self.index.delete(polyid, self.polygons[polyid].bounds)
+        return self.polygons.pop(polyid)
+
+    def touching(self, polygon):
+        """
+        :return: Ids of the stored polygons that intersect or
+            touch the given one.
+        :rtype: list
+        """
+        return [polyid for polyid in self.index.intersection(polygon.bounds)
+                if self.polygons[polyid].intersects(polygon)]
+
+    def apply(self, polarity, geometry):
+        """
+        Adds (dark) or subtracts (clear) a layer.
+
+        :param polarity: 'D' for dark or 'C' for clear.
+        :param geometry: Joined geometry of the layer.
+        :type geometry: Polygon or MultiPolygon
+        :return: None
+        """
+        parts = PolarityEngine.explode(geometry)
+
+        if polarity == 'D':
+            touched = set()
+            for part in parts:
+                touched.update(self.touching(part))
+
+            if len(touched) == 0:
+                self.insert(parts)
+                return
+
+            merged = cascaded_union(parts + [self.remove(polyid) for polyid in touched])
+            self.insert(PolarityEngine.explode(merged))
+            return
+
+        # Clear: each stored polygon loses the clear parts it touches.
+        cuts = collections.defaultdict(list)
+        for part in parts:
+            for polyid in self.touching(part):
+                cuts[polyid].append(part)
+
+        for polyid in cuts:
+            poly = self.remove(polyid)
+            if len(cuts[polyid]) == 1:
+                clear = cuts[polyid][0]
+            else:
+                clear = cascaded_union(cuts[polyid])
+            self.insert(PolarityEngine.explode(poly.difference(clear)))
+
+    def geometry(self):
+        """
+        :return: The accumulated geometry.
+        :rtype: Polygon or MultiPolygon
+        """
+        polygons = [self.polygons[polyid] for polyid in sorted(self.polygons)]
+
+        if len(polygons) == 0:
+            return Polygon()
+
+        if len(polygons) == 1:
+            return polygons[0]
+
+        return MultiPolygon(polygons)
+
+
+class ParseProfile(object):
+    """
+    Measurements of a parser run, collected when assigned to the
+    ``profile`` attribute of a Gerber or Excellon object before
+    parsing. Nothing is measured when ``profile`` is None.
+
+    Times are cumulative, in seconds:
+
+    * *regex*: Classifying statements with regular expressions.
+    * *statements*: Everything else done per statement, including
+      reading the file.
+    * *geometry*: Creating the polygons.
+    * *union*: Joining the polygons and applying polarity.
+    """
+
+    def __init__(self, kind=None, filename=None):
+        self.kind = kind
+        self.filename = filename
+
+        # Statement class -> number of lines
+        self.statements = collections.defaultdict(int)
+
+        self.times = collections.OrderedDict([
+            ('total', 0.0),
+            ('regex', 0.0),
+            ('statements', 0.0),
+            ('geometry', 0.0),
+            ('union', 0.0)
+        ])
+
+        self.polygons_before_union = 0
+        self.polygons_after_union = 0
+
+        # Additional counters, like flash cache hits.
+        self.extra = {}
+
+    def count(self, statement):
+        """
+        Counts a line of the given statement class.
+        None stands for lines that were ignored.
+        """
+        self.statements[statement or 'ignored'] += 1
+
+    def report(self):
+        """
+        :return: Machine-readable report.
+        :rtype: dict
+        """
+        return {
+            'kind': self.kind,
+            'filename': self.filename,
+            'lines': sum(self.statements.values()),
+            'statements': dict(self.statements),
+            'times': dict(self.times),
+            'polygons_before_union': self.polygons_before_union,
+            'polygons_after_union': self.polygons_after_union,
+            'extra': self.extra
+        }
+
+    def to_json(self):
+        return json.dumps(self.report(), indent=2, sort_keys=True)
+
+    def summary(self):
+        """
+        :return: Human-readable report.
+        :rtype: str
+        """
+        lines = ["%s: %s" % (self.kind, self.filename),
+                 "Lines: %d" % sum(self.statements.values())]
+        for statement, count in sorted(self.statements.items(), key=lambda item: -item[1]):
+            lines.append("    %-16s %8d" % (statement, count))
+        for name, seconds in self.times.items():
+            lines.append("%-20s %8.3f s" % (name.capitalize() + ":", seconds))
+        lines.append("Polygons: %d before union, %d after." %
+                     (self.polygons_before_union, self.polygons_after_union))
+        for name in sorted(self.extra):
+            lines.append("%s: %s" % (name, self.extra[name]))
+        return "\n".join(lines)
+
+
 class Gerber (Geometry):
     """
     **ATTRIBUTES**
@@ -1334,7 +1772,14 @@ class Gerber (Geometry):
 
     defaults = {
         "steps_per_circle": 40,
-        "use_buffer_for_union": True
+        "use_buffer_for_union": True,
+        "union_tiles": 1,
+        "union_workers": 0,
+        "build_workers": 1,
+        "ncc_workers": 1,
+        "iso_incremental": False,
+        "iso_workers": 1,
+        "arc_tolerance": 0.0
     }
 
     def __init__(self, steps_per_circle=None):
@@ -1451,11 +1896,61 @@ class Gerber (Geometry):
         self.am1_re = re.compile(r'^%AM([^\*]+)\*([^%]+)?(%)?$')
         self.am2_re = re.compile(r'(.*)%$')
 
+        # Leading G-code number, one leading zero dropped (G01 -> 1)
+        self.gcode_re = re.compile(r'^G0?(\d*)')
+
+        # Patterns by statement class, as used by tokenize()
+        self.statement_patterns = {
+            'am1': self.am1_re, 'lin': self.lin_re, 'circ': self.circ_re,
+            'opcode': self.opcode_re, 'quad': self.quad_re,
+            'regionon': self.regionon_re, 'regionoff': self.regionoff_re,
+            'ad': self.ad_re, 'interp': self.interp_re, 'tool': self.tool_re,
+            'lpol': self.lpol_re, 'fmt': self.fmt_re, 'mode': self.mode_re,
+            'units': self.units_re, 'absrel': self.absrel_re,
+            'comm': self.comm_re, 'eof': self.eof_re
+        }
+
         # How to discretize a circle.
         self.steps_per_circ = steps_per_circle or Gerber.defaults['steps_per_circle']
 
+        # Maximum distance from arcs and circles to their segments.
+        # If not 0, used instead of steps_per_circ.
+        self.arc_tolerance = self.defaults['arc_tolerance']
+
         self.use_buffer_for_union = self.defaults["use_buffer_for_union"]
 
+        # Final union is split into union_tiles x union_tiles tiles
+        # processed by union_workers processes (0 = one per CPU).
+        self.union_tiles = self.defaults["union_tiles"]
+        self.union_workers = self.defaults["union_workers"]
+
+        # Aperture shapes built once and reused for every flash.
+        self.flash_cache = FlashTemplateCache()
+
+        # Strokes are buffered by build_workers processes
+        # (0 = one per CPU, 1 = no extra processes).
+        self.build_workers = self.defaults["build_workers"]
+
+        # Polygons of non-copper clearing are processed by
+        # ncc_workers processes (0 = one per CPU, 1 = no extra
+        # processes).
+        self.ncc_workers = self.defaults["ncc_workers"]
+
+        # Isolation passes are derived one from the previous
+        # (iso_incremental) or buffered independently by
+        # iso_workers processes (0 = one per CPU, 1 = no extra
+        # processes).
+        self.iso_incremental = self.defaults["iso_incremental"]
+        self.iso_workers = self.defaults["iso_workers"]
+
+        # Drawing operations from the last parse (GerberRecord)
+        # and (steps_per_circ, arc_tolerance) used for their arcs.
+        self.records = []
+        self.records_resolution = None
+
+        # ParseProfile to fill when parsing, if any.
+        self.profile = None
+
     def scale(self, factor):
         """
         Scales the objects' geometry on the XY plane by a given factor.
@@ -1539,6 +2034,80 @@ class Gerber (Geometry):
     #     self.solid_geometry = affinity.scale(self.solid_geometry,
     #                                          xscale, yscale, origin=(px, py))
 
+    # Statement classes that can match a line, keyed by the line's
+    # leading command (see tokenize()). Each entry holds the classes
+    # tried before and after the FS check, in the same order the
+    # patterns were originally tried one after the other.
+    statement_dispatch = {
+        'X': (('lin', 'circ'), ()),
+        'Y': (('lin', 'circ'), ()),
+        'I': (('circ',), ()),
+        'J': (('circ',), ()),
+        'D': (('opcode', 'tool'), ()),
+        'M': ((), ('eof',)),
+        'G1': (('lin', 'interp'), ()),
+        'G2': (('circ', 'interp'), ()),
+        'G3': (('circ', 'interp'), ()),
+        'G4': ((), ('comm',)),
+        'G36': (('regionon',), ()),
+        'G37': (('regionoff',), ()),
+        'G54': (('tool',), ()),
+        'G70': ((), ('units',)),
+        'G71': ((), ('units',)),
+        'G74': (('quad',), ()),
+        'G75': (('quad',), ()),
+        'G90': ((), ('absrel',)),
+        'G91': ((), ('absrel',)),
+        '%AM': (('am1',), ()),
+        '%AD': (('ad',), ()),
+        '%LP': (('lpol',), ()),
+        '%MO': ((), ('mode',))
+    }
+
+    def tokenize(self, gline):
+        """
+        Classifies a single Gerber statement. Only the patterns
+        that can match the line's leading command are tried,
+        instead of every pattern in turn.
+
+        :param gline: Stripped line of Gerber code.
+        :type gline: str
+        :return: Statement class (a key of ``self.statement_patterns``)
+            and the corresponding match object, or ``(None, None)``
+            if the line is not recognized.
+        :rtype: tuple
+        """
+
+        lead = gline[:1]
+        if lead == 'G':
+            code = self.gcode_re.match(gline).group(1)
+            # G04, G4 and anything else starting with G4 is a comment.
+            key = 'G4' if code[:1] == '4' else 'G' + code
+        elif lead == '%':
+            key = gline[:3]
+        else:
+            key = lead
+
+        before, after = self.statement_dispatch.get(key, ((), ()))
+
+        for token in before:
+            match = self.statement_patterns[token].search(gline)
+            if match:
+                return token, match
+
+        # FS is not anchored at the beginning of the line.
+        if '%FS' in gline:
+            match = self.fmt_re.search(gline)
+            if match:
+                return 'fmt', match
+
+        for token in after:
+            match = self.statement_patterns[token].search(gline)
+            if match:
+                return token, match
+
+        return None, None
+
     def aperture_parse(self, apertureId, apertureType, apParameters):
         """
         Parse gerber aperture definition into dictionary of apertures.
@@ -1606,7 +2175,7 @@ class Gerber (Geometry):
         log.warning("Aperture not implemented: %s" % str(apertureType))
         return None
         
-    def parse_file(self, filename, follow=False):
+    def parse_file(self, filename, follow=False, mapped=True):
         """
         Calls Gerber.parse_lines() with generator of lines
         read from the given file. Will split the lines if multiple
@@ -1623,41 +2192,89 @@ class Gerber (Geometry):
         :param follow: If true, will not create polygons, just lines
             following the gerber path.
         :type follow: bool
+        :param mapped: Memory-map the file and find the statements
+            in a single scan (``Gerber.mapped_statements()``) instead
+            of splitting it line by line (``Gerber.line_statements()``).
+        :type mapped: bool
         :return: None
         """
 
-        with open(filename, 'r') as gfile:
+        with open(filename, 'rb' if mapped else 'r') as gfile:
+            if mapped:
+                statements = Gerber.mapped_statements(gfile)
+            else:
+                statements = Gerber.line_statements(gfile)
+
+            self.parse_lines(statements, follow=follow)
+
+    @staticmethod
+    def line_statements(gfile):
+        """
+        Generator of the statements in a file, reading it line by line.
+
+        :param gfile: Open file or any iterable of lines.
+        :return: Generator of statements.
+        """
+        for line in gfile:
+            line = line.strip(' \r\n')
+            while len(line) > 0:
 
-            def line_generator():
-                for line in gfile:
-                    line = line.strip(' \r\n')
-                    while len(line) > 0:
+                # If ends with '%' leave as is.
+                if line[-1] == '%':
+                    yield line
+                    break
 
-                        # If ends with '%' leave as is.
-                        if line[-1] == '%':
-                            yield line
-                            break
+                # Split after '*' if any.
+                starpos = line.find('*')
+                if starpos > -1:
+                    cleanline = line[:starpos + 1]
+                    yield cleanline
+                    line = line[starpos + 1:]
 
-                        # Split after '*' if any.
-                        starpos = line.find('*')
-                        if starpos > -1:
-                            cleanline = line[:starpos + 1]
-                            yield cleanline
-                            line = line[starpos + 1:]
+                # Otherwise leave as is.
+                else:
+                    # yield cleanline
+                    yield line
+                    break
+
+    # Statements as split by line_statements(), but matched in a
+    # single scan over the file:
+    # 1. A whole line if it ends with '%'.
+    # 2. Up to and including the next '*' in the line.
+    # 3. The rest of the line otherwise.
+    # Spaces and CR at both ends of the lines are left out.
+    statement_re = re.compile(r'^[ \r]*([^\n]*%)[ \r]*$|' +
+                              r'[ \r]*(?:([^\n*]*\*)|([^\n*]*[^\n* \r])[ \r]*$)', re.MULTILINE)
 
-                        # Otherwise leave as is.
-                        else:
-                            # yield cleanline
-                            yield line
-                            break
+    @staticmethod
+    def mapped_statements(gfile):
+        """
+        Generator of the statements in a file. The file is
+        memory-mapped and the statements are found by a single
+        regular expression scan over the whole buffer. Yields the
+        same statements as ``Gerber.line_statements()``, except
+        for leading spaces.
+
+        :param gfile: File open in binary mode.
+        :return: Generator of statements.
+        """
+        try:
+            buf = mmap.mmap(gfile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            return
 
-            self.parse_lines(line_generator(), follow=follow)
+        try:
+            for match in Gerber.statement_re.finditer(buf):
+                yield match.group(match.lastindex)
+        finally:
+            buf.close()
 
     #@profile
     def parse_lines(self, glines, follow=False):
         """
-        Main Gerber parser. Reads Gerber and populates ``self.paths``, ``self.apertures``,
-        ``self.flashes``, ``self.regions`` and ``self.units``.
+        Main Gerber parser. Reads Gerber and populates ``self.apertures``,
+        ``self.records`` and ``self.units``, then builds ``self.solid_geometry``
+        from the records with ``build_geometry()``.
 
         :param glines: Gerber code as list of strings, each element being
             one line of the source file.
@@ -1672,11 +2289,12 @@ class Gerber (Geometry):
         # Coordinates of the current path, each is [x, y]
         path = []
 
-        # Polygons are stored here until there is a change in polarity.
-        # Only then they are combined via cascaded_union and added or
-        # subtracted from solid_geometry. This is ~100 times faster than
-        # applyng a union for every new polygon.
-        poly_buffer = []
+        # Arcs in the current path, see GerberRecord.
+        path_arcs = []
+
+        # What to draw, in order. Geometry is created from
+        # these once the whole file has been read.
+        records = []
 
         last_path_aperture = None
         current_aperture = None
@@ -1709,9 +2327,14 @@ class Gerber (Geometry):
         # If a region is being defined
         making_region = False
 
+        profile = self.profile
+        if profile is not None:
+            regex_start = profile.times['regex']
+
         #### Parsing starts here ####
         line_num = 0
         gline = ""
+        t_start = time.time()
         try:
             for gline in glines:
                 line_num += 1
@@ -1722,13 +2345,19 @@ class Gerber (Geometry):
                 #log.debug("%3s %s" % (line_num, gline))
 
                 ### Aperture Macros
-                # Having this at the beggining will slow things down
-                # but macros can have complicated statements than could
-                # be caught by other patterns.
+                # Macro bodies can have complicated statements that could
+                # be caught by other patterns, so they are consumed here
+                # before classifying the line.
                 if current_macro is None:  # No macro started yet
-                    match = self.am1_re.search(gline)
+                    if profile is None:
+                        token, match = self.tokenize(gline)
+                    else:
+                        t0 = time.time()
+                        token, match = self.tokenize(gline)
+                        profile.times['regex'] += time.time() - t0
+                        profile.count(token)
                     # Start macro if match, else not an AM, carry on.
-                    if match:
+                    if token == 'am1':
                         log.debug("Starting macro. Line %d: %s" % (line_num, gline))
                         current_macro = match.group(1)
                         self.aperture_macros[current_macro] = ApertureMacro(name=current_macro)
@@ -1741,6 +2370,8 @@ class Gerber (Geometry):
                         continue
                 else:  # Continue macro
                     log.debug("Continuing macro. Line %d." % line_num)
+                    if profile is not None:
+                        profile.count('am2')
                     match = self.am2_re.search(gline)
                     if match:  # Finish macro
                         log.debug("End of macro. Line %d." % line_num)
@@ -1754,8 +2385,7 @@ class Gerber (Geometry):
                 ### G01 - Linear interpolation plus flashes
                 # Operation code (D0x) missing is deprecated... oh well I will support it.
                 # REGEX: r'^(?:G0?(1))?(?:X(-?\d+))?(?:Y(-?\d+))?(?:D0([123]))?\*$'
-                match = self.lin_re.search(gline)
-                if match:
+                if token == 'lin':
                     # Dxx alone?
                     # if match.group(1) is None and match.group(2) is None and match.group(3) is None:
                     #     try:
@@ -1786,24 +2416,18 @@ class Gerber (Geometry):
 
                             ## --- BUFFERED ---
                             if making_region:
-                                if follow:
-                                    geo = Polygon()
-                                else:
-                                    geo = Polygon(path)
+                                records.append(GerberRecord('contour', None, None,
+                                                            current_polarity, path, path_arcs, line=line_num))
                             else:
                                 if last_path_aperture is None:
                                     log.warning("No aperture defined for curent path. (%d)" % line_num)
                                 width = self.apertures[last_path_aperture]["size"]  # TODO: WARNING this should fail!
                                 #log.debug("Line %d: Setting aperture to %s before buffering." % (line_num, last_path_aperture))
-                                if follow:
-                                    geo = LineString(path)
-                                else:
-                                    geo = LineString(path).buffer(width / 2)
-
-                            if not geo.is_empty:
-                                poly_buffer.append(geo)
+                                records.append(GerberRecord('stroke', last_path_aperture, width,
+                                                            current_polarity, path, path_arcs, line=line_num))
 
                         path = [[current_x, current_y]]  # Start new path
+                        path_arcs = []
 
                     # Flash
                     # Not allowed in region mode.
@@ -1814,32 +2438,24 @@ class Gerber (Geometry):
                             # --- Buffered ----
                             width = self.apertures[last_path_aperture]["size"]
 
-                            if follow:
-                                geo = LineString(path)
-                            else:
-                                geo = LineString(path).buffer(width / 2)
-
-                            if not geo.is_empty:
-                                poly_buffer.append(geo)
+                            records.append(GerberRecord('stroke', last_path_aperture, width,
+                                                        current_polarity, path, path_arcs, line=line_num))
 
                         # Reset path starting point
                         path = [[current_x, current_y]]
+                        path_arcs = []
 
                         # --- BUFFERED ---
                         # Draw the flash
-                        if follow:
-                            continue
-                        flash = Gerber.create_flash_geometry(Point([current_x, current_y]),
-                                                             self.apertures[current_aperture])
-                        if not flash.is_empty:
-                            poly_buffer.append(flash)
+                        records.append(GerberRecord('flash', current_aperture,
+                                                    self.apertures.get(current_aperture),
+                                                    current_polarity, (current_x, current_y), None, line=line_num))
 
                     continue
 
                 ### G02/3 - Circular interpolation
                 # 2-clockwise, 3-counterclockwise
-                match = self.circ_re.search(gline)
-                if match:
+                if token == 'circ':
                     arcdir = [None, None, "cw", "ccw"]
 
                     mode, x, y, i, j, d = match.groups()
@@ -1886,16 +2502,13 @@ class Gerber (Geometry):
                             # --- BUFFERED ---
                             width = self.apertures[last_path_aperture]["size"]
 
-                            if follow:
-                                buffered = LineString(path)
-                            else:
-                                buffered = LineString(path).buffer(width / 2)
-                            if not buffered.is_empty:
-                                poly_buffer.append(buffered)
+                            records.append(GerberRecord('stroke', last_path_aperture, width,
+                                                        current_polarity, path, path_arcs, line=line_num))
 
                         current_x = x
                         current_y = y
                         path = [[current_x, current_y]]  # Start new path
+                        path_arcs = []
                         continue
 
                     # Flash should not happen here
@@ -1917,13 +2530,16 @@ class Gerber (Geometry):
 
                         this_arc = arc(center, radius, start, stop,
                                        arcdir[current_interpolation_mode],
-                                       self.steps_per_circ)
+                                       self.steps_per_circ, self.arc_tolerance)
 
                         # The last point in the computed arc can have
                         # numerical errors. The exact final point is the
                         # specified (x, y). Replace.
                         this_arc[-1] = (x, y)
 
+                        path_arcs.append((len(path), len(this_arc), center, radius, start, stop,
+                                          arcdir[current_interpolation_mode]))
+
                         # Last point in path is current point
                         # current_x = this_arc[-1][0]
                         # current_y = this_arc[-1][1]
@@ -1972,11 +2588,14 @@ class Gerber (Geometry):
                                 log.debug("########## ACCEPTING ARC ############")
                                 this_arc = arc(center, radius, start, stop,
                                                arcdir[current_interpolation_mode],
-                                               self.steps_per_circ)
+                                               self.steps_per_circ, self.arc_tolerance)
 
                                 # Replace with exact values
                                 this_arc[-1] = (x, y)
 
+                                path_arcs.append((len(path), len(this_arc), center, radius, start, stop,
+                                                  arcdir[current_interpolation_mode]))
+
                                 # current_x = this_arc[-1][0]
                                 # current_y = this_arc[-1][1]
                                 current_x, current_y = x, y
@@ -1994,8 +2613,7 @@ class Gerber (Geometry):
                 ### Operation code alone
                 # Operation code alone, usually just D03 (Flash)
                 # self.opcode_re = re.compile(r'^D0?([123])\*$')
-                match = self.opcode_re.search(gline)
-                if match:
+                if token == 'opcode':
                     current_operation_code = int(match.group(1))
                     if current_operation_code == 3:
 
@@ -2004,20 +2622,16 @@ class Gerber (Geometry):
                             log.debug("Bare op-code %d." % current_operation_code)
                             # flash = Gerber.create_flash_geometry(Point(path[-1]),
                             #                                      self.apertures[current_aperture])
-                            if follow:
-                                continue
-                            flash = Gerber.create_flash_geometry(Point(current_x, current_y),
-                                                                 self.apertures[current_aperture])
-                            if not flash.is_empty:
-                                poly_buffer.append(flash)
+                            records.append(GerberRecord('flash', current_aperture,
+                                                        self.apertures.get(current_aperture),
+                                                        current_polarity, (current_x, current_y), None, line=line_num))
                         except IndexError:
                             log.warning("Line %d: %s -> Nothing there to flash!" % (line_num, gline))
 
                     continue
 
                 ### G74/75* - Single or multiple quadrant arcs
-                match = self.quad_re.search(gline)
-                if match:
+                if token == 'quad':
                     if match.group(1) == '4':
                         quadrant_mode = 'SINGLE'
                     else:
@@ -2025,27 +2639,24 @@ class Gerber (Geometry):
                     continue
 
                 ### G36* - Begin region
-                if self.regionon_re.search(gline):
+                if token == 'regionon':
                     if len(path) > 1:
                         # Take care of what is left in the path
 
                         ## --- Buffered ---
                         width = self.apertures[last_path_aperture]["size"]
 
-                        if follow:
-                            geo = LineString(path)
-                        else:
-                            geo = LineString(path).buffer(width/2)
-                        if not geo.is_empty:
-                            poly_buffer.append(geo)
+                        records.append(GerberRecord('stroke', last_path_aperture, width,
+                                                    current_polarity, path, path_arcs, line=line_num))
 
                         path = [path[-1]]
+                        path_arcs = []
 
                     making_region = True
                     continue
 
                 ### G37* - End region
-                if self.regionoff_re.search(gline):
+                if token == 'regionoff':
                     making_region = False
 
                     # Only one path defines region?
@@ -2064,22 +2675,15 @@ class Gerber (Geometry):
                     #                      "aperture": last_path_aperture})
 
                     # --- Buffered ---
-                    if follow:
-                        region = Polygon()
-                    else:
-                        region = Polygon(path)
-                    if not region.is_valid:
-                        if not follow:
-                            region = region.buffer(0)
-                    if not region.is_empty:
-                        poly_buffer.append(region)
+                    records.append(GerberRecord('region', None, None,
+                                                current_polarity, path, path_arcs, line=line_num))
 
                     path = [[current_x, current_y]]  # Start new path
+                    path_arcs = []
                     continue
 
                 ### Aperture definitions %ADD...
-                match = self.ad_re.search(gline)
-                if match:
+                if token == 'ad':
                     log.info("Found aperture definition. Line %d: %s" % (line_num, gline))
                     self.aperture_parse(match.group(1), match.group(2), match.group(3))
                     continue
@@ -2088,15 +2692,13 @@ class Gerber (Geometry):
                 # Can occur along with coordinates and operation code but
                 # sometimes by itself (handled here).
                 # Example: G01*
-                match = self.interp_re.search(gline)
-                if match:
+                if token == 'interp':
                     current_interpolation_mode = int(match.group(1))
                     continue
 
                 ### Tool/aperture change
                 # Example: D12*
-                match = self.tool_re.search(gline)
-                if match:
+                if token == 'tool':
                     current_aperture = match.group(1)
                     log.debug("Line %d: Aperture change to (%s)" % (line_num, match.group(1)))
                     log.debug(self.apertures[current_aperture])
@@ -2106,14 +2708,11 @@ class Gerber (Geometry):
                         # --- Buffered ----
                         width = self.apertures[last_path_aperture]["size"]
 
-                        if follow:
-                            geo = LineString(path)
-                        else:
-                            geo = LineString(path).buffer(width / 2)
-                        if not geo.is_empty:
-                            poly_buffer.append(geo)
+                        records.append(GerberRecord('stroke', last_path_aperture, width,
+                                                    current_polarity, path, path_arcs, line=line_num))
 
                         path = [path[-1]]
+                        path_arcs = []
 
                     continue
 
@@ -2121,40 +2720,32 @@ class Gerber (Geometry):
                 # Example: %LPD*% or %LPC*%
                 # If polarity changes, creates geometry from current
                 # buffer, then adds or subtracts accordingly.
-                match = self.lpol_re.search(gline)
-                if match:
-                    if len(path) > 1 and current_polarity != match.group(1):
+                # Consecutive layers of the same polarity stay in
+                # the buffer and are applied together.
+                if token == 'lpol':
+                    if current_polarity == match.group(1):
+                        continue
+
+                    if len(path) > 1:
 
                         # --- Buffered ----
                         width = self.apertures[last_path_aperture]["size"]
 
-                        if follow:
-                            geo = LineString(path)
-                        else:
-                            geo = LineString(path).buffer(width / 2)
-                        if not geo.is_empty:
-                            poly_buffer.append(geo)
+                        records.append(GerberRecord('stroke', last_path_aperture, width,
+                                                    current_polarity, path, path_arcs, line=line_num))
 
                         path = [path[-1]]
-
-                    # --- Apply buffer ---
-                    # If added for testing of bug #83
-                    # TODO: Remove when bug fixed
-                    if len(poly_buffer) > 0:
-                        if current_polarity == 'D':
-                            self.solid_geometry = self.solid_geometry.union(cascaded_union(poly_buffer))
-                        else:
-                            self.solid_geometry = self.solid_geometry.difference(cascaded_union(poly_buffer))
-                        poly_buffer = []
+                        path_arcs = []
 
                     current_polarity = match.group(1)
+                    records.append(GerberRecord('polarity', None, None,
+                                                current_polarity, None, None, line=line_num))
                     continue
 
                 ### Number format
                 # Example: %FSLAX24Y24*%
                 # TODO: This is ignoring most of the format. Implement the rest.
-                match = self.fmt_re.search(gline)
-                if match:
+                if token == 'fmt':
                     absolute = {'A': True, 'I': False}
                     self.int_digits = int(match.group(3))
                     self.frac_digits = int(match.group(4))
@@ -2162,8 +2753,7 @@ class Gerber (Geometry):
 
                 ### Mode (IN/MM)
                 # Example: %MOIN*%
-                match = self.mode_re.search(gline)
-                if match:
+                if token == 'mode':
                     #self.units = match.group(1)
 
                     # Changed for issue #80
@@ -2171,8 +2761,7 @@ class Gerber (Geometry):
                     continue
 
                 ### Units (G70/1) OBSOLETE
-                match = self.units_re.search(gline)
-                if match:
+                if token == 'units':
                     #self.units = {'0': 'IN', '1': 'MM'}[match.group(1)]
 
                     # Changed for issue #80
@@ -2180,20 +2769,17 @@ class Gerber (Geometry):
                     continue
 
                 ### Absolute/relative coordinates G90/1 OBSOLETE
-                match = self.absrel_re.search(gline)
-                if match:
+                if token == 'absrel':
                     absolute = {'0': True, '1': False}[match.group(1)]
                     continue
 
                 #### Ignored lines
                 ## Comments
-                match = self.comm_re.search(gline)
-                if match:
+                if token == 'comm':
                     continue
 
                 ## EOF
-                match = self.eof_re.search(gline)
-                if match:
+                if token == 'eof':
                     continue
 
                 ### Line did not match any pattern. Warn user.
@@ -2204,34 +2790,25 @@ class Gerber (Geometry):
 
                 ## --- Buffered ---
                 width = self.apertures[last_path_aperture]["size"]
-                if follow:
-                    geo = LineString(path)
-                else:
-                    geo = LineString(path).buffer(width / 2)
-                if not geo.is_empty:
-                    poly_buffer.append(geo)
+                records.append(GerberRecord('stroke', last_path_aperture, width,
+                                            current_polarity, path, path_arcs, line=line_num))
 
-            # --- Apply buffer ---
-            if follow:
-                self.solid_geometry = poly_buffer
-                return
+            self.records = records
+            self.records_resolution = (self.steps_per_circ, self.arc_tolerance)
 
-            log.warn("Joining %d polygons." % len(poly_buffer))
-            if self.use_buffer_for_union:
-                log.debug("Union by buffer...")
-                new_poly = MultiPolygon(poly_buffer)
-                new_poly = new_poly.buffer(0.00000001)
-                new_poly = new_poly.buffer(-0.00000001)
-                log.warn("Union(buffer) done.")
-            else:
-                log.debug("Union by union()...")
-                new_poly = cascaded_union(poly_buffer)
-                new_poly = new_poly.buffer(0)
-                log.warn("Union done.")
-            if current_polarity == 'D':
-                self.solid_geometry = self.solid_geometry.union(new_poly)
-            else:
-                self.solid_geometry = self.solid_geometry.difference(new_poly)
+            if profile is not None:
+                profile.times['statements'] += time.time() - t_start - \
+                    (profile.times['regex'] - regex_start)
+
+            self.build_geometry(follow=follow, geometry=self.solid_geometry)
+
+            if profile is not None:
+                profile.times['total'] += time.time() - t_start
+
+        except ParseError, err:
+            # Found while building the geometry, for an earlier line.
+            log.error("PARSING FAILED. %s" % err[0])
+            raise
 
         except Exception, err:
             ex_type, ex, tb = sys.exc_info()
@@ -2241,8 +2818,180 @@ class Gerber (Geometry):
             log.error("PARSING FAILED. Line %d: %s" % (line_num, gline))
             raise ParseError("Line %d: %s" % (line_num, gline), repr(err))
 
+    def build_geometry(self, follow=False, geometry=None):
+        """
+        Creates ``self.solid_geometry`` from ``self.records``. It can
+        be called again without reading the file, for example after
+        changing ``self.steps_per_circ`` or ``self.arc_tolerance``, or
+        to get the geometry for ``follow``.
+
+        NOTE: Transformations applied to ``self.solid_geometry`` are
+        lost, as with ``scale()``.
+
+        :param follow: If true, will not create polygons, just lines
+            following the gerber path.
+        :type follow: bool
+        :param geometry: Dark geometry to start from.
+        :return: None
+        """
+
+        # Records between polarity changes
+        layers = [('D', [])]
+        for record in self.records:
+            if record.op == 'polarity':
+                layers.append((record.polarity, []))
+            else:
+                layers[-1][1].append(record)
+
+        profile = self.profile
+
+        # Only the last layer is kept when following.
+        if follow:
+            t0 = time.time()
+            self.solid_geometry = []
+            for record in layers[-1][1]:
+                if record.op == 'stroke':
+                    geo = LineString(self.record_coords(record))
+                    if not geo.is_empty:
+                        self.solid_geometry.append(geo)
+            if profile is not None:
+                profile.times['geometry'] += time.time() - t0
+            return
+
+        # Time spent creating polygons and joining them.
+        t_geometry = 0.0
+        t_union = 0.0
+        n_polygons = 0
+
+        dark = PolarityEngine(geometry)
+        for polarity, records in layers[:-1]:
+            t0 = time.time()
+            poly_buffer = self.build_layer(records)
+            t1 = time.time()
+            if len(poly_buffer) > 0:
+                dark.apply(polarity, cascaded_union(poly_buffer))
+            t_geometry += t1 - t0
+            t_union += time.time() - t1
+            n_polygons += len(poly_buffer)
+
+        t0 = time.time()
+        polarity, records = layers[-1]
+        poly_buffer = self.build_layer(records)
+        t1 = time.time()
+        t_geometry += t1 - t0
+        n_polygons += len(poly_buffer)
+
+        log.debug("Flash cache: %d hits, %d misses." %
+                  (self.flash_cache.hits, self.flash_cache.misses))
+
+        log.warn("Joining %d polygons." % len(poly_buffer))
+        if self.use_buffer_for_union:
+            log.debug("Union by buffer...")
+        else:
+            log.debug("Union by union()...")
+        new_poly = tiled_union(poly_buffer, tiles=self.union_tiles,
+                               workers=self.union_workers,
+                               use_buffer=self.use_buffer_for_union)
+        log.warn("Union done.")
+        dark.apply(polarity, new_poly)
+        self.solid_geometry = dark.geometry()
+
+        if profile is not None:
+            profile.times['geometry'] += t_geometry
+            profile.times['union'] += t_union + time.time() - t1
+            profile.polygons_before_union += n_polygons
+            try:
+                profile.polygons_after_union += len(self.solid_geometry.geoms)
+            except AttributeError:
+                profile.polygons_after_union += 0 if self.solid_geometry.is_empty else 1
+            profile.extra['flash_cache'] = self.flash_cache.stats()
+
+    def build_layer(self, records):
+        """
+        Creates the polygons for the records of one polarity layer.
+        Strokes are buffered in batches by width, in
+        ``self.build_workers`` processes.
+
+        :param records: List of GerberRecord.
+        :return: List of polygons.
+        :rtype: list
+        """
+        poly_buffer = []
+
+        # width -> paths
+        strokes = collections.defaultdict(list)
+
+        for record in records:
+            if record.op == 'stroke':
+                strokes[record.shape].append(self.record_coords(record))
+                continue
+
+            if record.op == 'flash':
+                if record.shape is None:
+                    raise ParseError("Line %s: Undefined aperture for flash: %s" % (record.line, record.aperture),
+                                     repr(KeyError(record.aperture)))
+                geo = self.flash_cache.flash(record.aperture, record.shape, self.steps_per_circ,
+                                             record.coords[0], record.coords[1],
+                                             self.arc_tolerance)
+            else:
+                geo = Polygon(self.record_coords(record))
+                if record.op == 'region' and not geo.is_valid:
+                    geo = geo.buffer(0)
+
+            if not geo.is_empty:
+                poly_buffer.append(geo)
+
+        batches = []
+        for width in strokes:
+            paths = strokes[width]
+            resolution = quadrant_segments(width / 2, self.arc_tolerance)
+            for i in range(0, len(paths), 256):
+                batches.append((paths[i:i + 256], width, resolution))
+
+        if self.build_workers == 1 or len(batches) < 2:
+            for paths, width, resolution in batches:
+                poly_buffer += buffer_paths(paths, width, resolution)
+        else:
+            pool = Pool(processes=(self.build_workers or None))
+            try:
+                for result in pool.map(buffer_paths_wkb, batches):
+                    poly_buffer += [wkb_loads(geo) for geo in result]
+            finally:
+                pool.close()
+                pool.join()
+
+        return poly_buffer
+
+    def record_coords(self, record):
+        """
+        Points of a path record. Arcs are generated again if
+        ``self.steps_per_circ`` or ``self.arc_tolerance`` changed
+        since parsing.
+
+        :param record: Record of a path.
+        :type record: GerberRecord
+        :return: List of points.
+        :rtype: list
+        """
+        if not record.arcs or (self.steps_per_circ, self.arc_tolerance) == self.records_resolution:
+            return record.coords
+
+        coords = []
+        last = 0
+        for index, count, center, radius, start, stop, direction in record.arcs:
+            coords += record.coords[last:index]
+            this_arc = arc(center, radius, start, stop, direction,
+                           self.steps_per_circ, self.arc_tolerance)
+            # Exact end point, as when parsing.
+            this_arc[-1] = record.coords[index + count - 1]
+            coords += this_arc
+            last = index + count
+        coords += record.coords[last:]
+
+        return coords
+
     @staticmethod
-    def create_flash_geometry(location, aperture):
+    def create_flash_geometry(location, aperture, max_error=0.0):
 
         log.debug('Flashing @%s, Aperture: %s' % (location, aperture))
 
@@ -2250,6 +2999,8 @@ class Gerber (Geometry):
             location = Point(location)
 
         if aperture['type'] == 'C':  # Circles
+            if max_error > 0:
+                return circle_polygon(location.coords[0], aperture['size'] / 2, max_error)
             return location.buffer(aperture['size'] / 2)
 
         if aperture['type'] == 'R':  # Rectangles
@@ -2269,13 +3020,13 @@ class Gerber (Geometry):
             if width > height:
                 p1 = Point(loc[0] + 0.5 * (width - height), loc[1])
                 p2 = Point(loc[0] - 0.5 * (width - height), loc[1])
-                c1 = p1.buffer(height * 0.5)
-                c2 = p2.buffer(height * 0.5)
+                c1 = ApertureMacro.circle(p1.x, p1.y, height * 0.5, max_error)
+                c2 = ApertureMacro.circle(p2.x, p2.y, height * 0.5, max_error)
             else:
                 p1 = Point(loc[0], loc[1] + 0.5 * (height - width))
                 p2 = Point(loc[0], loc[1] - 0.5 * (height - width))
-                c1 = p1.buffer(width * 0.5)
-                c2 = p2.buffer(width * 0.5)
+                c1 = ApertureMacro.circle(p1.x, p1.y, width * 0.5, max_error)
+                c2 = ApertureMacro.circle(p2.x, p2.y, width * 0.5, max_error)
             return cascaded_union([c1, c2]).convex_hull
 
         if aperture['type'] == 'P':  # Regular polygon
@@ -2294,7 +3045,7 @@ class Gerber (Geometry):
 
         if aperture['type'] == 'AM':  # Aperture Macro
             loc = location.coords[0]
-            flash_geo = aperture['macro'].make_geometry(aperture['modifiers'])
+            flash_geo = aperture['macro'].make_geometry(aperture['modifiers'], max_error)
             if flash_geo.is_empty:
                 log.warning("Empty geometry for Aperture Macro: %s" % str(aperture['macro'].name))
             return affinity.translate(flash_geo, xoff=loc[0], yoff=loc[1])
@@ -2344,6 +3095,297 @@ class Gerber (Geometry):
         return bbox
 
 
+class DrillStore(object):
+    """
+    Columnar storage for the holes of an Excellon object. Coordinates
+    are kept in a NumPy array and the tool of every hole as an index
+    into ``tool_names``.
+
+    Iterating or indexing gives the dictionaries that ``Excellon.drills``
+    used to hold, ``{'point': Point, 'tool': str}``, so existing code
+    keeps working. These are copies: changing them does not change the
+    store. Transformations and grouping by tool work on the arrays.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        :param capacity: Number of holes to allocate room for.
+        :type capacity: int
+        """
+        self._xy = np.empty((capacity, 2))
+        self._tool_ids = np.empty(capacity, dtype=np.int32)
+        self.count = 0
+
+        # Tool name for each tool id, and the inverse.
+        self.tool_names = []
+        self._tool_index = {}
+
+    @property
+    def xy(self):
+        """
+        Coordinates of the holes as an (n, 2) array. This is a view,
+        changing it changes the store.
+        """
+        return self._xy[:self.count]
+
+    @property
+    def tool_ids(self):
+        """
+        Index into ``tool_names`` of every hole. This is a view.
+        """
+        return self._tool_ids[:self.count]
+
+    def tool_id(self, name):
+        """
+        Index of the given tool name, added if new.
+
+        :param name: Tool name, a key in ``Excellon.tools``.
+        :type name: str
+        :rtype: int
+        """
+        try:
+            return self._tool_index[name]
+        except KeyError:
+            self._tool_index[name] = len(self.tool_names)
+            self.tool_names.append(name)
+            return self._tool_index[name]
+
+    def reserve(self, capacity):
+        """
+        Makes room for at least ``capacity`` holes. The arrays grow
+        at least twice as large, so adding holes one at a time is
+        linear on the total.
+        """
+        if capacity <= len(self._xy):
+            return
+        capacity = max(capacity, 2 * len(self._xy))
+
+        xy = np.empty((capacity, 2))
+        xy[:self.count] = self.xy
+        tool_ids = np.empty(capacity, dtype=np.int32)
+        tool_ids[:self.count] = self.tool_ids
+        self._xy, self._tool_ids = xy, tool_ids
+
+    def add(self, x, y, tool):
+        """
+        Adds a hole.
+
+        :param x: X coordinate.
+        :param y: Y coordinate.
+        :param tool: Tool name.
+        :type tool: str
+        """
+        if self.count == len(self._xy):
+            self.reserve(self.count + 1)
+        self._xy[self.count, 0] = x
+        self._xy[self.count, 1] = y
+        self._tool_ids[self.count] = self.tool_id(tool)
+        self.count += 1
+
+    def add_array(self, xy, tool):
+        """
+        Adds holes of a single tool.
+
+        :param xy: Coordinates, (n, 2) array-like.
+        :param tool: Tool name.
+        :type tool: str
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.reserve(self.count + len(xy))
+        self._xy[self.count:self.count + len(xy)] = xy
+        self._tool_ids[self.count:self.count + len(xy)] = self.tool_id(tool)
+        self.count += len(xy)
+
+    def append(self, drill):
+        """
+        Adds a hole given as ``{'point': Point, 'tool': str}``.
+        """
+        self.add(drill['point'].x, drill['point'].y, drill['tool'])
+
+    def extend(self, drills):
+        """
+        Adds the holes of another DrillStore, or of any iterable of
+        ``{'point': Point, 'tool': str}``.
+        """
+        if not isinstance(drills, DrillStore):
+            for drill in drills:
+                self.append(drill)
+            return
+
+        ids = np.array([self.tool_id(name) for name in drills.tool_names], dtype=np.int32)
+        n = drills.count
+        self.reserve(self.count + n)
+        self._xy[self.count:self.count + n] = drills.xy
+        if n > 0:
+            self._tool_ids[self.count:self.count + n] = ids[drills.tool_ids]
+        self.count += n
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("drill index out of range")
+        return {'point': Point(self._xy[i, 0], self._xy[i, 1]),
+                'tool': self.tool_names[self._tool_ids[i]]}
+
+    def __iter__(self):
+        names = self.tool_names
+        for (x, y), tool_id in itertools.izip(self.xy.tolist(), self.tool_ids.tolist()):
+            yield {'point': Point(x, y), 'tool': names[tool_id]}
+
+    def transform(self, xfact=1.0, yfact=1.0, xoff=0.0, yoff=0.0):
+        """
+        Scales and then translates all holes in place:
+        ``x' = xfact * x + xoff`` and ``y' = yfact * y + yoff``.
+        """
+        xy = self.xy
+        if xfact != 1.0 or yfact != 1.0:
+            xy *= (xfact, yfact)
+        if xoff != 0.0 or yoff != 0.0:
+            xy += (xoff, yoff)
+
+    def select(self, tool):
+        """
+        Coordinates of the holes of a tool, in the order they were added.
+
+        :param tool: Tool name.
+        :type tool: str
+        :return: (n, 2) array.
+        """
+        if tool not in self._tool_index:
+            return np.empty((0, 2))
+        return self.xy[self.tool_ids == self._tool_index[tool]]
+
+    def by_tool(self):
+        """
+        Coordinates of the holes grouped by tool.
+
+        :return: Tool name -> (n, 2) array, for tools that have holes.
+        :rtype: dict
+        """
+        if self.count == 0:
+            return {}
+        ids = self.tool_ids
+        # Stable, so holes keep their order within each tool.
+        order = np.argsort(ids, kind='mergesort')
+        sorted_ids = ids[order]
+        bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+        groups = {}
+        for group in np.split(order, bounds):
+            groups[self.tool_names[ids[group[0]]]] = self.xy[group]
+        return groups
+
+    def copy(self):
+        drills = DrillStore(max(self.count, 1))
+        drills.extend(self)
+        return drills
+
+    def to_list(self):
+        """
+        :return: Holes in the format previously used by ``Excellon.drills``.
+        :rtype: list
+        """
+        return list(self)
+
+    def to_dict(self):
+        """
+        Compact representation using only built-in types.
+
+        :rtype: dict
+        """
+        return {'xy': self.xy.tostring(),
+                'tool_ids': self.tool_ids.tostring(),
+                'tool_names': list(self.tool_names)}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Inverse of ``to_dict()``.
+        """
+        xy = np.frombuffer(d['xy'], dtype=float).reshape(-1, 2)
+        drills = cls(max(len(xy), 1))
+        drills.count = len(xy)
+        drills._xy[:len(xy)] = xy
+        drills._tool_ids[:len(xy)] = np.frombuffer(d['tool_ids'], dtype=np.int32)
+        for name in d['tool_names']:
+            drills.tool_id(name)
+        return drills
+
+    @classmethod
+    def from_list(cls, drills):
+        """
+        :param drills: List of ``{'point': Point, 'tool': str}``.
+        :return: New DrillStore with the given holes.
+        """
+        store = cls(max(len(drills), 1))
+        store.extend(drills)
+        return store
+
+
+class DrillInstances(object):
+    """
+    Drill holes as one circle template per tool, centered at the
+    origin, plus the centers of the holes. Polygons are only created
+    by ``polygons()``.
+    """
+
+    def __init__(self, xy, tool_ids, radii, resolution=16):
+        """
+        :param xy: Centers of the holes, (n, 2) array. Copied.
+        :param tool_ids: Index into ``radii`` for every hole. Copied.
+        :param radii: Radius of every tool.
+        :type radii: list
+        :param resolution: Segments per quarter circle.
+        :type resolution: int
+        """
+        self.xy = np.array(xy, dtype=float).reshape(-1, 2)
+        self.tool_ids = np.array(tool_ids, dtype=np.int32)
+        self.radii = np.array(radii, dtype=float)
+
+        # Closed rings, (k + 1, 2) arrays.
+        self.templates = [np.array(Point(0, 0).buffer(radius, resolution).exterior.coords)
+                          for radius in radii]
+
+    def __len__(self):
+        return len(self.xy)
+
+    def groups(self):
+        """
+        Holes grouped by tool.
+
+        :return: List of (template, centers) for tools that have holes.
+        :rtype: list
+        """
+        groups = []
+        for tool_id, template in enumerate(self.templates):
+            centers = self.xy[self.tool_ids == tool_id]
+            if len(centers) > 0:
+                groups.append((template, centers))
+        return groups
+
+    def polygons(self):
+        """
+        :return: A Polygon for every hole, in the order of the holes.
+        :rtype: list
+        """
+        templates = self.templates
+        return [Polygon(templates[tool_id] + (x, y))
+                for (x, y), tool_id in itertools.izip(self.xy.tolist(), self.tool_ids.tolist())]
+
+    def bounds(self):
+        """
+        :return: (xmin, ymin, xmax, ymax) of all holes, or None if there are none.
+        """
+        if len(self.xy) == 0:
+            return None
+        r = self.radii[self.tool_ids]
+        return ((self.xy[:, 0] - r).min(), (self.xy[:, 1] - r).min(),
+                (self.xy[:, 0] + r).max(), (self.xy[:, 1] + r).max())
+
+
 class Excellon(Geometry):
     """
     *ATTRIBUTES*
@@ -2358,7 +3400,7 @@ class Excellon(Geometry):
     Others            Not supported (Ignored).
     ================  ====================================
 
-    * ``drills`` (list): Each is a dictionary:
+    * ``drills`` (DrillStore): Iterates as dictionaries:
 
     ================  ====================================
     Key               Value
@@ -2366,6 +3408,8 @@ class Excellon(Geometry):
     point             (Shapely.Point) Where to drill
     tool              (str) A key in ``tools``
     ================  ====================================
+
+    A list of such dictionaries can be assigned to ``drills``.
     """
 
     defaults = {
@@ -2384,7 +3428,7 @@ class Excellon(Geometry):
         
         self.tools = {}
         
-        self.drills = []
+        self.drills = DrillStore()
 
         ## IN|MM -> Units are inherited from Geometry
         #self.units = units
@@ -2393,6 +3437,9 @@ class Excellon(Geometry):
         #self.zeros = "T"
         self.zeros = zeros or self.defaults["zeros"]
 
+        # ParseProfile to fill when parsing, if any.
+        self.profile = None
+
         # Attributes to be included in serialization
         # Always append to it because it carries contents
         # from Geometry.
@@ -2467,6 +3514,31 @@ class Excellon(Geometry):
         # Parse coordinates
         self.leadingzeros_re = re.compile(r'^[-\+]?(0*)(\d*)')
         
+    @property
+    def solid_geometry(self):
+        """
+        Polygons of the holes. After ``create_geometry()`` they are
+        only created when this is read, see ``self.instances``.
+        """
+        if self._solid_geometry is None and self.instances is not None:
+            self._solid_geometry = self.instances.polygons()
+        return self._solid_geometry
+
+    @solid_geometry.setter
+    def solid_geometry(self, geometry):
+        self._solid_geometry = geometry
+        self.instances = None
+
+    @property
+    def drills(self):
+        return self._drills
+
+    @drills.setter
+    def drills(self, drills):
+        if not isinstance(drills, DrillStore):
+            drills = DrillStore.from_list(drills)
+        self._drills = drills
+
     def parse_file(self, filename):
         """
         Reads the specified file as array of lines as
@@ -2496,11 +3568,21 @@ class Excellon(Geometry):
         current_x = None
         current_y = None
 
+        # Statement class of the last line, named after the
+        # pattern that matched it, for self.profile.
+        profile = self.profile
+        statement = None
+
         #### Parsing starts here ####
         line_num = 0  # Line number
         eline = ""
+        t_start = time.time()
         try:
             for eline in elines:
+                if profile is not None and line_num > 0:
+                    profile.count(statement)
+                    statement = None
+
                 line_num += 1
                 #log.debug("%3d %s" % (line_num, str(eline)))
 
@@ -2509,11 +3591,13 @@ class Excellon(Geometry):
 
                 ## Header Begin (M48) ##
                 if self.hbegin_re.search(eline):
+                    statement = 'hbegin'
                     in_header = True
                     continue
 
                 ## Header End ##
                 if self.hend_re.search(eline):
+                    statement = 'hend'
                     in_header = False
                     continue
 
@@ -2524,6 +3608,7 @@ class Excellon(Geometry):
                 # object's units.
                 match = self.meas_re.match(eline)
                 if match:
+                    statement = 'meas'
                     #self.units = {"1": "MM", "2": "IN"}[match.group(1)]
 
                     # Modified for issue #80
@@ -2537,6 +3622,7 @@ class Excellon(Geometry):
                     ## Tool change ##
                     match = self.toolsel_re.search(eline)
                     if match:
+                        statement = 'toolsel'
                         current_tool = str(int(match.group(1)))
                         log.debug("Tool change: %s" % current_tool)
                         continue
@@ -2544,6 +3630,7 @@ class Excellon(Geometry):
                     ## Coordinates without period ##
                     match = self.coordsnoperiod_re.search(eline)
                     if match:
+                        statement = 'coordsnoperiod'
                         try:
                             #x = float(match.group(1))/10000
                             x = self.parse_number(match.group(1))
@@ -2562,13 +3649,14 @@ class Excellon(Geometry):
                             log.error("Missing coordinates")
                             continue
 
-                        self.drills.append({'point': Point((x, y)), 'tool': current_tool})
+                        self.drills.add(x, y, current_tool)
                         log.debug("{:15} {:8} {:8}".format(eline, x, y))
                         continue
 
                     ## Coordinates with period: Use literally. ##
                     match = self.coordsperiod_re.search(eline)
                     if match:
+                        statement = 'coordsperiod'
                         try:
                             x = float(match.group(1))
                             current_x = x
@@ -2585,7 +3673,7 @@ class Excellon(Geometry):
                             log.error("Missing coordinates")
                             continue
 
-                        self.drills.append({'point': Point((x, y)), 'tool': current_tool})
+                        self.drills.add(x, y, current_tool)
                         log.debug("{:15} {:8} {:8}".format(eline, x, y))
                         continue
 
@@ -2595,6 +3683,7 @@ class Excellon(Geometry):
                     ## Tool definitions ##
                     match = self.toolset_re.search(eline)
                     if match:
+                        statement = 'toolset'
 
                         name = str(int(match.group(1)))
                         spec = {
@@ -2612,6 +3701,7 @@ class Excellon(Geometry):
                     ## Units and number format ##
                     match = self.units_re.match(eline)
                     if match:
+                        statement = 'units'
                         self.zeros = match.group(2) or self.zeros  # "T" or "L". Might be empty
 
                         #self.units = {"INCH": "IN", "METRIC": "MM"}[match.group(1)]
@@ -2625,6 +3715,13 @@ class Excellon(Geometry):
 
             log.info("Zeros: %s, Units %s." % (self.zeros, self.units))
 
+            if profile is not None:
+                if line_num > 0:
+                    profile.count(statement)
+                # Statements are classified and handled together.
+                profile.times['regex'] += time.time() - t_start
+                profile.times['total'] += time.time() - t_start
+
         except Exception as e:
             log.error("PARSING FAILED. Line %d: %s" % (line_num, eline))
             raise
@@ -2666,17 +3763,38 @@ class Excellon(Geometry):
     def create_geometry(self):
         """
         Creates circles of the tool diameter at every point
-        specified in ``self.drills``.
+        specified in ``self.drills``, as ``self.instances``. The
+        polygons in ``self.solid_geometry`` are created from them
+        when first needed.
 
         :return: None
         """
-        self.solid_geometry = []
+        t0 = time.time()
+
+        radii = [self.tools[name]['C'] / 2.0 for name in self.drills.tool_names]
+        self.solid_geometry = None
+        self.instances = DrillInstances(self.drills.xy, self.drills.tool_ids, radii)
 
-        for drill in self.drills:
-            # poly = drill['point'].buffer(self.tools[drill['tool']]["C"]/2.0)
-            tooldia = self.tools[drill['tool']]['C']
-            poly = drill['point'].buffer(tooldia / 2.0)
-            self.solid_geometry.append(poly)
+        # Drills are not joined.
+        if self.profile is not None:
+            self.profile.times['geometry'] += time.time() - t0
+            self.profile.times['total'] += time.time() - t0
+            self.profile.polygons_before_union = len(self.drills)
+            self.profile.polygons_after_union = len(self.drills)
+
+    def is_empty(self):
+        if self._solid_geometry is None and self.instances is not None:
+            return len(self.instances) == 0
+        return Geometry.is_empty(self)
+
+    def bounds(self):
+        """
+        Returns coordinates of rectangular bounds
+        of the holes: (xmin, ymin, xmax, ymax).
+        """
+        if self._solid_geometry is None and self.instances is not None:
+            return self.instances.bounds() or (0, 0, 0, 0)
+        return Geometry.bounds(self)
 
     def scale(self, factor):
         """
@@ -2690,8 +3808,7 @@ class Excellon(Geometry):
         """
 
         # Drills
-        for drill in self.drills:
-            drill['point'] = affinity.scale(drill['point'], factor, factor, origin=(0, 0))
+        self.drills.transform(factor, factor)
 
         self.create_geometry()
 
@@ -2707,8 +3824,7 @@ class Excellon(Geometry):
         dx, dy = vect
 
         # Drills
-        for drill in self.drills:
-            drill['point'] = affinity.translate(drill['point'], xoff=dx, yoff=dy)
+        self.drills.transform(xoff=dx, yoff=dy)
 
         # Recreate geometry
         self.create_geometry()
@@ -2727,8 +3843,7 @@ class Excellon(Geometry):
         xscale, yscale = {"X": (1.0, -1.0), "Y": (-1.0, 1.0)}[axis]
 
         # Modify data
-        for drill in self.drills:
-            drill['point'] = affinity.scale(drill['point'], xscale, yscale, origin=(px, py))
+        self.drills.transform(xscale, yscale, px - xscale * px, py - yscale * py)
 
         # Recreate geometry
         self.create_geometry()
@@ -2745,6 +3860,343 @@ class Excellon(Geometry):
         return factor
 
 
+class GCodeWriter(object):
+    """
+    Collects G-code in chunks instead of growing a single string,
+    or writes the chunks straight to a file.
+
+    In modal mode words that do not change the state of the machine
+    are left out: the motion command (G00/G01) if it is the same as
+    in the previous move and X, Y, Z and F if they are unchanged.
+    Moves that change nothing are left out altogether.
+    """
+
+    # Splits a coordinate format like "X%.4fY%.4f" into its words.
+    coordinate_format_re = re.compile(r'^(X\s*%[-+ #0]*\d*(?:\.\d+)?[dfeEgG])(\s*)'
+                                      r'(Y\s*%[-+ #0]*\d*(?:\.\d+)?[dfeEgG])$')
+
+    def __init__(self, output=None, modal=False, coordinate_format="X%.4fY%.4f", chunk_size=1 << 20):
+        """
+
+        :param output: File-like object to write to. If None, the
+            G-code is kept in memory, see ``getvalue()``.
+        :param modal: Leave out unchanged words.
+        :type modal: bool
+        :param coordinate_format: Format of X and Y, as in
+            ``CNCjob.defaults["coordinate_format"]``.
+        :type coordinate_format: str
+        :param chunk_size: Characters collected before joining
+            them into a chunk and writing it.
+        :type chunk_size: int
+        """
+        self.output = output
+        self.modal = modal
+        self.coordinate_format = coordinate_format
+        self.chunk_size = chunk_size
+
+        self.size = 0           # Characters in flushed chunks
+        self._pending = []      # Not yet flushed
+        self._pending_size = 0
+        self._chunks = []       # Flushed, when there is no output
+
+        # Modal state, as written.
+        self.motion = None
+        self.x = None
+        self.y = None
+        self.z = None
+        self.feedrate = None
+
+        # Without separate X and Y words, both are written
+        # whenever any of them changes.
+        match = self.coordinate_format_re.match(coordinate_format)
+        self._xy_words = match.groups() if match else None
+
+        # Arc centers, as X and Y.
+        if match:
+            xfmt, sep, yfmt = self._xy_words
+            self.center_format = "I" + xfmt[1:] + sep + "J" + yfmt[1:]
+        else:
+            self.center_format = "I%.4fJ%.4f"
+
+    def write(self, text):
+        """
+        Writes text as is, like lines without motion.
+        """
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        chunk = "".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        self.size += len(chunk)
+        if self.output is None:
+            self._chunks.append(chunk)
+        else:
+            self.output.write(chunk)
+
+    def getvalue(self):
+        """
+        :return: All G-code written, if there is no output file.
+        :rtype: str
+        """
+        self.flush()
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def move(self, g, x, y):
+        """
+        Linear move in the XY plane.
+
+        :param g: 0 for rapid motion, 1 for motion at the feedrate.
+        """
+        if not self.modal:
+            self.write(("G0%d " % g) + (self.coordinate_format % (x, y)) + "\n")
+            return
+
+        xy = self._xy(x, y)
+        if xy is not None:
+            self._write_motion(g, xy)
+
+    def arc(self, g, x, y, i, j):
+        """
+        Circular move in the XY plane.
+
+        :param g: 2 for clockwise, 3 for counterclockwise.
+        :param i: X of the center, from where the move starts.
+        :param j: Y of the center, from where the move starts.
+        """
+        if not self.modal:
+            self.write(("G0%d " % g) + (self.coordinate_format % (x, y)) +
+                       (self.center_format % (i, j)) + "\n")
+            return
+
+        # Arcs are never full circles.
+        xy = self._xy(x, y)
+        if xy is not None:
+            self._write_motion(g, xy + (self.center_format % (i, j)))
+
+    def arc_moves(self, moves):
+        """
+        Straight and circular moves, as returned by ``fit_arcs()``.
+        """
+        if not self.modal:
+            self.write(self.format_moves(moves))
+            return
+
+        for g, x, y, i, j in moves:
+            if g == 1:
+                self.move(1, x, y)
+            else:
+                self.arc(g, x, y, i, j)
+
+    def format_moves(self, moves):
+        """
+        G-code of ``moves`` as written when not modal.
+
+        :param moves: As returned by ``fit_arcs()``.
+        :rtype: str
+        """
+        line = "G01 " + self.coordinate_format + "\n"
+        arc = "G0%d " + self.coordinate_format + self.center_format + "\n"
+        return "".join([line % (x, y) if g == 1 else arc % (g, x, y, i, j)
+                        for g, x, y, i, j in moves])
+
+    def moves(self, g, coords):
+        """
+        Linear moves through the given points.
+
+        :param g: 0 for rapid motion, 1 for motion at the feedrate.
+        :param coords: Sequence of (x, y).
+        """
+        if not self.modal:
+            t = ("G0%d " % g) + self.coordinate_format + "\n"
+            self.write("".join([t % (x, y) for x, y in coords]))
+            return
+
+        for x, y in coords:
+            self.move(g, x, y)
+
+    def move_z(self, g, z, fmt="Z%.4f"):
+        """
+        Vertical move.
+
+        :param g: 0 for rapid motion, 1 for motion at the feedrate.
+        :param fmt: Format of the Z word.
+        """
+        if not self.modal:
+            self.write(("G0%d " % g) + (fmt % z) + "\n")
+            return
+
+        # Compare values, formats may differ.
+        value = "%.4f" % z
+        if value == self.z:
+            return
+        self.z = value
+        self._write_motion(g, fmt % z)
+
+    def set_feedrate(self, feedrate):
+        word = "F%.2f" % feedrate
+        if self.modal and word == self.feedrate:
+            return
+        self.feedrate = word
+        self.write(word + "\n")
+
+    def _xy(self, x, y):
+        """
+        Words for moving to (x, y) in modal mode, or None if
+        the tool is already there. Updates the state.
+        """
+        if self._xy_words is None:
+            xy = self.coordinate_format % (x, y)
+            if xy == self.x:
+                return None
+            self.x = xy
+            return xy
+
+        xfmt, sep, yfmt = self._xy_words
+        xword = xfmt % x
+        yword = yfmt % y
+        if xword == self.x and yword == self.y:
+            return None
+        if xword == self.x:
+            xy = yword
+        elif yword == self.y:
+            xy = xword
+        else:
+            xy = xword + sep + yword
+        self.x = xword
+        self.y = yword
+        return xy
+
+    def _write_motion(self, g, words):
+        if g == self.motion:
+            self.write(words + "\n")
+        else:
+            self.motion = g
+            self.write(("G0%d " % g) + words + "\n")
+
+
+class GCodeToolpath(object):
+    """
+    Tool paths parsed from G-code, as arrays.
+
+    Points of all the paths are stored one after the other in
+    ``x``, ``y``, ``z`` (height when reached) and ``motion`` (G code
+    of the move), and ``path`` tells which path each point belongs to.
+    Path ``i`` is made of the points ``offsets[i]`` to ``offsets[i + 1]``
+    and ``kinds[i]`` is its kind, as in ``CNCjob.gcode_parsed``. A path
+    starts at the last point of the previous one.
+    """
+
+    def __init__(self, x, y, z, motion, offsets, kinds):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.z = np.asarray(z, dtype=float)
+        self.motion = np.asarray(motion, dtype=np.int8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.kinds = np.asarray(kinds, dtype='S2')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def path(self):
+        return np.repeat(np.arange(len(self.kinds), dtype=np.int32), np.diff(self.offsets))
+
+    def coords(self, i):
+        """
+        :return: Points of path ``i``, (n, 2) array.
+        """
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return np.column_stack([self.x[a:b], self.y[a:b]])
+
+    def to_parsed(self):
+        """
+        The paths as in ``CNCjob.gcode_parsed``.
+
+        :rtype: list
+        """
+        xy = np.column_stack([self.x, self.y]).tolist()
+        offsets = self.offsets.tolist()
+        return [{"geom": LineString(xy[offsets[i]:offsets[i + 1]]), "kind": list(kind)}
+                for i, kind in enumerate(self.kinds.tolist())]
+
+    def bounds(self):
+        """
+        :return: (xmin, ymin, xmax, ymax) of all points, or None if there are none.
+        """
+        if len(self.x) == 0:
+            return None
+        return self.x.min(), self.y.min(), self.x.max(), self.y.max()
+
+    def path_bounds(self):
+        """
+        :return: (xmin, ymin, xmax, ymax) of every path, (n, 4) array.
+        """
+        if len(self.kinds) == 0:
+            return np.zeros((0, 4))
+        starts = self.offsets[:-1]
+        return np.column_stack([np.minimum.reduceat(self.x, starts), np.minimum.reduceat(self.y, starts),
+                                np.maximum.reduceat(self.x, starts), np.maximum.reduceat(self.y, starts)])
+
+    def paths_in(self, rect):
+        """
+        :param rect: (xmin, ymin, xmax, ymax)
+        :return: Indexes of the paths with bounds intersecting ``rect``.
+        """
+        xmin, ymin, xmax, ymax = rect
+        bounds = self.path_bounds()
+        return np.flatnonzero((bounds[:, 0] <= xmax) & (bounds[:, 2] >= xmin) &
+                              (bounds[:, 1] <= ymax) & (bounds[:, 3] >= ymin))
+
+    def scale(self, factor):
+        """
+        Scales all points on the XY plane about the origin.
+        """
+        self.x = self.x * factor
+        self.y = self.y * factor
+
+    def offset(self, dx, dy):
+        """
+        Moves all points on the XY plane.
+        """
+        self.x = self.x + dx
+        self.y = self.y + dy
+
+    def to_dict(self):
+        """
+        Compact representation using only built-in types.
+
+        :rtype: dict
+        """
+        return {
+            "x": self.x.tostring(),
+            "y": self.y.tostring(),
+            "z": self.z.tostring(),
+            "motion": self.motion.tostring(),
+            "offsets": self.offsets.tostring(),
+            "kinds": self.kinds.tostring()
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Inverse of ``to_dict()``.
+        """
+        return cls(np.frombuffer(d["x"], dtype=float),
+                   np.frombuffer(d["y"], dtype=float),
+                   np.frombuffer(d["z"], dtype=float),
+                   np.frombuffer(d["motion"], dtype=np.int8),
+                   np.frombuffer(d["offsets"], dtype=np.int64),
+                   np.frombuffer(d["kinds"], dtype='S2'))
+
+
 class CNCjob(Geometry):
     """
     Represents work to be done by a CNC machine.
@@ -2764,7 +4216,10 @@ class CNCjob(Geometry):
 
     defaults = {
         "zdownrate": None,
-        "coordinate_format": "X%.4fY%.4f"
+        "coordinate_format": "X%.4fY%.4f",
+        "arc_tolerance": 0.0,
+        "modal_gcode": False,
+        "arc_fitting": 0.0
     }
 
     def __init__(self,
@@ -2794,6 +4249,17 @@ class CNCjob(Geometry):
         self.gcode_parsed = None
         self.steps_per_circ = 20  # Used when parsing G-code arcs
 
+        # If not 0, maximum distance from the parsed G-code arcs
+        # to their segments, instead of steps_per_circ.
+        self.arc_tolerance = CNCjob.defaults["arc_tolerance"]
+
+        # Leave out words that do not change, see GCodeWriter.
+        self.modal_gcode = CNCjob.defaults["modal_gcode"]
+
+        # If not 0, cut along arcs in the paths with G02/G03, staying
+        # within this distance from the paths. See fit_arcs().
+        self.arc_fitting = CNCjob.defaults["arc_fitting"]
+
         if zdownrate is not None:
             self.zdownrate = float(zdownrate)
         elif CNCjob.defaults["zdownrate"] is not None:
@@ -2803,6 +4269,14 @@ class CNCjob(Geometry):
 
         self.spindlespeed = spindlespeed
 
+        # Travel between holes before and after ordering them,
+        # set by generate_from_excellon_by_tool().
+        self.drill_travel = None
+
+        # Travel, tool lifts and time taken by ordering the paths
+        # or holes, set by the generate_from_* methods.
+        self.order_stats = None
+
         # Attributes to be included in serialization
         # Always append to it because it carries contents
         # from Geometry.
@@ -2821,16 +4295,64 @@ class CNCjob(Geometry):
 
         return factor
 
+    def gcode_writer(self, output=None):
+        """
+        Writer for the G-code of this job.
+
+        :param output: File-like object to write to, or None to
+            keep the G-code in memory.
+        :rtype: GCodeWriter
+        """
+        return GCodeWriter(output, modal=self.modal_gcode,
+                           coordinate_format=CNCjob.defaults["coordinate_format"])
+
+    def write_gcode_start(self, writer):
+        """
+        Units, modes, feedrate, travel height and spindle start.
+        """
+        writer.write(self.unitcode[self.units.upper()] + "\n")
+        writer.write(self.absolutecode + "\n")
+        writer.write(self.feedminutecode + "\n")
+        writer.set_feedrate(self.feedrate)
+        writer.move_z(0, self.z_move)  # Move (up) to travel height
+        if self.spindlespeed is not None:
+            writer.write("M03 S%d\n" % int(self.spindlespeed))  # Spindle start with configured speed
+        else:
+            writer.write("M03\n")  # Spindle start
+        #writer.write(self.pausecode + "\n")
+
+    def set_gcode(self, writer, output=None):
+        """
+        Stores the G-code of the writer in ``self.gcode``, or
+        flushes it to ``output``.
+        """
+        if output is None:
+            self.gcode = writer.getvalue()
+        else:
+            writer.flush()
+
     def generate_from_excellon_by_tool(self, exobj, tools="all",
-                                       toolchange=False, toolchangez=0.1):
+                                       toolchange=False, toolchangez=0.1,
+                                       order=None, order_time=1.0, output=None):
         """
         Creates gcode for this object from an Excellon object
         for the specified tools.
 
+        The travel between holes before and after ordering them
+        is stored in ``self.drill_travel``.
+
         :param exobj: Excellon object to process
         :type exobj: Excellon
         :param tools: Comma separated tool names
         :type: tools: str
+        :param order: How to order the holes of each tool, see
+            ``optimize_drill_order()``. None keeps the file order.
+        :type order: str
+        :param order_time: Time budget in seconds for improving
+            the order of all the holes.
+        :type order_time: float
+        :param output: File-like object to write the G-code to
+            instead of ``self.gcode``.
         :return: None
         :rtype: None
         """
@@ -2854,37 +4376,49 @@ class CNCjob(Geometry):
             log.debug("Tools selected and sorted are: %s" % str(tools)) 
 
         # Points (Group by tool)
-        points = {}
-        for drill in exobj.drills:
-            if drill['tool'] in tools:
-                try:
-                    points[drill['tool']].append(drill['point'])
-                except KeyError:
-                    points[drill['tool']] = [drill['point']]
+        points = exobj.drills.by_tool()
+
+        # Drill order, each tool starts where the previous one ended
+        # and the last one goes back to the origin. The file order of
+        # a tool is kept if ordering does not make it shorter.
+        t0 = time.time()
+        drilled = [tool for tool in tools if tool in points and len(points[tool]) > 0]
+        total = sum(len(points[tool]) for tool in drilled)
+        file_points = dict((tool, points[tool]) for tool in drilled)
+        before = after = 0.0
+        last_before = last_after = (0.0, 0.0)
+        for tool in drilled:
+            end = (0.0, 0.0) if tool == drilled[-1] else None
+            before += drill_travel(points[tool], start=last_before, end=end)
+            last_before = points[tool][-1]
+            budget = order_time * len(points[tool]) / total
+            ordered = points[tool][optimize_drill_order(points[tool], last_after, order, budget, end)]
+            travel = drill_travel(ordered, start=last_after, end=end)
+            kept = drill_travel(points[tool], start=last_after, end=end)
+            if travel < kept:
+                points[tool] = ordered
+            else:
+                travel = kept
+            after += travel
+            last_after = points[tool][-1]
+        # Tools after a reordered one start elsewhere, which could
+        # still make the whole job longer.
+        if after > before:
+            points.update(file_points)
+            after = before
+        self.drill_travel = (before, after)
+        self.order_stats = {"method": order or "none", "travel": after, "lifts": total, "time": time.time() - t0}
+        log.debug("Drill travel: %.4f before ordering, %.4f after." % (before, after))
 
         #log.debug("Found %d drills." % len(points))
-        self.gcode = []
+        writer = self.gcode_writer(output)
 
         # Basic G-Code macros
         t = "G00 " + CNCjob.defaults["coordinate_format"] + "\n"
-        down = "G01 Z%.4f\n" % self.z_cut
-        up = "G00 Z%.4f\n" % self.z_move
-        up_to_zero = "G01 Z0\n"
+        drill = "G01 Z%.4f\n" % self.z_cut + "G01 Z0\n" + "G00 Z%.4f\n" % self.z_move
 
         # Initialization
-        gcode = self.unitcode[self.units.upper()] + "\n"
-        gcode += self.absolutecode + "\n"
-        gcode += self.feedminutecode + "\n"
-        gcode += "F%.2f\n" % self.feedrate
-        gcode += "G00 Z%.4f\n" % self.z_move  # Move to travel height
-
-        if self.spindlespeed is not None:
-            # Spindle start with configured speed
-            gcode += "M03 S%d\n" % int(self.spindlespeed)
-        else:
-            gcode += "M03\n"  # Spindle start
-
-        #gcode += self.pausecode + "\n"
+        self.write_gcode_start(writer)
 
         for tool in tools:
 
@@ -2892,28 +4426,34 @@ class CNCjob(Geometry):
             if tool in points:
                 # Tool change sequence (optional)
                 if toolchange:
-                    gcode += "G00 Z%.4f\n" % toolchangez
-                    gcode += "T%d\n" % int(tool)  # Indicate tool slot (for automatic tool changer)
-                    gcode += "M5\n"  # Spindle Stop
-                    gcode += "M6\n"  # Tool change
-                    gcode += "(MSG, Change to tool dia=%.4f)\n" % exobj.tools[tool]["C"]
-                    gcode += "M0\n"  # Temporary machine stop
+                    writer.move_z(0, toolchangez)
+                    writer.write("T%d\n" % int(tool))  # Indicate tool slot (for automatic tool changer)
+                    writer.write("M5\n")  # Spindle Stop
+                    writer.write("M6\n")  # Tool change
+                    writer.write("(MSG, Change to tool dia=%.4f)\n" % exobj.tools[tool]["C"])
+                    writer.write("M0\n")  # Temporary machine stop
                     if self.spindlespeed is not None:
                         # Spindle start with configured speed
-                        gcode += "M03 S%d\n" % int(self.spindlespeed)
+                        writer.write("M03 S%d\n" % int(self.spindlespeed))
                     else:
-                        gcode += "M03\n"  # Spindle start
+                        writer.write("M03\n")  # Spindle start
 
                 # Drillling!
-                for point in points[tool]:
-                    x, y = point.coords.xy
-                    gcode += t % (x[0], y[0])
-                    gcode += down + up_to_zero + up
+                if writer.modal:
+                    for x, y in points[tool].tolist():
+                        writer.move(0, x, y)
+                        writer.move_z(1, self.z_cut)
+                        writer.move_z(1, 0, "Z%d")
+                        writer.move_z(0, self.z_move)
+                else:
+                    # Same as above, without keeping track of the state.
+                    for x, y in points[tool].tolist():
+                        writer.write(t % (x, y) + drill)
 
-        gcode += t % (0, 0)
-        gcode += "M05\n"  # Spindle stop
+        writer.move(0, 0, 0)
+        writer.write("M05\n")  # Spindle stop
 
-        self.gcode = gcode
+        self.set_gcode(writer, output)
 
     def generate_from_geometry_2(self,
                                  geometry,
@@ -2921,13 +4461,19 @@ class CNCjob(Geometry):
                                  tooldia=None,
                                  tolerance=0,
                                  multidepth=False,
-                                 depthpercut=None):
+                                 depthpercut=None,
+                                 order="greedy",
+                                 order_time=1.0,
+                                 output=None):
         """
         Second algorithm to generate from Geometry.
 
         ALgorithm description:
         ----------------------
-        Uses RTree to find the nearest path to follow.
+        Orders the paths with ``order_paths()``, by default always
+        following the nearest one. The travel between paths, the number
+        of tool lifts and the time taken to order them are stored in
+        ``self.order_stats``.
 
         :param geometry:
         :param append:
@@ -2936,6 +4482,13 @@ class CNCjob(Geometry):
         :param multidepth: If True, use multiple passes to reach
            the desired depth.
         :param depthpercut: Maximum depth in each pass.
+        :param order: How to order the paths, see ``order_paths()``.
+        :type order: str
+        :param order_time: Time budget in seconds for improving
+            the order.
+        :type order_time: float
+        :param output: File-like object to write the G-code to
+            instead of ``self.gcode``.
         :return: None
         """
         assert isinstance(geometry, Geometry), \
@@ -2948,21 +4501,6 @@ class CNCjob(Geometry):
         flat_geometry = geometry.flatten(pathonly=True)
         log.debug("%d paths" % len(flat_geometry))
 
-        ## Index first and last points in paths
-        # What points to index.
-        def get_pts(o):
-            return [o.coords[0], o.coords[-1]]
-
-        # Create the indexed storage.
-        storage = FlatCAMRTreeStorage()
-        storage.get_points = get_pts
-
-        # Store the geometry
-        log.debug("Indexing geometry before generating G-Code...")
-        for shape in flat_geometry:
-            if shape is not None:  # TODO: This shouldn't have happened.
-                storage.insert(shape)
-
         if tooldia is not None:
             self.tooldia = tooldia
 
@@ -2972,122 +4510,89 @@ class CNCjob(Geometry):
             self.gcode = ""
 
         # Initial G-Code
-        self.gcode = self.unitcode[self.units.upper()] + "\n"
-        self.gcode += self.absolutecode + "\n"
-        self.gcode += self.feedminutecode + "\n"
-        self.gcode += "F%.2f\n" % self.feedrate
-        self.gcode += "G00 Z%.4f\n" % self.z_move  # Move (up) to travel height
-        if self.spindlespeed is not None:
-            self.gcode += "M03 S%d\n" % int(self.spindlespeed)  # Spindle start with configured speed
-        else:
-            self.gcode += "M03\n"  # Spindle start
-        #self.gcode += self.pausecode + "\n"
+        writer = self.gcode_writer(output)
+        self.write_gcode_start(writer)
+
+        # Depths of the passes, the same for every path.
+        # Open paths are cut back and forth, so after an even
+        # number of passes the tool is back at their start.
+        returns = False
+        if multidepth:
+            depths = self.depth_schedule(self.z_cut, depthpercut)
+            log.debug("%d passes per path" % len(depths))
+            returns = len(depths) % 2 == 0
+
+        ## Order the paths
+        t0 = time.time()
+        paths = [shape for shape in flat_geometry if shape is not None]  # TODO: This shouldn't have happened.
+        # The tool goes back to the origin at the end.
+        paths = order_paths(paths, (0.0, 0.0), order, order_time, returns, end=(0.0, 0.0))
+        self.order_stats = {
+            "method": order or "greedy",
+            "travel": path_travel(paths, end=(0.0, 0.0), returns=returns),
+            "lifts": len(paths),
+            "time": time.time() - t0
+        }
+        log.debug("Path order %(method)s: travel %(travel).4f, %(lifts)d lifts, %(time).3f s." % self.order_stats)
 
-        ## Iterate over geometry paths getting the nearest each time.
         log.debug("Starting G-Code...")
         path_count = 0
-        current_pt = (0, 0)
-        pt, geo = storage.nearest(current_pt)
-        try:
-            while True:
-                path_count += 1
-                #print "Current: ", "(%.3f, %.3f)" % current_pt
-
-                # Remove before modifying, otherwise
-                # deletion will fail.
-                storage.remove(geo)
-
-                # If last point in geometry is the nearest
-                # but prefer the first one if last point == first point
-                # then reverse coordinates.
-                if pt != geo.coords[0] and pt == geo.coords[-1]:
-                    geo.coords = list(geo.coords)[::-1]
-
-                #---------- Single depth/pass --------
-                if not multidepth:
-                    # G-code
-                    # Note: self.linear2gcode() and self.point2gcode() will
-                    # lower and raise the tool every time.
-                    if type(geo) == LineString or type(geo) == LinearRing:
-                        self.gcode += self.linear2gcode(geo, tolerance=tolerance)
-                    elif type(geo) == Point:
-                        self.gcode += self.point2gcode(geo)
-                    else:
-                        log.warning("G-code generation not implemented for %s" % (str(type(geo))))
-
-                #--------- Multi-pass ---------
+        for geo in paths:
+            path_count += 1
+
+            #---------- Single depth/pass --------
+            if not multidepth:
+                # G-code
+                # Note: self.linear2gcode() and self.point2gcode() will
+                # lower and raise the tool every time.
+                if type(geo) == LineString or type(geo) == LinearRing:
+                    self.linear2gcode(geo, tolerance=tolerance, writer=writer)
+                elif type(geo) == Point:
+                    self.point2gcode(geo, writer=writer)
                 else:
-                    if isinstance(self.z_cut, Decimal):
-                        z_cut = self.z_cut
-                    else:
-                        z_cut = Decimal(self.z_cut).quantize(Decimal('0.000000001'))
-
-                    if depthpercut is None:
-                        depthpercut = z_cut
-                    elif not isinstance(depthpercut, Decimal):
-                        depthpercut = Decimal(depthpercut).quantize(Decimal('0.000000001'))
-
-                    depth = 0
-                    reverse = False
-                    while depth > z_cut:
-
-                        # Increase depth. Limit to z_cut.
-                        depth -= depthpercut
-                        if depth < z_cut:
-                            depth = z_cut
-
-                        # Cut at specific depth and do not lift the tool.
-                        # Note: linear2gcode() will use G00 to move to the
-                        # first point in the path, but it should be already
-                        # at the first point if the tool is down (in the material).
-                        # So, an extra G00 should show up but is inconsequential.
-                        if type(geo) == LineString or type(geo) == LinearRing:
-                            self.gcode += self.linear2gcode(geo, tolerance=tolerance,
-                                                            zcut=depth,
-                                                            up=False)
-
-                        # Ignore multi-pass for points.
-                        elif type(geo) == Point:
-                            self.gcode += self.point2gcode(geo)
-                            break  # Ignoring ...
+                    log.warning("G-code generation not implemented for %s" % (str(type(geo))))
 
-                        else:
-                            log.warning("G-code generation not implemented for %s" % (str(type(geo))))
+            #--------- Multi-pass ---------
+            else:
+                if type(geo) == LineString or type(geo) == LinearRing:
+                    self.linear2gcode_passes(geo, depths, tolerance=tolerance, writer=writer)
 
-                        # Reverse coordinates if not a loop so we can continue
-                        # cutting without returning to the beginhing.
-                        if type(geo) == LineString:
-                            geo.coords = list(geo.coords)[::-1]
-                            reverse = True
+                # Ignore multi-pass for points.
+                elif type(geo) == Point:
+                    if depths:
+                        self.point2gcode(geo, writer=writer)
 
-                    # If geometry is reversed, revert.
-                    if reverse:
-                        if type(geo) == LineString:
-                            geo.coords = list(geo.coords)[::-1]
+                elif depths:
+                    log.warning("G-code generation not implemented for %s" % (str(type(geo))))
 
-                    # Lift the tool
-                    self.gcode += "G00 Z%.4f\n" % self.z_move
-                    # self.gcode += "( End of path. )\n"
+                # Lift the tool
+                writer.move_z(0, self.z_move)
+                # writer.write("( End of path. )\n")
 
-                # Did deletion at the beginning.
-                # Delete from index, update current location and continue.
-                #rti.delete(hits[0], geo.coords[0])
-                #rti.delete(hits[0], geo.coords[-1])
+        log.debug("%s paths traced." % path_count)
 
-                current_pt = geo.coords[-1]
+        # Finish
+        writer.move_z(0, self.z_move)  # Stop cutting
+        if writer.modal:
+            writer.move(0, 0, 0)
+        else:
+            writer.write("G00 X0Y0\n")
+        writer.write("M05\n")  # Spindle stop
 
-                # Next
-                pt, geo = storage.nearest(current_pt)
+        self.set_gcode(writer, output)
 
-        except StopIteration:  # Nothing found in storage.
-            pass
+    # Words at the start of a G-code line, like "G01 X1234 Y987".
+    # Anything after the first character that is not part of a word
+    # is ignored, like comments.
+    gcode_words_re = re.compile(r'(?:\s*[A-Z]\s*[\+\-\.\d\s]+)*')
+    gcode_word_re = re.compile(r'([A-Z])\s*([\+\-\.\d\s]+)')
 
-        log.debug("%s paths traced." % path_count)
+    # Columns of gcode_table().
+    gcode_columns = ['motion', 'units', 'X', 'Y', 'Z', 'I', 'J', 'nonmodal']
 
-        # Finish
-        self.gcode += "G00 Z%.4f\n" % self.z_move  # Stop cutting
-        self.gcode += "G00 X0Y0\n"
-        self.gcode += "M05\n"  # Spindle stop
+    # G words whose coordinates are not a move in the current motion
+    # mode, like G28 X0 Y0 (decimals like G28.1 included).
+    gcode_nonmodal = [4, 10, 28, 30, 53, 92]
 
     @staticmethod
     def codes_split(gline):
@@ -3099,105 +4604,300 @@ class CNCjob(Geometry):
         :return: Dictionary with parsed line.
         """
 
-        command = {}
-
-        match = re.search(r'^\s*([A-Z])\s*([\+\-\.\d\s]+)', gline)
-        while match:
-            command[match.group(1)] = float(match.group(2).replace(" ", ""))
-            gline = gline[match.end():]
-            match = re.search(r'^\s*([A-Z])\s*([\+\-\.\d\s]+)', gline)
-
-        return command
+        return dict(CNCjob.gcode_words(gline))
 
-    def gcode_parse(self):
+    @staticmethod
+    def gcode_words(gline):
         """
-        G-Code parser (from self.gcode). Generates dictionary with
-        single-segment LineString's and "kind" indicating cut or travel,
-        fast or feedrate speed.
+        Parses a line of G-Code such as "G01 X1234 Y987" into
+        a list of words: [('G', 1.0), ('X', 1234.0), ('Y', 987.0)]
+
+        :param gline: G-Code line string
+        :return: List of (letter, value).
         """
+        end = CNCjob.gcode_words_re.match(gline).end()
+        if end == 0:
+            return []
+
+        words = []
+        for letter, value in CNCjob.gcode_word_re.findall(gline, 0, end):
+            try:
+                words.append((letter, float(value)))
+            except ValueError:
+                words.append((letter, float(value.replace(" ", ""))))
+        return words
 
-        kind = ["C", "F"]  # T=travel, C=cut, F=fast, S=slow
+    @staticmethod
+    def gcode_table(gcode, chunk_size=1 << 22):
+        """
+        Tokenizes G-code into arrays with one row per line that sets
+        any of the columns in ``CNCjob.gcode_columns``, NaN where it
+        does not. Only G00 to G03 are kept as 'motion', G20/G21 as
+        'units' and those in ``CNCjob.gcode_nonmodal`` as 'nonmodal'.
+        Words are read as in ``gcode_words()``.
+
+        The text is processed in chunks of lines of about ``chunk_size``
+        characters, each as an array of bytes. Lines that do not look
+        like plain words, like numbers with two signs, are passed to
+        ``gcode_words()``.
+
+        :param gcode: G-code text.
+        :type gcode: str
+        :return: Dictionary of arrays, one per column.
+        :rtype: dict
+        """
+        columns = CNCjob.gcode_columns
+        letter_column = np.full(256, -1, dtype=np.int64)
+        for col, letter in enumerate(columns):
+            if len(letter) == 1:
+                letter_column[ord(letter)] = col
+        letter_column[ord('G')] = 0
+        nonmodal_column = columns.index('nonmodal')
+
+        tables = []
+        pos = 0
+        while pos < len(gcode):
+            end = gcode.find("\n", pos + chunk_size)
+            end = len(gcode) if end == -1 else end + 1
+            chunk = gcode[pos:end]
+            pos = end
+
+            b = np.frombuffer(chunk, dtype=np.uint8)
+            newline = b == 10
+            line = np.cumsum(newline)
+            line -= newline
+
+            upper = (b >= 65) & (b <= 90)
+            digit = (b >= 48) & (b <= 57)
+            point = b == 46
+            sign = (b == 45) | (b == 43)
+            space = (b == 32) | (b == 9) | (b == 13)
+
+            # Words end at the first character that can not be part of
+            # them, like the start of a comment.
+            bad = ~(upper | digit | point | sign | space | newline)
+            bad_count = np.cumsum(bad)
+            line_start = np.flatnonzero(np.concatenate([[True], newline[:-1]]))
+            live = bad_count - (bad_count - bad)[line_start][line] == 0
+            live &= ~newline
+
+            letter = upper & live
+            token_pos = np.flatnonzero(letter)
+            token_line = line[token_pos]
+            n_tokens = len(token_pos)
+            if n_tokens == 0:
+                continue
 
-        # Results go here
-        geometry = []        
+            # Characters of the values, after their letter in the same line.
+            token = np.cumsum(letter) - 1
+            in_value = live & ~letter & ~space & (token >= 0)
+            in_value &= token_line[np.maximum(token, 0)] == line
+            strays = live & ~letter & ~space & ~in_value
+
+            chars = np.flatnonzero(in_value)
+            ctok = token[chars]
+            cdigit = digit[chars]
+            cpoint = point[chars]
+            csign = sign[chars]
+
+            n_digits = np.bincount(ctok[cdigit], minlength=n_tokens)
+            n_points = np.bincount(ctok[cpoint], minlength=n_tokens)
+            n_signs = np.bincount(ctok[csign], minlength=n_tokens)
+
+            # Sign only at the start.
+            first = np.full(n_tokens, -1, dtype=np.int64)
+            first[ctok[::-1]] = chars[::-1]
+            sign_ok = (n_signs == 0) | sign[np.maximum(first, 0)]
+
+            valid = (n_digits > 0) & (n_digits <= 15) & (n_points <= 1) & (n_signs <= 1) & sign_ok
+
+            # Value = digits as an integer / 10 ** digits after the point.
+            # Both are exact, so the result is rounded as by float().
+            dtok = ctok[cdigit]
+            dpos = chars[cdigit]
+            rank = np.arange(len(dtok)) - np.searchsorted(dtok, dtok)
+            power = n_digits[dtok] - 1 - rank
+            mantissa = np.bincount(dtok, weights=(b[dpos] - 48) * 10.0 ** power, minlength=n_tokens)
+            point_pos = np.full(n_tokens, len(b), dtype=np.int64)
+            point_pos[ctok[cpoint]] = chars[cpoint]
+            decimals = np.bincount(dtok, weights=dpos > point_pos[dtok], minlength=n_tokens)
+            values = mantissa / 10.0 ** decimals
+            negative = b[np.maximum(first, 0)] == 45
+            values[negative & (first >= 0)] *= -1
+
+            # Lines to parse with gcode_words().
+            odd_lines = np.union1d(token_line[~valid], line[strays])
+
+            # Columns of the tokens. G is for motion, units or
+            # non-modal commands.
+            col = letter_column[b[token_pos]]
+            g = col == 0
+            col[g & (values >= 20)] = 1
+            col[g & ~np.in1d(values, [0, 1, 2, 3, 20, 21])] = -1
+            col[g & np.in1d(np.floor(values), CNCjob.gcode_nonmodal)] = nonmodal_column
+            keep = (col >= 0) & ~np.in1d(token_line, odd_lines)
+
+            # The last of repeated words in a line wins.
+            key = (token_line[keep] * len(columns) + col[keep])[::-1]
+            key, last = np.unique(key, return_index=True)
+            kept_values = values[keep][::-1][last]
+
+            rows = np.union1d(key // len(columns), odd_lines)
+            table = np.full((len(rows), len(columns)), np.nan)
+            table[np.searchsorted(rows, key // len(columns)), key % len(columns)] = kept_values
+
+            if len(odd_lines) > 0:
+                lines = chunk.split("\n")
+                for row in np.searchsorted(rows, odd_lines).tolist():
+                    for letter, value in CNCjob.gcode_words(lines[rows[row]]):
+                        if letter == 'G':
+                            if value in (0.0, 1.0, 2.0, 3.0):
+                                table[row, 0] = value
+                            elif value == 20.0 or value == 21.0:
+                                table[row, 1] = value
+                            elif np.floor(value) in CNCjob.gcode_nonmodal:
+                                table[row, nonmodal_column] = value
+                        elif letter in 'XYZIJ':
+                            table[row, columns.index(letter)] = value
+
+            # Only keep lines that matter.
+            tables.append(table[~np.isnan(table[:, :5]).all(axis=1)])
+
+        if tables:
+            table = np.concatenate(tables)
+        else:
+            table = np.zeros((0, len(columns)))
+        return dict((name, table[:, col]) for col, name in enumerate(columns))
 
-        # Last known instruction
-        current = {'X': 0.0, 'Y': 0.0, 'Z': 0.0, 'G': 0}
+    @property
+    def solid_geometry(self):
+        """
+        Union of the parsed paths. Only computed when read, the
+        bounds are taken from the paths directly.
+        """
+        if self._solid_geometry is None and (self.toolpath is not None or self._gcode_parsed):
+            self._solid_geometry = cascaded_union([geo['geom'] for geo in self.gcode_parsed])
+        return self._solid_geometry
 
-        # Current path: temporary storage until tool is
-        # lifted or lowered.
-        path = [(0, 0)]
+    @solid_geometry.setter
+    def solid_geometry(self, geometry):
+        self._solid_geometry = geometry
 
-        # Process every instruction
-        for line in StringIO(self.gcode):
+    @property
+    def gcode_parsed(self):
+        """
+        List of dictionaries with single-path LineString's and "kind"
+        indicating cut or travel, fast or feedrate speed. Created from
+        ``self.toolpath`` when first used.
+        """
+        if self._gcode_parsed is None and self.toolpath is not None:
+            self._gcode_parsed = self.toolpath.to_parsed()
+        return self._gcode_parsed
 
-            gobj = self.codes_split(line)
+    @gcode_parsed.setter
+    def gcode_parsed(self, value):
+        self._gcode_parsed = value
+        self.toolpath = None
 
-            ## Units
-            if 'G' in gobj and (gobj['G'] == 20.0 or gobj['G'] == 21.0):
-                self.units = {20.0: "IN", 21.0: "MM"}[gobj['G']]
-                continue
+    def gcode_parse(self):
+        """
+        G-Code parser (from self.gcode). Fills ``self.toolpath`` with
+        the paths between changes of height and their "kind" indicating
+        cut or travel, fast or feedrate speed. ``self.gcode_parsed`` is
+        created from it when needed.
+
+        Only G00 to G03 change the motion mode. Coordinates in lines
+        with a non-modal G word, like G28 or G92, are not moves but
+        are still taken as the current position. Arcs without I and
+        J are cut as straight lines.
+        """
+
+        table = self.gcode_table(self.gcode)
+        n = len(table['X'])
+
+        def fill(values, initial):
+            # Last value up to every line.
+            present = ~np.isnan(values)
+            last = np.maximum.accumulate(np.where(present, np.arange(n), -1))
+            return np.where(last >= 0, values[np.maximum(last, 0)], initial)
+
+        ## Units
+        units = table['units'][~np.isnan(table['units'])]
+        if len(units) > 0:
+            self.units = {20.0: "IN", 21.0: "MM"}[units[-1]]
+
+        motion = fill(table['motion'], 0.0)
+        z = fill(table['Z'], 0.0)
+        x = fill(table['X'], 0.0)
+        y = fill(table['Y'], 0.0)
+
+        z_lines = ~np.isnan(table['Z'])
+        xy_lines = (~np.isnan(table['X']) | ~np.isnan(table['Y'])) & np.isnan(table['nonmodal'])
+
+        ## Changing height while moving
+        z_before = np.concatenate([[0.0], z[:-1]])
+        skewed = np.flatnonzero(z_lines & xy_lines & (z != z_before))
+        if len(skewed) > 0:
+            log.warning("Non-orthogonal motion in %d lines. First from Z=%s to %s" %
+                        (len(skewed), z_before[skewed[0]], (x[skewed[0]], y[skewed[0]], z[skewed[0]])))
+
+        ## Points, starting at the origin, then every move
+        moves = np.flatnonzero(xy_lines)
+        move_x, move_y, move_z, move_g = x[moves], y[moves], z[moves], motion[moves].astype(np.int8)
+        move_kind = 2 * (move_z > 0) + (move_g > 0)  # 'CF', 'CS', 'TF', 'TS'
+
+        arcs = np.flatnonzero(((move_g == 2) | (move_g == 3)) &
+                              ~(np.isnan(table['I'][moves]) & np.isnan(table['J'][moves])))
+        counts = np.ones(len(moves), dtype=np.int64)
+        arc_pts = []
+        arcdir = [None, None, "cw", "ccw"]
+        for k in arcs.tolist():
+            cur_x = move_x[k - 1] if k > 0 else 0.0
+            cur_y = move_y[k - 1] if k > 0 else 0.0
+            i = np.nan_to_num(table['I'][moves[k]])
+            j = np.nan_to_num(table['J'][moves[k]])
+            center = [i + cur_x, j + cur_y]
+            radius = sqrt(i ** 2 + j ** 2)
+            start = arctan2(-j, -i)
+            stop = arctan2(-center[1] + move_y[k], -center[0] + move_x[k])
+            arc_pts.append(arc_points(center, radius, start, stop, arcdir[move_g[k]],
+                                      self.steps_per_circ, self.arc_tolerance))
+            counts[k] = len(arc_pts[-1])
+
+        ends = np.cumsum(counts) + 1     # Points after every move
+        total = int(ends[-1]) if len(ends) > 0 else 1
+        px, py = np.zeros(total), np.zeros(total)
+        straight = np.ones(len(moves), dtype=bool)
+        straight[arcs] = False
+        px[ends[straight] - 1] = move_x[straight]
+        py[ends[straight] - 1] = move_y[straight]
+        for k, pts in zip(arcs.tolist(), arc_pts):
+            px[ends[k] - counts[k]:ends[k]] = pts[:, 0]
+            py[ends[k] - counts[k]:ends[k]] = pts[:, 1]
+        pz = np.concatenate([[0.0], np.repeat(move_z, counts)])
+        pg = np.concatenate([[0], np.repeat(move_g, counts)]).astype(np.int8)
+
+        ## Paths: split where the height changes, if there was any
+        # move since the last split. A path starts at the last point
+        # of the previous one.
+        splits = np.concatenate([[1], ends])[np.searchsorted(moves, np.flatnonzero(z_lines))]
+        splits = np.unique(splits)
+        splits = splits[splits > 1]
+        if total > (splits[-1] if len(splits) > 0 else 1):
+            splits = np.append(splits, total)
+        first = np.concatenate([[1], splits[:-1]]) - 1
+        lengths = splits - first
+
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        index = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - first, lengths)
+
+        # Kind of the last move of each path.
+        last_move = np.searchsorted(ends, splits - 1, side='right')
+        kinds = np.array(['CF', 'CS', 'TF', 'TS'])[move_kind[last_move]]
 
-            ## Changing height
-            if 'Z' in gobj:
-                if ('X' in gobj or 'Y' in gobj) and gobj['Z'] != current['Z']:
-                    log.warning("Non-orthogonal motion: From %s" % str(current))
-                    log.warning("  To: %s" % str(gobj))
-                current['Z'] = gobj['Z']
-                # Store the path into geometry and reset path
-                if len(path) > 1:
-                    geometry.append({"geom": LineString(path),
-                                     "kind": kind})
-                    path = [path[-1]]  # Start with the last point of last path.
-
-            if 'G' in gobj:
-                current['G'] = int(gobj['G'])
-                
-            if 'X' in gobj or 'Y' in gobj:
-                
-                if 'X' in gobj:
-                    x = gobj['X']
-                else:
-                    x = current['X']
-                
-                if 'Y' in gobj:
-                    y = gobj['Y']
-                else:
-                    y = current['Y']
-
-                kind = ["C", "F"]  # T=travel, C=cut, F=fast, S=slow
-
-                if current['Z'] > 0:
-                    kind[0] = 'T'
-                if current['G'] > 0:
-                    kind[1] = 'S'
-                   
-                arcdir = [None, None, "cw", "ccw"]
-                if current['G'] in [0, 1]:  # line
-                    path.append((x, y))
-
-                if current['G'] in [2, 3]:  # arc
-                    center = [gobj['I'] + current['X'], gobj['J'] + current['Y']]
-                    radius = sqrt(gobj['I']**2 + gobj['J']**2)
-                    start = arctan2(-gobj['J'], -gobj['I'])
-                    stop = arctan2(-center[1] + y, -center[0] + x)
-                    path += arc(center, radius, start, stop,
-                                arcdir[current['G']],
-                                self.steps_per_circ)
-
-            # Update current instruction
-            for code in gobj:
-                current[code] = gobj[code]
-
-        # There might not be a change in height at the
-        # end, therefore, see here too if there is
-        # a final path.
-        if len(path) > 1:
-            geometry.append({"geom": LineString(path),
-                             "kind": kind})
-
-        self.gcode_parsed = geometry
-        return geometry
+        self.gcode_parsed = None
+        self.toolpath = GCodeToolpath(px[index], py[index], pz[index], pg[index], offsets, kinds)
+        return self.toolpath
 
     # def plot(self, tooldia=None, dpi=75, margin=0.1,
     #          color={"T": ["#F0E24D", "#B5AB3A"], "C": ["#5E6CFF", "#4650BD"]},
@@ -3236,48 +4936,103 @@ class CNCjob(Geometry):
         
     def plot2(self, tooldia=None, dpi=75, margin=0.1,
               color={"T": ["#F0E24D4C", "#B5AB3A4C"], "C": ["#5E6CFFFF", "#4650BDFF"]},
-              alpha={"T": 0.3, "C": 1.0}, tool_tolerance=0.0005, obj=None, visible=False):
+              alpha={"T": 0.3, "C": 1.0}, tool_tolerance=0.0005, obj=None, visible=False, view=None):
         """
         Plots the G-code job onto the given axes.
 
+        Paths in ``self.toolpath`` are plotted all at once as lines as
+        wide as the tool, except those in ``view``, which are buffered
+        into shapes of their own like parsed paths without a toolpath.
+
         :param tooldia: Tool diameter.
         :param dpi: Not used!
         :param margin: Not used!
         :param color: Color specification.
         :param alpha: Transparency specification.
         :param tool_tolerance: Tolerance when drawing the toolshape.
+        :param view: Area (xmin, ymin, xmax, ymax) with paths to plot
+            as buffered shapes, or None.
         :return: None
         """
-        path_num = 0
-
         if tooldia is None:
             tooldia = self.tooldia
-        
-        if tooldia == 0:
-            for geo in self.gcode_parsed:
-                obj.add_shape(shape=geo['geom'], color=color[geo['kind'][0]][1], visible=visible)
-        else:
-            text = []
-            pos = []
-            for geo in self.gcode_parsed:
-                path_num += 1
 
-                text.append(str(path_num))
-                pos.append(geo['geom'].coords[0])
+        toolpath = self.toolpath
+        if toolpath is None:
+            paths = [(geo['geom'], geo['kind'][0]) for geo in self.gcode_parsed]
+            starts = [geo['geom'].coords[0] for geo in self.gcode_parsed]
+        else:
+            kinds = toolpath.kinds.astype('S1')
+            buffered = toolpath.paths_in(view) if view is not None else []
+            paths = [(LineString(toolpath.coords(i)), kinds[i]) for i in buffered]
+            starts = np.column_stack([toolpath.x[toolpath.offsets[:-1]],
+                                      toolpath.y[toolpath.offsets[:-1]]]).tolist()
+
+            batched = np.ones(len(toolpath), dtype=bool)
+            batched[buffered] = False
+            path = toolpath.path
+            for kind in ['T', 'C']:
+                keep = (batched & (kinds == kind))[path]
+                if not keep.any():
+                    continue
+                obj.add_toolpath(points=np.column_stack([toolpath.x[keep], toolpath.y[keep]]), path=path[keep],
+                                 width=tooldia, color=color[kind][1], face_color=color[kind][0],
+                                 visible=visible, layer=1 if kind == 'C' else 2, tolerance=tool_tolerance)
 
-                poly = geo['geom'].buffer(tooldia / 2.0).simplify(tool_tolerance)
-                obj.add_shape(shape=poly, color=color[geo['kind'][0]][1], face_color=color[geo['kind'][0]][0],
-                              visible=visible, layer=1 if geo['kind'][0] == 'C' else 2)
+        for geom, kind in paths:
+            if tooldia == 0:
+                obj.add_shape(shape=geom, color=color[kind][1], visible=visible)
+            else:
+                poly = geom.buffer(tooldia / 2.0).simplify(tool_tolerance)
+                obj.add_shape(shape=poly, color=color[kind][1], face_color=color[kind][0],
+                              visible=visible, layer=1 if kind == 'C' else 2)
 
-            obj.annotation.set(text=text, pos=pos, visible=obj.options['plot'])
+        if tooldia != 0:
+            text = [str(path_num) for path_num in range(1, len(starts) + 1)]
+            obj.annotation.set(text=text, pos=starts, visible=obj.options['plot'])
 
     def create_geometry(self):
-        # TODO: This takes forever. Too much data?
-        self.solid_geometry = cascaded_union([geo['geom'] for geo in self.gcode_parsed])
+        """
+        Updates ``self.solid_geometry`` after the parsed paths changed.
+        The union is only computed when it is read.
+
+        :return: None
+        """
+        self.solid_geometry = None
+
+    def is_empty(self):
+        if self._solid_geometry is None:
+            if self.toolpath is not None:
+                return len(self.toolpath) == 0
+            return not self._gcode_parsed
+        return Geometry.is_empty(self)
+
+    def bounds(self):
+        """
+        Returns coordinates of rectangular bounds
+        of the paths: (xmin, ymin, xmax, ymax).
+        """
+        if self._solid_geometry is None:
+            if self.toolpath is not None:
+                return self.toolpath.bounds() or (0, 0, 0, 0)
+            if self._gcode_parsed:
+                bounds = np.array([geo['geom'].bounds for geo in self._gcode_parsed])
+                return (bounds[:, 0].min(), bounds[:, 1].min(),
+                        bounds[:, 2].max(), bounds[:, 3].max())
+        return Geometry.bounds(self)
+
+    def to_dict(self):
+        """
+        As ``Geometry.to_dict()``, without computing the union of
+        the paths if it was not needed yet.
+        """
+        d = dict((attr, getattr(self, attr)) for attr in self.ser_attrs if attr != 'solid_geometry')
+        d['solid_geometry'] = self._solid_geometry
+        return d
 
     def linear2gcode(self, linear, tolerance=0, down=True, up=True,
                      zcut=None, ztravel=None, downrate=None,
-                     feedrate=None, cont=False):
+                     feedrate=None, cont=False, writer=None):
         """
         Generates G-code to cut along the linear feature.
 
@@ -3286,7 +5041,11 @@ class CNCjob(Geometry):
         :param tolerance: All points in the simplified object will be within the
             tolerance distance of the original geometry.
         :type tolerance: float
-        :return: G-code to cut along the linear feature.
+        :param writer: Where to write the G-code. If None,
+            it is returned.
+        :type writer: GCodeWriter
+        :return: G-code to cut along the linear feature, if no
+            writer was given.
         :rtype: str
         """
 
@@ -3302,58 +5061,173 @@ class CNCjob(Geometry):
         if feedrate is None:
             feedrate = self.feedrate
 
-        t = "G0%d " + CNCjob.defaults["coordinate_format"] + "\n"
-
         # Simplify paths?
         if tolerance > 0:
             target_linear = linear.simplify(tolerance)
         else:
             target_linear = linear
 
-        gcode = ""
+        own_writer = writer is None
+        if own_writer:
+            writer = self.gcode_writer()
 
         path = list(target_linear.coords)
 
         # Move fast to 1st point
         if not cont:
-            gcode += t % (0, path[0][0], path[0][1])  # Move to first point
+            writer.move(0, path[0][0], path[0][1])  # Move to first point
 
         # Move down to cutting depth
         if down:
             # Different feedrate for vertical cut?
             if self.zdownrate is not None:
-                gcode += "F%.2f\n" % downrate
-                gcode += "G01 Z%.4f\n" % zcut       # Start cutting
-                gcode += "F%.2f\n" % feedrate       # Restore feedrate
+                writer.set_feedrate(downrate)
+                writer.move_z(1, zcut)          # Start cutting
+                writer.set_feedrate(feedrate)   # Restore feedrate
             else:
-                gcode += "G01 Z%.4f\n" % zcut       # Start cutting
+                writer.move_z(1, zcut)          # Start cutting
 
         # Cutting...
-        for pt in path[1:]:
-            gcode += t % (1, pt[0], pt[1])    # Linear motion to point
+        if self.arc_fitting > 0:
+            writer.arc_moves(fit_arcs(path, self.arc_fitting))
+        else:
+            writer.moves(1, path[1:])           # Linear motion to points
 
         # Up to travelling height.
         if up:
-            gcode += "G00 Z%.4f\n" % ztravel  # Stop cutting
+            writer.move_z(0, ztravel)           # Stop cutting
+
+        if own_writer:
+            return writer.getvalue()
+
+    @staticmethod
+    def depth_schedule(z_cut, depthpercut=None):
+        """
+        Depths of the passes to cut down to ``z_cut``, going at most
+        ``depthpercut`` deeper each time. Computed with Decimal so the
+        last pass is exactly at ``z_cut``.
 
-        return gcode
+        :param z_cut: Final depth, negative.
+        :param depthpercut: Maximum depth of each pass. All at once if None.
+        :return: Depths, empty if ``z_cut`` is not below 0.
+        :rtype: list
+        """
+        if not isinstance(z_cut, Decimal):
+            z_cut = Decimal(z_cut).quantize(Decimal('0.000000001'))
+
+        if depthpercut is None:
+            depthpercut = abs(z_cut)
+        elif not isinstance(depthpercut, Decimal):
+            depthpercut = abs(Decimal(depthpercut).quantize(Decimal('0.000000001')))
+        else:
+            depthpercut = abs(depthpercut)
+
+        if depthpercut == 0:
+            depthpercut = abs(z_cut)
+
+        depths = []
+        depth = 0
+        while depth > z_cut:
+
+            # Increase depth. Limit to z_cut.
+            depth -= depthpercut
+            if depth < z_cut:
+                depth = z_cut
+
+            depths.append(depth)
+
+        return depths
+
+    def linear2gcode_passes(self, linear, depths, tolerance=0, writer=None):
+        """
+        Cuts along the linear feature once at every depth without lifting
+        the tool in between. Open paths are cut back and forth, closed
+        ones always in the same direction. The moves are formatted once
+        for all the passes.
+
+        :param linear: The path to cut along.
+        :type: Shapely.LinearRing or Shapely.Linear String
+        :param depths: Depths of the passes, see ``depth_schedule()``.
+        :param tolerance: Simplification tolerance, as in ``linear2gcode()``.
+        :param writer: Where to write the G-code.
+        :type writer: GCodeWriter
+        :return: Where the tool ends, or None if there are no passes.
+        """
+        if not depths:
+            return None
+
+        # Simplify paths?
+        if tolerance > 0:
+            target_linear = linear.simplify(tolerance)
+        else:
+            target_linear = linear
+
+        coords = np.asarray(target_linear.coords)
+        back_and_forth = type(linear) == LineString
+
+        arcs = None
+        if self.arc_fitting > 0:
+            arcs = fit_arcs(coords, self.arc_fitting)
+            arcs_back = reverse_moves(coords[0], arcs) if back_and_forth else arcs
+
+        if not writer.modal:
+            if arcs is not None:
+                forward = writer.format_moves(arcs)
+                backward = writer.format_moves(arcs_back) if back_and_forth else forward
+            else:
+                t = "G01 " + CNCjob.defaults["coordinate_format"] + "\n"
+                lines = [t % (x, y) for x, y in coords.tolist()]
+                forward = "".join(lines[1:])
+                backward = "".join(lines[-2::-1]) if back_and_forth else forward
+
+        path = coords
+        for i, depth in enumerate(depths):
+            if back_and_forth:
+                path = coords if i % 2 == 0 else coords[::-1]
+            reverse = back_and_forth and i % 2 == 1
+
+            # Note: Moves with G00 to the first point in the path,
+            # where the tool already is after the first pass.
+            # The extra G00 is inconsequential.
+            writer.move(0, path[0][0], path[0][1])
+
+            # Move down to cutting depth
+            if self.zdownrate is not None:
+                writer.set_feedrate(self.zdownrate)
+                writer.move_z(1, depth)         # Start cutting
+                writer.set_feedrate(self.feedrate)
+            else:
+                writer.move_z(1, depth)         # Start cutting
+
+            # Cutting...
+            if writer.modal and arcs is not None:
+                writer.arc_moves(arcs_back if reverse else arcs)
+            elif writer.modal:
+                writer.moves(1, path[1:].tolist())
+            else:
+                writer.write(backward if reverse else forward)
+
+        return tuple(path[-1])
+
+    def point2gcode(self, point, writer=None):
+        own_writer = writer is None
+        if own_writer:
+            writer = self.gcode_writer()
 
-    def point2gcode(self, point):
-        gcode = ""
-        #t = "G0%d X%.4fY%.4f\n"
-        t = "G0%d " + CNCjob.defaults["coordinate_format"] + "\n"
         path = list(point.coords)
-        gcode += t % (0, path[0][0], path[0][1])  # Move to first point
+        writer.move(0, path[0][0], path[0][1])  # Move to first point
 
         if self.zdownrate is not None:
-            gcode += "F%.2f\n" % self.zdownrate
-            gcode += "G01 Z%.4f\n" % self.z_cut       # Start cutting
-            gcode += "F%.2f\n" % self.feedrate
+            writer.set_feedrate(self.zdownrate)
+            writer.move_z(1, self.z_cut)        # Start cutting
+            writer.set_feedrate(self.feedrate)
         else:
-            gcode += "G01 Z%.4f\n" % self.z_cut       # Start cutting
+            writer.move_z(1, self.z_cut)        # Start cutting
+
+        writer.move_z(0, self.z_move)           # Stop cutting
 
-        gcode += "G00 Z%.4f\n" % self.z_move      # Stop cutting
-        return gcode
+        if own_writer:
+            return writer.getvalue()
 
     def scale(self, factor):
         """
@@ -3367,8 +5241,12 @@ class CNCjob(Geometry):
         :rtype: None
         """
 
-        for g in self.gcode_parsed:
-            g['geom'] = affinity.scale(g['geom'], factor, factor, origin=(0, 0))
+        if self.toolpath is not None:
+            self.toolpath.scale(factor)
+            self._gcode_parsed = None
+        else:
+            for g in self.gcode_parsed:
+                g['geom'] = affinity.scale(g['geom'], factor, factor, origin=(0, 0))
 
         self.create_geometry()
 
@@ -3383,8 +5261,12 @@ class CNCjob(Geometry):
         """
         dx, dy = vect
 
-        for g in self.gcode_parsed:
-            g['geom'] = affinity.translate(g['geom'], xoff=dx, yoff=dy)
+        if self.toolpath is not None:
+            self.toolpath.offset(dx, dy)
+            self._gcode_parsed = None
+        else:
+            for g in self.gcode_parsed:
+                g['geom'] = affinity.translate(g['geom'], xoff=dx, yoff=dy)
 
         self.create_geometry()
 
@@ -3418,7 +5300,7 @@ class CNCjob(Geometry):
             if g['kind'][0] == 'T': travels.append(g)
 
         # Used to determine the overall board size
-        self.solid_geometry = cascaded_union([geo['geom'] for geo in self.gcode_parsed])
+        self.create_geometry()
 
         # Convert the cuts and travels into single geometry objects we can render as svg xml
         if travels:
@@ -3456,29 +5338,290 @@ class CNCjob(Geometry):
 #
 #     return [xmin, ymin, xmax, ymax]
 
-def get_bounds(geometry_list):
-    xmin = Inf
-    ymin = Inf
-    xmax = -Inf
-    ymax = -Inf
+def get_bounds(geometry_list):
+    xmin = Inf
+    ymin = Inf
+    xmax = -Inf
+    ymax = -Inf
+
+    #print "Getting bounds of:", str(geometry_set)
+    for gs in geometry_list:
+        try:
+            gxmin, gymin, gxmax, gymax = gs.bounds()
+            xmin = min([xmin, gxmin])
+            ymin = min([ymin, gymin])
+            xmax = max([xmax, gxmax])
+            ymax = max([ymax, gymax])
+        except:
+            log.warning("DEVELOPMENT: Tried to get bounds of empty geometry.")
+
+    return [xmin, ymin, xmax, ymax]
+
+
+def union_polygons(polygons, use_buffer=True):
+    """
+    Joins a list of polygons into a single geometry.
+
+    :param polygons: List of Shapely polygons.
+    :param use_buffer: Join by buffering back and forth instead
+        of using cascaded_union().
+    :return: Union of the polygons.
+    :rtype: Polygon or MultiPolygon
+    """
+    if use_buffer:
+        new_poly = MultiPolygon(polygons)
+        new_poly = new_poly.buffer(0.00000001)
+        return new_poly.buffer(-0.00000001)
+
+    return cascaded_union(polygons).buffer(0)
+
+
+def union_polygons_wkb(args):
+    """
+    Worker for tiled_union(). Geometry is passed
+    to and from the worker process as WKB.
+
+    :param args: (list of WKB strings, use_buffer)
+    :return: WKB of the union.
+    :rtype: str
+    """
+    polygons, use_buffer = args
+    return union_polygons([wkb_loads(p) for p in polygons], use_buffer).wkb
+
+
+def isolation_geometry_wkb(args):
+    """
+    Worker for Geometry.isolation_passes(). Geometry is passed
+    to and from the worker process as WKB.
+
+    :param args: (WKB of the geometry, offset)
+    :return: (WKB of the buffered geometry, seconds taken)
+    :rtype: tuple
+    """
+    geometry, offset = args
+    t0 = time.time()
+    geo = wkb_loads(geometry).buffer(offset)
+    return geo.wkb, time.time() - t0
+
+
+def buffer_paths(paths, width, resolution=16):
+    """
+    Buffers paths of the given width.
+
+    :param paths: List of lists of points.
+    :param width: Width of the paths.
+    :param resolution: Segments per quarter circle.
+    :return: List of non-empty polygons.
+    :rtype: list
+    """
+    polygons = []
+    for path in paths:
+        geo = LineString(path).buffer(width / 2, resolution)
+        if not geo.is_empty:
+            polygons.append(geo)
+    return polygons
+
+
+def buffer_paths_wkb(args):
+    """
+    Worker for Gerber.build_layer(). Same as buffer_paths() but
+    returns the polygons as WKB.
+
+    :param args: (paths, width, resolution)
+    :return: List of WKB strings.
+    :rtype: list
+    """
+    paths, width, resolution = args
+    return [geo.wkb for geo in buffer_paths(paths, width, resolution)]
+
+
+def tiled_union(polygons, tiles=1, workers=0, use_buffer=True):
+    """
+    Same as union_polygons() but splits the extent of the polygons
+    in tiles x tiles tiles and joins the polygons inside each tile
+    in a separate process. Polygons crossing tile borders are then
+    joined with the tile results they touch. Results from different
+    tiles that do not touch any of those are disjoint and are
+    passed through untouched.
+
+    :param polygons: List of Shapely polygons.
+    :param tiles: Number of tiles along each side. 1 or less
+        does a plain union_polygons().
+    :param workers: Number of processes. 0 for one per CPU, 1 to
+        join the tiles in this process.
+    :param use_buffer: See union_polygons().
+    :return: Union of the polygons.
+    :rtype: Polygon or MultiPolygon
+    """
+    if tiles <= 1 or len(polygons) < 2:
+        return union_polygons(polygons, use_buffer)
+
+    bounds = np.array([poly.bounds for poly in polygons])
+    xmin, ymin = bounds[:, 0].min(), bounds[:, 1].min()
+    xmax, ymax = bounds[:, 2].max(), bounds[:, 3].max()
+    dx = (xmax - xmin) / tiles
+    dy = (ymax - ymin) / tiles
+    if dx <= 0 or dy <= 0:
+        return union_polygons(polygons, use_buffer)
+
+    # Tile containing the lower left corner of each polygon.
+    col = np.clip(((bounds[:, 0] - xmin) / dx).astype(int), 0, tiles - 1)
+    row = np.clip(((bounds[:, 1] - ymin) / dy).astype(int), 0, tiles - 1)
+
+    # A polygon belongs to that tile only if it is strictly inside,
+    # by more than the gap that union by buffer closes, so that
+    # results from neighboring tiles can not even touch. The outer
+    # edges of the extent are not shared.
+    pad = 0.00000002
+    bounds[:, :2] -= pad
+    bounds[:, 2:] += pad
+    inside = ((col == 0) | (bounds[:, 0] > xmin + col * dx)) & \
+             ((col == tiles - 1) | (bounds[:, 2] < xmin + (col + 1) * dx)) & \
+             ((row == 0) | (bounds[:, 1] > ymin + row * dy)) & \
+             ((row == tiles - 1) | (bounds[:, 3] < ymin + (row + 1) * dy))
+
+    groups = collections.defaultdict(list)
+    border = []
+    for i, poly in enumerate(polygons):
+        if inside[i]:
+            groups[row[i] * tiles + col[i]].append(poly.wkb)
+        else:
+            border.append(poly)
+
+    log.debug("tiled_union(): %d tiles, %d border polygons." % (len(groups), len(border)))
+
+    jobs = [(group, use_buffer) for group in groups.values()]
+    if workers == 1 or len(jobs) < 2:
+        results = map(union_polygons_wkb, jobs)
+    else:
+        pool = Pool(processes=(workers or None))
+        try:
+            results = pool.map(union_polygons_wkb, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    parts = []
+    for result in results:
+        geo = wkb_loads(result)
+        if geo.is_empty:
+            continue
+        parts += list(geo.geoms) if hasattr(geo, 'geoms') else [geo]
+
+    if border:
+        # Tile results that touch a border polygon are joined again.
+        border_index = rtindex.Index()
+        for i, poly in enumerate(border):
+            bxmin, bymin, bxmax, bymax = poly.bounds
+            border_index.insert(i, (bxmin - pad, bymin - pad, bxmax + pad, bymax + pad))
+
+        untouched = []
+        for part in parts:
+            if any(True for _ in border_index.intersection(part.bounds)):
+                border.append(part)
+            else:
+                untouched.append(part)
+
+        stitched = union_polygons(border, use_buffer)
+        if not stitched.is_empty:
+            untouched += list(stitched.geoms) if hasattr(stitched, 'geoms') else [stitched]
+        parts = untouched
+
+    if len(parts) == 1:
+        return parts[0]
+    return MultiPolygon(parts)
+
+
+def clear_polygon_wkb(args):
+    """
+    Worker for clear_polygons(). Same as Geometry.clear_polygon()
+    but the polygon and the resulting paths are WKB.
+
+    :param args: (index, polygon WKB, tooldia, overlap)
+    :return: (index, list of WKB strings, None) or
+        (index, None, error message).
+    :rtype: tuple
+    """
+    index, polygon, tooldia, overlap = args
+
+    try:
+        paths = Geometry.clear_polygon(wkb_loads(polygon), tooldia, overlap)
+    except Exception as e:
+        log.warning("Failed to clear polygon %d: %s" % (index, traceback.format_exc()))
+        return index, None, "%s: %s" % (type(e).__name__, str(e))
 
-    #print "Getting bounds of:", str(geometry_set)
-    for gs in geometry_list:
-        try:
-            gxmin, gymin, gxmax, gymax = gs.bounds()
-            xmin = min([xmin, gxmin])
-            ymin = min([ymin, gymin])
-            xmax = max([xmax, gxmax])
-            ymax = max([ymax, gymax])
-        except:
-            log.warning("DEVELOPMENT: Tried to get bounds of empty geometry.")
+    return index, [geo.wkb for geo in paths.get_objects()], None
 
-    return [xmin, ymin, xmax, ymax]
 
+def clear_polygons(polygons, tooldia, overlap=0.15, workers=0, progress=None, cancelled=None, poll=0.2):
+    """
+    Geometry.clear_polygon() on each of the polygons, spread over
+    ``workers`` processes. Polygons and paths cross the process
+    boundary as WKB.
+
+    :param polygons: List of Shapely polygons.
+    :param tooldia: Diameter of the tool.
+    :param overlap: Overlap of toolpasses.
+    :param workers: Number of processes. 0 for one per CPU, 1 to
+        clear the polygons in this process.
+    :param progress: Called with (polygons done, total) every
+        time a polygon is done.
+    :param cancelled: Function without arguments, True to stop.
+        Checked every ``poll`` seconds while waiting for the
+        workers, which are terminated on cancel.
+    :param poll: See ``cancelled``.
+    :return: For each polygon, the list of its paths or None if
+        it could not be cleared. None if cancelled.
+    :rtype: list
+    """
+    jobs = [(i, poly.wkb, tooldia, overlap) for i, poly in enumerate(polygons)]
+    results = [None] * len(jobs)
+
+    def done(result, count):
+        index, paths, error = result
+        if error is None:
+            results[index] = [wkb_loads(geo) for geo in paths]
+        if progress is not None:
+            progress(count, len(jobs))
+
+    if workers == 1 or len(jobs) < 2:
+        for count, job in enumerate(jobs):
+            if cancelled is not None and cancelled():
+                return None
+            done(clear_polygon_wkb(job), count + 1)
+        return results
+
+    pool = Pool(processes=(workers or None))
+    try:
+        pending = pool.imap_unordered(clear_polygon_wkb, jobs)
+        count = 0
+        while count < len(jobs):
+            if cancelled is not None and cancelled():
+                log.debug("clear_polygons(): cancelled with %d of %d polygons done." % (count, len(jobs)))
+                pool.terminate()
+                return None
+            try:
+                result = pending.next(timeout=poll)
+            except multiprocessing.TimeoutError:
+                continue
+            count += 1
+            done(result, count)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
 
-def arc(center, radius, start, stop, direction, steps_per_circ):
+
+def arc_points(center, radius, start, stop, direction, steps_per_circ, max_error=0.0):
     """
-    Creates a list of point along the specified arc.
+    Creates an array of points along the specified arc.
+
+    The number of segments is given by ``max_error`` if it is
+    not zero: Segments are as long as possible while staying within
+    ``max_error`` from the exact arc, and there is at least one
+    segment per quarter circle. Otherwise there are ``steps_per_circ``
+    segments per full circle.
 
     :param center: Coordinates of the center [x, y]
     :type center: list
@@ -3488,39 +5631,216 @@ def arc(center, radius, start, stop, direction, steps_per_circ):
     :type start: float
     :param stop: End angle in radians
     :type stop: float
-    :param direction: Orientation of the arc, "CW" or "CCW"
+    :param direction: Orientation of the arc, "cw" or "ccw"
     :type direction: string
     :param steps_per_circ: Number of straight line segments to
         represent a circle.
     :type steps_per_circ: int
-    :return: The desired arc, as list of tuples
-    :rtype: list
+    :param max_error: Maximum distance between the segments
+        and the exact arc.
+    :type max_error: float
+    :return: The desired arc, as an array of shape (n, 2).
+    :rtype: numpy.ndarray
     """
-    # TODO: Resolution should be established by maximum error from the exact arc.
 
     da_sign = {"cw": -1.0, "ccw": 1.0}
-    points = []
     if direction == "ccw" and stop <= start:
         stop += 2 * pi
     if direction == "cw" and stop >= start:
         stop -= 2 * pi
-    
+
     angle = abs(stop - start)
-        
-    #angle = stop-start
-    steps = max([int(ceil(angle / (2 * pi) * steps_per_circ)), 2])
+
+    if max_error > 0 and radius > 0:
+        # Chord of angle a is at r * (1 - cos(a / 2)) from the arc.
+        max_angle = 2 * np.arccos(max(1.0 - float(max_error) / radius, -1.0))
+        steps = max([int(ceil(angle / max_angle)), int(ceil(angle / (pi / 2))), 2])
+    else:
+        steps = max([int(ceil(angle / (2 * pi) * steps_per_circ)), 2])
+
     delta_angle = da_sign[direction] * angle * 1.0 / steps
-    for i in range(steps + 1):
-        theta = start + delta_angle * i
-        points.append((center[0] + radius * cos(theta), center[1] + radius * sin(theta)))
+    theta = start + delta_angle * np.arange(steps + 1)
+
+    points = np.empty((steps + 1, 2))
+    points[:, 0] = center[0] + radius * np.cos(theta)
+    points[:, 1] = center[1] + radius * np.sin(theta)
     return points
 
 
-def arc2(p1, p2, center, direction, steps_per_circ):
+def arc(center, radius, start, stop, direction, steps_per_circ, max_error=0.0):
+    """
+    Creates a list of point along the specified arc.
+    See ``arc_points()``.
+
+    :return: The desired arc, as list of [x, y]
+    :rtype: list
+    """
+    return arc_points(center, radius, start, stop, direction,
+                      steps_per_circ, max_error).tolist()
+
+
+def fit_arcs(coords, tolerance, max_angle=pi, min_segments=3, max_radius=1000.0):
+    """
+    Replaces runs of points along circular arcs by the arcs, so they
+    can be cut with G02/G03 instead of many short straight moves.
+
+    A run of at least ``min_segments`` segments becomes an arc when its
+    points and the segments between them are within ``tolerance`` from
+    the arc and they go around it in one direction. Runs are grown from
+    the first point on as long as they fit. Arcs with a radius over
+    ``max_radius``, as fitted to nearly straight runs, or with their
+    ends closer than twice ``tolerance``, where rounding could turn
+    them around, are not used.
+
+    :param coords: Points of the path, array of shape (n, 2).
+    :param tolerance: Maximum distance between the path and the arcs.
+        Should not be below the resolution of the G-code.
+    :type tolerance: float
+    :param max_angle: Maximum angle of an arc in radians.
+    :type max_angle: float
+    :param min_segments: Minimum segments replaced by an arc.
+    :type min_segments: int
+    :param max_radius: Maximum radius of an arc.
+    :type max_radius: float
+    :return: Moves from the first point, each (g, x, y, i, j). g is
+        1 for a straight move to (x, y), 2 (clockwise) or 3
+        (counterclockwise) for an arc to (x, y) around the center at
+        (i, j) from where the move starts. i and j are 0 for straight
+        moves.
+    :rtype: list
+    """
+    coords = np.asarray(coords, dtype=float)
+    n = len(coords)
+    moves = []
+
+    start = 0
+    while start < n - 1:
+        best = None
+        end = start + min_segments
+        while end < n:
+            fit = _fit_arc(coords[start:end + 1], tolerance, max_angle)
+            if fit is None:
+                break
+            g, cx, cy, radius, chord = fit
+            if radius <= max_radius and chord > 2 * tolerance:
+                best = (end, g, cx, cy)
+            end += 1
+
+        if best is None:
+            moves.append((1, coords[start + 1, 0], coords[start + 1, 1], 0.0, 0.0))
+            start += 1
+        else:
+            end, g, cx, cy = best
+            x0, y0 = coords[start]
+            moves.append((g, coords[end, 0], coords[end, 1], cx - x0, cy - y0))
+            start = end
+
+    return moves
+
+
+def _fit_arc(points, tolerance, max_angle):
+    """
+    Arc through the first, middle and last of ``points``, if all of
+    them fit it. See ``fit_arcs()``.
+
+    :return: (g, center x, center y, radius, distance between
+        the ends) or None.
+    """
+    x0, y0 = points[0]
+    ax, ay = points[len(points) // 2] - points[0]
+    bx, by = points[-1] - points[0]
+
+    # Circumcenter, relative to the first point.
+    d = 2.0 * (ax * by - ay * bx)
+    if abs(d) < 1e-12:
+        return None
+    a2 = ax * ax + ay * ay
+    b2 = bx * bx + by * by
+    ux = (by * a2 - ay * b2) / d
+    uy = (ax * b2 - bx * a2) / d
+    radius = sqrt(ux * ux + uy * uy)
+
+    rel = points - (x0 + ux, y0 + uy)
+    error = np.abs(np.hypot(rel[:, 0], rel[:, 1]) - radius).max()
+    if error > tolerance:
+        return None
+
+    # Angle of every segment around the center.
+    theta = np.arctan2(rel[:, 1], rel[:, 0])
+    dtheta = (np.diff(theta) + pi) % (2 * pi) - pi
+    if not ((dtheta > 0).all() or (dtheta < 0).all()):
+        return None
+    if abs(dtheta.sum()) > max_angle + 1e-9:
+        return None
+
+    # Segments are chords, away from the arc in their middle.
+    if error + radius * (1 - cos(np.abs(dtheta).max() / 2)) > tolerance:
+        return None
+
+    return (3 if dtheta[0] > 0 else 2), x0 + ux, y0 + uy, radius, sqrt(b2)
+
+
+def reverse_moves(start, moves):
+    """
+    The moves of ``fit_arcs()`` backwards.
+
+    :param start: Where the moves start.
+    :return: Moves from where ``moves`` end back to ``start``.
+    :rtype: list
+    """
+    starts = [tuple(start)] + [(x, y) for _, x, y, _, _ in moves[:-1]]
+    reversed_moves = []
+    for (g, x, y, i, j), (sx, sy) in reversed(zip(moves, starts)):
+        if g == 1:
+            reversed_moves.append((1, sx, sy, 0.0, 0.0))
+        else:
+            reversed_moves.append((5 - g, sx, sy, sx + i - x, sy + j - y))
+    return reversed_moves
+
+
+def quadrant_segments(radius, max_error, default=16):
+    """
+    Number of segments per quarter circle to stay within
+    ``max_error`` from a circle, as used by Shapely's ``buffer()``.
+    See ``arc_points()``.
+
+    :param radius: Radius of the circle.
+    :param max_error: Maximum distance between the segments
+        and the exact circle. 0 for ``default``.
+    :param default: Segments when ``max_error`` is 0.
+    :return: Segments per quarter circle.
+    :rtype: int
+    """
+    if max_error <= 0 or radius <= 0:
+        return default
+
+    max_angle = 2 * np.arccos(max(1.0 - float(max_error) / radius, -1.0))
+    return max(int(ceil(pi / 2 / max_angle)), 1)
+
+
+def circle_polygon(center, radius, max_error):
+    """
+    Circle within ``max_error`` of the exact circle.
+    See ``arc_points()``.
+
+    :param center: Coordinates of the center [x, y]
+    :param radius: Radius of the circle.
+    :param max_error: Maximum distance between the segments
+        and the exact circle.
+    :return: The circle.
+    :rtype: Polygon
+    """
+    if radius <= 0:
+        return Polygon()
+
+    return Polygon(arc_points(center, radius, 0, 0, "ccw", 0, max_error)[:-1])
+
+
+def arc2(p1, p2, center, direction, steps_per_circ, max_error=0.0):
     r = sqrt((center[0] - p1[0]) ** 2 + (center[1] - p1[1]) ** 2)
     start = arctan2(p1[1] - center[1], p1[0] - center[0])
     stop = arctan2(p2[1] - center[1], p2[0] - center[0])
-    return arc(center, r, start, stop, direction, steps_per_circ)
+    return arc(center, r, start, stop, direction, steps_per_circ, max_error)
 
 
 def arc_angle(start, stop, direction):
@@ -3561,12 +5881,59 @@ def arc_angle(start, stop, direction):
 #     return None
 
 
+# File name extensions of each kind of file, see detect_file_kind().
+file_kind_extensions = {
+    "gerber": ['.gbr', '.ger', '.gtl', '.gbl', '.gts', '.gbs', '.gto', '.gbo',
+               '.gtp', '.gbp', '.gko', '.gml', '.gm1', '.gpt', '.gpb', '.cmp',
+               '.sol', '.stc', '.sts', '.plc', '.pls', '.art', '.pho'],
+    "excellon": ['.drl', '.drd', '.xln', '.exc', '.ncd'],
+    "cncjob": ['.nc', '.ngc', '.gcode', '.tap', '.cnc']
+}
+
+
+def detect_file_kind(filename, sample_size=65536):
+    """
+    Guesses whether a file is Gerber, Excellon or G-Code from the
+    first bytes of its content, falling back to the file name
+    extension when the content is inconclusive.
+
+    :param filename: Path to the file.
+    :type filename: str
+    :param sample_size: Number of bytes to look at.
+    :type sample_size: int
+    :return: "gerber", "excellon", "cncjob" or None.
+    :rtype: str
+    """
+    with open(filename, 'rb') as f:
+        sample = f.read(sample_size)
+
+    # Extended Gerber parameters
+    if re.search(r'%(?:FS[LT]?[AI]?X|MO(?:IN|MM)|ADD\d)', sample):
+        return "gerber"
+
+    # Excellon header or tool definitions
+    if re.search(r'^M48\s*$|^(?:INCH|METRIC),?|^T\d+(?:F\d+|S\d+)*C[\d.]', sample, re.MULTILINE):
+        return "excellon"
+
+    # Motion words with coordinates
+    if re.search(r'^\s*(?:N\d+\s*)?G0?[0123](?![\d.])\s*(?:[XYZ]\s*[+-]?[\d.])', sample, re.MULTILINE):
+        return "cncjob"
+
+    ext = os.path.splitext(filename)[1].lower()
+    for kind in file_kind_extensions:
+        if ext in file_kind_extensions[kind]:
+            return kind
+
+    return None
+
+
 def to_dict(obj):
     """
     Makes the following types into serializable form:
 
     * ApertureMacro
     * BaseGeometry
+    * DrillStore (as a list of dictionaries)
 
     :param obj: Shapely geometry.
     :type obj: BaseGeometry
@@ -3583,6 +5950,8 @@ def to_dict(obj):
             "__class__": "Shply",
             "__inst__": sdumps(obj)
         }
+    if isinstance(obj, DrillStore):
+        return obj.to_list()
     return obj
 
 
@@ -3908,6 +6277,645 @@ def distance(pt1, pt2):
     return sqrt((pt1[0] - pt2[0]) ** 2 + (pt1[1] - pt2[1]) ** 2)
 
 
+def drill_travel(points, start=None, end=None):
+    """
+    Length of the straight moves visiting the points in order.
+
+    :param points: (n, 2) array of points.
+    :param start: Optional point before the first one.
+    :param end: Optional point after the last one.
+    :return: Total length.
+    :rtype: float
+    """
+    pts = [np.asarray(points, dtype=float).reshape(-1, 2)]
+    if start is not None:
+        pts.insert(0, np.asarray(start, dtype=float).reshape(1, 2))
+    if end is not None:
+        pts.append(np.asarray(end, dtype=float).reshape(1, 2))
+    pts = np.concatenate(pts)
+    if len(pts) < 2:
+        return 0.0
+    steps = np.diff(pts, axis=0)
+    return float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+
+
+def nearest_neighbour_order(points, start=(0.0, 0.0), neighbors=16):
+    """
+    Order in which to visit the points, always moving to the
+    nearest point not visited yet.
+
+    :param points: (n, 2) array of points.
+    :param start: Where the tour starts.
+    :param neighbors: Closest points looked up at once for every
+        point. The tree is only searched when all of them were visited.
+    :return: Indexes into ``points``.
+    :rtype: numpy.ndarray
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(points)
+    if n < 2:
+        return np.arange(n)
+
+    order = np.empty(n, dtype=np.intp)
+    tree = cKDTree(points)
+    ids = np.arange(n)              # Points in the tree
+    near = tree.query(points, min(neighbors + 1, n))[1][:, 1:].tolist()
+    visited = np.zeros(n, dtype=bool)
+    current = None
+
+    for step in xrange(n):
+        nearest = None
+        if current is not None:
+            for c in near[current]:
+                if not visited[c]:
+                    nearest = c
+                    break
+
+        k = 1
+        position = points[current] if current is not None else np.asarray(start, dtype=float)
+        while nearest is None:
+            _, found = tree.query(position, min(k, len(ids)))
+            candidates = ids[np.atleast_1d(found)]
+            free = ~visited[candidates]
+            if free.any():
+                nearest = candidates[free.argmax()]
+            elif len(ids) > 2 * (n - step):
+                # Most of the tree was visited, use a tree of the rest.
+                ids = np.flatnonzero(~visited)
+                tree = cKDTree(points[ids])
+                k = 1
+            else:
+                k *= 2
+
+        visited[nearest] = True
+        order[step] = nearest
+        current = nearest
+
+    return order
+
+
+def improve_drill_order(points, order, start=(0.0, 0.0), time_budget=1.0, neighbors=8, end=None):
+    """
+    Shortens an open tour with 2-opt and Or-opt moves between
+    close points until no move helps or the time is up.
+
+    :param points: (n, 2) array of points.
+    :param order: Initial tour, indexes into ``points``.
+    :param start: Fixed point before the tour.
+    :param time_budget: Maximum time in seconds.
+    :param neighbors: Candidates per point for new edges.
+    :param end: Fixed point after the tour, or None to end anywhere.
+    :return: Improved tour.
+    :rtype: numpy.ndarray
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(points)
+    if n < 3:
+        return np.asarray(order, dtype=np.intp)
+
+    deadline = time.time() + time_budget
+    eps = 1e-9
+
+    # Closest points first, without the point itself.
+    k = min(neighbors + 1, n)
+    _, near = cKDTree(points).query(points, k)
+    near = near[:, 1:].tolist()
+
+    # The start is node n, always at position 0.
+    xs = points[:, 0].tolist() + [float(start[0])]
+    ys = points[:, 1].tolist() + [float(start[1])]
+    tour = [n] + list(order)
+    pos = [0] * (n + 1)
+    for i, node in enumerate(tour):
+        pos[node] = i
+    last = n
+
+    def d(a, b):
+        # None is after the last node.
+        if b is None:
+            return 0.0 if end is None else hypot(xs[a] - end[0], ys[a] - end[1])
+        return hypot(xs[a] - xs[b], ys[a] - ys[b])
+
+    def update_pos(lo, hi):
+        for i in xrange(lo, hi):
+            pos[tour[i]] = i
+
+    queue = collections.deque(tour[1:])
+    queued = [True] * n + [False]
+
+    def push(*nodes):
+        for node in nodes:
+            if node is not None and node != n and not queued[node]:
+                queued[node] = True
+                queue.append(node)
+
+    while queue and time.time() < deadline:
+        a = queue.popleft()
+        queued[a] = False
+        i = pos[a]
+        improved = False
+
+        # 2-opt, new edge from a to c after it: reverse b..c.
+        if i < last:
+            b = tour[i + 1]
+            d_ab = d(a, b)
+            for c in near[a]:
+                d_ac = d(a, c)
+                if d_ac >= d_ab:
+                    break
+                j = pos[c]
+                if j <= i + 1:
+                    continue
+                e = tour[j + 1] if j < last else None
+                if d_ab + d(c, e) - d_ac - d(b, e) > eps:
+                    tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+                    update_pos(i + 1, j + 1)
+                    push(a, b, c, e)
+                    improved = True
+                    break
+        if improved:
+            continue
+
+        # 2-opt, new edge from c before it to a: reverse c..b.
+        b = tour[i - 1]
+        d_ab = d(a, b)
+        for c in near[a]:
+            d_ac = d(a, c)
+            if d_ac >= d_ab:
+                break
+            j = pos[c]
+            if j >= i - 1:
+                continue
+            p = tour[j - 1]
+            if d(p, c) + d_ab - d(p, b) - d_ac > eps:
+                tour[j:i] = tour[j:i][::-1]
+                update_pos(j, i)
+                push(a, b, c, p)
+                improved = True
+                break
+        if improved:
+            continue
+
+        # Or-opt, move a and up to two points after it elsewhere.
+        for length in (1, 2, 3):
+            if i + length - 1 > last:
+                break
+            segment = tour[i:i + length]
+            head, tail = segment[0], segment[-1]
+            p = tour[i - 1]
+            nx = tour[i + length] if i + length <= last else None
+            removed = d(p, head) + d(tail, nx) - d(p, nx)
+            if removed <= eps:
+                continue
+
+            best = None
+            for c in near[head] + near[tail]:
+                if c in segment:
+                    continue
+                k = pos[c]
+                for u in (c, tour[k - 1]):
+                    if u == p or u in segment:
+                        continue
+                    v = tour[pos[u] + 1] if pos[u] < last else None
+                    if v in segment:
+                        continue
+                    for seg_first, seg_end, flip in ((head, tail, False), (tail, head, True)):
+                        gain = removed - (d(u, seg_first) + d(seg_end, v) - d(u, v))
+                        if gain > eps and (best is None or gain > best[0]):
+                            best = (gain, u, flip)
+
+            if best is not None:
+                _, u, flip = best
+                del tour[i:i + length]
+                at = pos[u] + 1 if pos[u] < i else pos[u] + 1 - length
+                tour[at:at] = segment[::-1] if flip else segment
+                update_pos(min(i, at), max(i + length, at + length))
+                push(p, nx, u, head, tail)
+                v = tour[at + length] if at + length <= last else None
+                push(v)
+                improved = True
+                break
+
+    return np.array(tour[1:], dtype=np.intp)
+
+
+def optimize_drill_order(points, start=(0.0, 0.0), method="2opt", time_budget=1.0, end=None):
+    """
+    Order in which to drill the holes to shorten the travel between them.
+
+    :param points: (n, 2) array of hole centers.
+    :param start: Where the tool is before the first hole.
+    :param method: None to keep the order, "nn" for a nearest neighbour
+        tour or "2opt" to also improve it with 2-opt and Or-opt moves.
+    :param time_budget: Maximum time in seconds for improving the tour.
+    :param end: Where the tool goes after the last hole, or None.
+        Only taken into account by "2opt".
+    :return: Indexes into ``points``.
+    :rtype: numpy.ndarray
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+    if method in (None, "none"):
+        return np.arange(len(points))
+
+    if method not in ("nn", "2opt"):
+        raise ValueError("Unknown drill order optimization: %s" % method)
+
+    order = nearest_neighbour_order(points, start)
+    if method == "2opt":
+        order = improve_drill_order(points, order, start, time_budget, end=end)
+    return order
+
+
+def is_closed_path(geo):
+    """
+    Whether the path ends where it starts, so it can be entered at any
+    vertex. Points are not.
+    """
+    return type(geo) != Point and geo.coords[0] == geo.coords[-1] and len(geo.coords) > 2
+
+
+def path_exit(geo, returns=False):
+    """
+    Where the tool is after cutting along ``geo`` from its first point.
+
+    :param returns: Whether open paths end where they start, as after
+        an even number of passes back and forth.
+    """
+    return geo.coords[0] if returns else geo.coords[-1]
+
+
+def path_travel(paths, start=(0.0, 0.0), end=None, returns=False):
+    """
+    Length of the straight moves between the paths, cut in order,
+    each from its first point.
+
+    :param paths: LineString, LinearRing and Point.
+    :param start: Where the tool is before the first path.
+    :param end: Optional point after the last path.
+    :param returns: See ``path_exit()``.
+    :return: Total length.
+    :rtype: float
+    """
+    total = 0.0
+    current = start
+    for geo in paths:
+        total += distance(current, geo.coords[0])
+        current = path_exit(geo, returns)
+    if end is not None:
+        total += distance(current, end)
+    return total
+
+
+def reverse_path(geo):
+    return type(geo)(list(geo.coords)[::-1])
+
+
+def rotate_path(geo, k):
+    """
+    The closed path ``geo`` starting at its vertex ``k``.
+    """
+    coords = list(geo.coords)[:-1]
+    return type(geo)(coords[k:] + coords[:k] + [coords[k]])
+
+
+def greedy_path_order(paths, start=(0.0, 0.0), returns=False, rings=False):
+    """
+    Order in which to cut the paths, always moving to the nearest
+    end of a path not cut yet. Open paths are reversed when entered
+    from their last point.
+
+    :param paths: LineString, LinearRing and Point.
+    :param start: Where the tool is before the first path.
+    :param returns: See ``path_exit()``.
+    :param rings: Whether closed paths can be entered at any vertex,
+        instead of only at their first point.
+    :return: The paths in cutting order.
+    :rtype: list
+    """
+    if rings:
+        return greedy_ring_order(paths, start, returns)
+
+    def get_pts(o):
+        return [o.coords[0], o.coords[-1]]
+
+    storage = FlatCAMKDTreeStorage()
+    storage.get_points = get_pts
+    for geo in paths:
+        storage.insert(geo)
+
+    ordered = []
+    current_pt = start
+    try:
+        pt, geo = storage.nearest(current_pt)
+        while True:
+            # Remove before modifying, otherwise
+            # deletion will fail.
+            storage.remove(geo)
+
+            # If last point in geometry is the nearest
+            # but prefer the first one if last point == first point
+            # then reverse coordinates.
+            if pt != geo.coords[0] and pt == geo.coords[-1]:
+                geo = reverse_path(geo)
+
+            ordered.append(geo)
+            current_pt = path_exit(geo, returns)
+            pt, geo = storage.nearest(current_pt)
+
+    except StopIteration:  # Nothing found in storage.
+        pass
+
+    return ordered
+
+
+def greedy_ring_order(paths, start=(0.0, 0.0), returns=False, neighbors=16):
+    """
+    As ``greedy_path_order()``, entering closed paths at their
+    vertex nearest to the tool.
+
+    The ends of open paths and the vertices of closed ones are looked
+    up in a k-d tree, which is built again without the points of cut
+    paths when those are most of the points in it.
+
+    :param neighbors: Points looked up at once. More are looked up
+        when all of them belong to cut paths.
+    :return: The paths in cutting order.
+    :rtype: list
+    """
+    n = len(paths)
+    points = []
+    owners = []
+    vertices = []
+    for i, geo in enumerate(paths):
+        coords = list(geo.coords)
+        if is_closed_path(geo):
+            k = range(len(coords) - 1)
+        else:
+            k = [0, len(coords) - 1]
+        points.extend(coords[j] for j in k)
+        owners.extend([i] * len(k))
+        vertices.extend(k)
+    if n == 0:
+        return []
+
+    points = np.array(points, dtype=float)
+    owners = np.array(owners)
+    cut = np.zeros(n, dtype=bool)
+
+    live = np.arange(len(points))       # Points in the tree
+    tree = cKDTree(points)
+
+    ordered = []
+    current = start
+    for _ in xrange(n):
+        k = neighbors
+        while True:
+            _, idx = tree.query(current, min(k, len(live)))
+            idx = live[np.atleast_1d(idx)]
+            free = idx[~cut[owners[idx]]]
+            if len(free) > 0:
+                break
+            if cut[owners[live]].mean() > 0.5:
+                live = live[~cut[owners[live]]]
+                tree = cKDTree(points[live])
+                k = neighbors
+            else:
+                k *= 4
+
+        nearest = free[0]
+        i, vertex = owners[nearest], vertices[nearest]
+        geo = paths[i]
+        cut[i] = True
+
+        if vertex > 0:
+            if is_closed_path(geo):
+                geo = rotate_path(geo, vertex)
+            elif geo.coords[0] != geo.coords[-1]:
+                geo = reverse_path(geo)
+
+        ordered.append(geo)
+        current = path_exit(geo, returns)
+
+    return ordered
+
+
+def improve_path_order(paths, start=(0.0, 0.0), time_budget=1.0, returns=False, neighbors=8, end=None):
+    """
+    Shortens the travel between the paths with 2-opt moves between
+    close path ends until no move helps or the time is up. Reversing
+    a run of paths reverses the open ones among them too. Closed
+    paths keep their direction.
+
+    When open paths end where they start, see ``path_exit()``, every
+    path is a point and the tour is improved as in
+    ``improve_drill_order()``.
+
+    :param paths: LineString, LinearRing and Point, in cutting order.
+    :param start: Where the tool is before the first path.
+    :param time_budget: Maximum time in seconds.
+    :param returns: See ``path_exit()``.
+    :param neighbors: Candidates per path end for new moves.
+    :param end: Where the tool goes after the last path, or None.
+    :return: The paths in the new cutting order.
+    :rtype: list
+    """
+    n = len(paths)
+    if n < 2:
+        return list(paths)
+
+    if returns:
+        entries = np.array([geo.coords[0] for geo in paths], dtype=float)
+        order = improve_drill_order(entries, np.arange(n), start, time_budget, neighbors, end)
+        return [paths[i] for i in order]
+
+    deadline = time.time() + time_budget
+    eps = 1e-9
+
+    # Ends of path p are nodes 2p (first point) and 2p + 1 (last point).
+    # The start is path n.
+    ends = np.array([[geo.coords[0], geo.coords[-1]] for geo in paths], dtype=float).reshape(-1, 2)
+    closed = [is_closed_path(geo) or type(geo) == Point for geo in paths] + [True]
+    xs = ends[:, 0].tolist() + [float(start[0])] * 2
+    ys = ends[:, 1].tolist() + [float(start[1])] * 2
+
+    # Closest ends first, without the end itself.
+    k = min(neighbors + 1, 2 * n)
+    _, near = cKDTree(ends).query(ends, k)
+    near = near[:, 1:].tolist()
+
+    tour = [n] + range(n)
+    pos = [0] * (n + 1)
+    for i, p in enumerate(tour):
+        pos[p] = i
+    flip = [0] * (n + 1)
+    last = n
+
+    def entry(p):
+        return 2 * p + flip[p]
+
+    def exit_(p):
+        return 2 * p + 1 - flip[p]
+
+    def d(a, b):
+        # None is after the last node.
+        if b is None:
+            return 0.0 if end is None else hypot(xs[a] - end[0], ys[a] - end[1])
+        return hypot(xs[a] - xs[b], ys[a] - ys[b])
+
+    def reverse(lo, hi):
+        tour[lo:hi] = tour[lo:hi][::-1]
+        for i in xrange(lo, hi):
+            pos[tour[i]] = i
+            flip[tour[i]] ^= 1
+
+    queue = collections.deque(range(n))
+    queued = [True] * n + [False]
+
+    def push(*ps):
+        for p in ps:
+            if p is not None and p != n and not queued[p]:
+                queued[p] = True
+                queue.append(p)
+
+    while queue and time.time() < deadline:
+        a = queue.popleft()
+        queued[a] = False
+        i = pos[a]
+        improved = False
+
+        # New move from the exit of a to the exit of c after it:
+        # reverse b..c.
+        if i < last:
+            b = tour[i + 1]
+            xa = exit_(a)
+            d_ab = d(xa, entry(b))
+            for node in near[xa]:
+                if d(xa, node) >= d_ab:
+                    break
+                c = node // 2
+                j = pos[c]
+                if c == a or j < i + 1 or (node != exit_(c) and not closed[c]):
+                    continue
+                e = tour[j + 1] if j < last else None
+                ee = entry(e) if e is not None else None
+                if d_ab + d(exit_(c), ee) - d(xa, exit_(c)) - d(entry(b), ee) > eps:
+                    reverse(i + 1, j + 1)
+                    push(a, b, c, e)
+                    improved = True
+                    break
+        if improved:
+            continue
+
+        # New move from the entry of c before it to the entry of a:
+        # reverse c..b.
+        b = tour[i - 1]
+        ea = entry(a)
+        d_ba = d(exit_(b), ea)
+        for node in near[ea]:
+            if d(node, ea) >= d_ba:
+                break
+            c = node // 2
+            j = pos[c]
+            if c == a or j < 1 or j > i - 1 or (node != entry(c) and not closed[c]):
+                continue
+            r = tour[j - 1]
+            if d(exit_(r), entry(c)) + d_ba - d(exit_(r), exit_(b)) - d(entry(c), ea) > eps:
+                reverse(j, i)
+                push(a, b, c, r)
+                break
+
+    return [reverse_path(paths[p]) if flip[p] and not closed[p] else paths[p] for p in tour[1:]]
+
+
+def refine_path_entries(paths, start=(0.0, 0.0), time_budget=1.0, returns=False, rings=False, end=None):
+    """
+    Reverses open paths and, if ``rings``, enters closed paths at
+    another vertex where that shortens the moves to and from the
+    neighbouring paths. Repeats until nothing changes or the time
+    is up.
+
+    :param paths: LineString, LinearRing and Point, in cutting order.
+    :param start: Where the tool is before the first path.
+    :param time_budget: Maximum time in seconds.
+    :param returns: See ``path_exit()``.
+    :param rings: Whether to move the entry of closed paths.
+    :param end: Where the tool goes after the last path, or None.
+    :return: The paths, in the same order.
+    :rtype: list
+    """
+    deadline = time.time() + time_budget
+    eps = 1e-9
+    paths = list(paths)
+
+    changed = True
+    while changed and time.time() < deadline:
+        changed = False
+        current = start
+        for t, geo in enumerate(paths):
+            following = paths[t + 1].coords[0] if t + 1 < len(paths) else end
+
+            if type(geo) == Point:
+                pass
+
+            elif is_closed_path(geo):
+                if rings:
+                    coords = np.asarray(geo.coords)[:-1]
+                    cost = np.hypot(coords[:, 0] - current[0], coords[:, 1] - current[1])
+                    if following is not None:
+                        cost += np.hypot(coords[:, 0] - following[0], coords[:, 1] - following[1])
+                    k = int(cost.argmin())
+                    if cost[k] < cost[0] - eps:
+                        geo = paths[t] = rotate_path(geo, k)
+                        changed = True
+
+            else:
+                reversed_geo = reverse_path(geo)
+                cost = [distance(current, g.coords[0]) +
+                        (distance(path_exit(g, returns), following) if following is not None else 0.0)
+                        for g in (geo, reversed_geo)]
+                if cost[1] < cost[0] - eps:
+                    geo = paths[t] = reversed_geo
+                    changed = True
+
+            current = path_exit(geo, returns)
+
+    return paths
+
+
+def order_paths(paths, start=(0.0, 0.0), method="greedy", time_budget=1.0, returns=False, end=None):
+    """
+    Order in which to cut the paths to shorten the travel between them.
+
+    :param paths: Iterable of LineString, LinearRing and Point.
+    :param start: Where the tool is before the first path.
+    :param method: None or "greedy" to always move to the nearest path
+        end, "2opt" to also improve that with 2-opt moves or "rings" to
+        move to the nearest path end or vertex of a closed path.
+    :param time_budget: Maximum time in seconds for improving the order.
+        The greedy order is always completed.
+    :param returns: See ``path_exit()``.
+    :param end: Where the tool goes after the last path, or None. Only
+        taken into account when improving the order.
+    :return: The paths in cutting order, open paths maybe reversed and,
+        for "rings", closed paths maybe starting at another vertex.
+    :rtype: list
+    """
+    if method not in (None, "greedy", "2opt", "rings"):
+        raise ValueError("Unknown path order optimization: %s" % method)
+
+    ordered = greedy_path_order(list(paths), start, returns, rings=(method == "rings"))
+    deadline = time.time() + time_budget
+
+    if method == "2opt":
+        ordered = improve_path_order(ordered, start, deadline - time.time(), returns, end=end)
+    if method in ("2opt", "rings"):
+        ordered = refine_path_entries(ordered, start, deadline - time.time(), returns,
+                                      rings=(method == "rings"), end=end)
+
+    return ordered
+
+
 class FlatCAMRTree(object):
 
     def __init__(self):
@@ -4018,6 +7026,141 @@ class FlatCAMRTreeStorage(FlatCAMRTree):
         return (tidx.bbox[0], tidx.bbox[1]), self.objects[tidx.object]
 
 
+class FlatCAMKDTreeStorage(object):
+    """
+    Object storage with the interface of ``FlatCAMRTreeStorage``,
+    made for repeatedly taking the object with the point nearest to
+    the tool and removing it.
+
+    Points are kept in arrays and looked up in a k-d tree built over
+    all of them at once. Removing an object only marks its points as
+    removed, and the tree is built again without them when a query
+    finds mostly removed points and those are most of the tree.
+    Points inserted after the tree was built are searched one by one
+    until there are as many of them as in the tree.
+    """
+
+    # Points looked up at once. More are looked up when
+    # all of them were removed.
+    neighbors = 8
+
+    def __init__(self):
+        self.objects = []
+
+        # See note about indexing by id in FlatCAMRTreeStorage.insert().
+        self.indexes = {}
+
+        self.get_points = lambda go: go.coords
+
+        # First and last + 1 point of every object.
+        self.ranges = []
+
+        # Points, owner object and whether it is still stored.
+        self.xy = np.empty((64, 2))
+        self.owners = np.empty(64, dtype=np.int64)
+        self.live = np.zeros(64, dtype=bool)
+        self.size = 0
+        self.live_size = 0
+
+        # Tree over the points before self.built that were
+        # live when it was built, with their indexes.
+        self.tree = None
+        self.tree_ids = None
+        self.built = 0
+
+    def insert(self, obj):
+        self.objects.append(obj)
+        idx = len(self.objects) - 1
+        self.indexes[id(obj)] = idx
+
+        points = [(pt[0], pt[1]) for pt in self.get_points(obj)]
+        start, end = self.size, self.size + len(points)
+        if end > len(self.xy):
+            capacity = max(2 * len(self.xy), end)
+            self.xy = np.resize(self.xy, (capacity, 2))
+            self.owners = np.resize(self.owners, capacity)
+            self.live = np.concatenate([self.live[:self.size], np.zeros(capacity - self.size, dtype=bool)])
+        if points:
+            self.xy[start:end] = points
+        self.owners[start:end] = idx
+        self.live[start:end] = True
+        self.ranges.append((start, end))
+        self.size = end
+        self.live_size += len(points)
+
+    def remove(self, obj):
+        objidx = self.indexes[id(obj)]
+        self.objects[objidx] = None
+
+        start, end = self.ranges[objidx]
+        self.live_size -= int(self.live[start:end].sum())
+        self.live[start:end] = False
+
+    def get_objects(self):
+        return (o for o in self.objects if o is not None)
+
+    def build(self):
+        """
+        Builds the tree over the live points.
+        """
+        self.tree_ids = np.flatnonzero(self.live[:self.size])
+        self.tree = cKDTree(self.xy[self.tree_ids]) if len(self.tree_ids) > 0 else None
+        self.built = self.size
+
+    def nearest(self, pt):
+        """
+        Returns the nearest matching points and the object
+        it belongs to. Will raise StopIteration if no items
+        are found.
+
+        :param pt: Query point.
+        :return: (match_x, match_y), Object owner of
+          matching point.
+        :rtype: tuple
+        """
+        if self.live_size == 0:
+            raise StopIteration
+
+        if self.tree_ids is None or self.size - self.built > max(len(self.tree_ids), 64):
+            self.build()
+
+        best, best_dist = None, Inf
+
+        k = self.neighbors
+        while self.tree is not None:
+            n = len(self.tree_ids)
+            dist, idx = self.tree.query(pt, min(k, n))
+            dist, ids = np.atleast_1d(dist), self.tree_ids[np.atleast_1d(idx)]
+            live = self.live[ids]
+            if live.any():
+                best_dist = dist[live.argmax()]
+                # Equally near points may not all have been found.
+                if dist[-1] == best_dist and k < n:
+                    k *= 4
+                    continue
+                best = ids[live & (dist == best_dist)].min()
+                break
+            if k >= n:
+                break
+            if not self.live[self.tree_ids].mean() > 0.5:
+                self.build()
+                k = self.neighbors
+            else:
+                k *= 4
+
+        # Inserted since the tree was built.
+        if self.built < self.size:
+            ids = self.built + np.flatnonzero(self.live[self.built:self.size])
+            if len(ids) > 0:
+                dist = np.hypot(self.xy[ids, 0] - pt[0], self.xy[ids, 1] - pt[1])
+                first = dist.argmin()
+                if dist[first] < best_dist or best is None:
+                    best = ids[first]
+
+        x, y = self.xy[best].tolist()
+        return (x, y), self.objects[self.owners[best]]
+
+
 # class myO:
 #     def __init__(self, coords):
 #         self.coords = coords
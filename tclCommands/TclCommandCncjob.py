@@ -31,7 +31,10 @@ class TclCommandCncjob(TclCommand.TclCommandSignaled):
         ('spindlespeed',int),
         ('multidepth',bool),
         ('depthperpass',float),
-        ('outname',str)
+        ('order',str),
+        ('ordertime',float),
+        ('outname',str),
+        ('output',str)
     ])
 
     # array of mandatory options for current Tcl command: required = {'name','outname'}
@@ -49,7 +52,11 @@ class TclCommandCncjob(TclCommand.TclCommandSignaled):
             ('spindlespeed', 'Speed of the spindle in rpm (example: 4000).'),
             ('multidepth', 'Use or not multidepth cnccut.'),
             ('depthperpass', 'Height of one layer for multidepth.'),
-            ('outname', 'Name of the resulting Geometry object.')
+            ('order', 'Order of the paths: greedy (nearest path end), 2opt (greedy improved with 2-opt) '
+                      'or rings (greedy, entering closed paths at any vertex).'),
+            ('ordertime', 'Maximum time in seconds for improving the order (example: 5.0).'),
+            ('outname', 'Name of the resulting Geometry object.'),
+            ('output', 'File to write the G-code to, instead of creating an object.')
         ]),
         'examples': []
     }
@@ -61,7 +68,7 @@ class TclCommandCncjob(TclCommand.TclCommandSignaled):
         :param args: array of known named arguments and options
         :param unnamed_args: array of other values which were passed into command
             without -somename and  we do not have them in known arg_names
-        :return: None or exception
+        :return: Travel, tool lifts and ordering time or exception
         """
 
         name = args['name']
@@ -76,5 +83,14 @@ class TclCommandCncjob(TclCommand.TclCommandSignaled):
         if not isinstance(obj, FlatCAMGeometry):
             self.raise_tcl_error('Expected FlatCAMGeometry, got %s %s.' % (name, type(obj)))
 
+        if args.get("order") not in (None, "greedy", "2opt", "rings"):
+            self.raise_tcl_error('Unknown order: %s, expected greedy, 2opt or rings.' % args["order"])
+
         del args['name']
-        obj.generatecncjob(use_thread = False, **args)
\ No newline at end of file
+        job_obj = obj.generatecncjob(use_thread = False, **args)
+
+        if job_obj is None:
+            job_obj = self.app.collection.get_by_name(args['outname'])
+        if job_obj is not None and job_obj.order_stats is not None:
+            return "Travel between paths: %(travel).4f, %(lifts)d tool lifts, ordered in %(time).2f s." % \
+                job_obj.order_stats
\ No newline at end of file
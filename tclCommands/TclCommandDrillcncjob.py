@@ -23,7 +23,10 @@ class TclCommandDrillcncjob(TclCommand.TclCommandSignaled):
         ('feedrate',float),
         ('spindlespeed',int),
         ('toolchange',bool),
-        ('outname',str)
+        ('order',str),
+        ('ordertime',float),
+        ('outname',str),
+        ('output',str)
     ])
 
     # array of mandatory options for current Tcl command: required = {'name','outname'}
@@ -40,7 +43,11 @@ class TclCommandDrillcncjob(TclCommand.TclCommandSignaled):
             ('feedrate', 'Drilling feed rate.'),
             ('spindlespeed', 'Speed of the spindle in rpm (example: 4000).'),
             ('toolchange', 'Enable tool changes (example: True).'),
-            ('outname', 'Name of the resulting Geometry object.')
+            ('order', 'Order of the holes: none (as in the file), nn (nearest neighbour) '
+                      'or 2opt (nearest neighbour improved with 2-opt and Or-opt).'),
+            ('ordertime', 'Maximum time in seconds for improving the order (example: 5.0).'),
+            ('outname', 'Name of the resulting Geometry object.'),
+            ('output', 'File to write the G-code to, instead of creating an object.')
         ]),
         'examples': []
     }
@@ -52,7 +59,7 @@ class TclCommandDrillcncjob(TclCommand.TclCommandSignaled):
         :param args: array of known named arguments and options
         :param unnamed_args: array of other values which were passed into command
             without -somename and  we do not have them in known arg_names
-        :return: None or exception
+        :return: Travel between holes or exception
         """
 
         name = args['name']
@@ -67,15 +74,35 @@ class TclCommandDrillcncjob(TclCommand.TclCommandSignaled):
         if not isinstance(obj, FlatCAMExcellon):
             self.raise_tcl_error('Expected FlatCAMExcellon, got %s %s.' % (name, type(obj)))
 
-        def job_init(job_obj, app):
+        order = args["order"] if "order" in args else None
+        if order not in (None, "none", "nn", "2opt"):
+            self.raise_tcl_error('Unknown order: %s, expected none, nn or 2opt.' % order)
+
+        travel = []
+
+        def generate(job_obj, output=None):
             job_obj.z_cut = args["drillz"]
             job_obj.z_move = args["travelz"]
             job_obj.feedrate = args["feedrate"]
             job_obj.spindlespeed = args["spindlespeed"] if "spindlespeed" in args else None
             toolchange = True if "toolchange" in args and args["toolchange"] == 1 else False
             tools = args["tools"] if "tools" in args else 'all'
-            job_obj.generate_from_excellon_by_tool(obj, tools, toolchange)
+            job_obj.generate_from_excellon_by_tool(obj, tools, toolchange, order=order,
+                                                   order_time=args.get("ordertime", 1.0),
+                                                   output=output)
+            travel.extend(job_obj.drill_travel)
+
+        def job_init(job_obj, app):
+            generate(job_obj)
             job_obj.gcode_parse()
             job_obj.create_geometry()
 
-        self.app.new_object("cncjob", args['outname'], job_init)
+        if 'output' in args:
+            # The G-code goes to the file as it is generated, no object is created.
+            with open(args['output'], 'w') as f:
+                generate(CNCjob(units=obj.units), f)
+        else:
+            self.app.new_object("cncjob", args['outname'], job_init)
+
+        if travel:
+            return "Travel between holes: %.4f in file order, %.4f drilled." % tuple(travel)
@@ -54,7 +54,9 @@ class TclCommandOpenGerber(TclCommand.TclCommandSignaled):
             # Opening the file happens here
             self.app.progress.emit(30)
             try:
-                gerber_obj.parse_file(filename, follow=follow)
+                self.app.parse_with_cache("gerber", gerber_obj, filename,
+                                          lambda: gerber_obj.parse_file(filename, follow=follow),
+                                          follow=follow)
 
             except IOError:
                 app_obj.inform.emit("[error] Failed to open file: %s " % filename)
@@ -0,0 +1,48 @@
+from ObjectCollection import *
+import TclCommand
+
+
+class TclCommandOpenSet(TclCommand.TclCommandSignaled):
+    """
+    Tcl shell command to open all Gerber, Excellon and G-Code files of a fabrication set
+    """
+
+    # array of all command aliases, to be able use  old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['open_set']
+
+    # dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+        ('path', str)
+    ])
+
+    # dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict()
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = ['path']
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Opens all Gerber, Excellon and G-Code files in a directory or matching a glob pattern. "
+                "The kind of each file is detected automatically and files are parsed in parallel.",
+        'args':  collections.OrderedDict([
+            ('path', 'Directory or glob pattern, like board/*.g*.')
+        ]),
+        'examples': ['open_set tests/gerber_files', 'open_set "board/*.gbr"']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+        execute current TCL shell command
+
+        :param args: array of known named arguments and options
+        :param unnamed_args: array of other values which were passed into command
+            without -somename and  we do not have them in known arg_names
+        :return: Names of the new objects
+        """
+
+        names = self.app.open_set(args['path'])
+        if len(names) == 0:
+            self.raise_tcl_error('No files opened from: %s' % args['path'])
+
+        return " ".join(names)
@@ -0,0 +1,57 @@
+from ObjectCollection import *
+import TclCommand
+
+
+class TclCommandParseCache(TclCommand.TclCommand):
+    """
+    Tcl shell command to inspect or clear the persistent parse cache
+    """
+
+    # array of all command aliases, to be able use  old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['parse_cache']
+
+    # dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+        ('action', str)
+    ])
+
+    # dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict()
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = []
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Shows the contents of the cache of parsed Gerber, Excellon and G-Code files, or clears it.",
+        'args':  collections.OrderedDict([
+            ('action', 'Either "info" (default) or "clear".')
+        ]),
+        'examples': ['parse_cache', 'parse_cache clear']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+        execute current TCL shell command
+
+        :param args: array of known named arguments and options
+        :param unnamed_args: array of other values which were passed into command
+            without -somename and  we do not have them in known arg_names
+        :return: None or exception
+        """
+
+        action = args.get('action', 'info')
+        cache = self.app.parse_cache
+
+        if action == 'clear':
+            return "Removed %d entries." % cache.clear()
+
+        if action != 'info':
+            self.raise_tcl_error('Unknown action: %s' % action)
+
+        stats = cache.stats()
+        lines = ["Path: %s" % stats['path'],
+                 "Entries: %d" % stats['entries'],
+                 "Size: %.1f MB of %.1f MB" % (stats['size'] / 1048576.0, stats['max_size'] / 1048576.0),
+                 "Hits: %d, misses: %d (this session)" % (stats['hits'], stats['misses'])]
+        return "\n".join(lines)
@@ -0,0 +1,79 @@
+from ObjectCollection import *
+import TclCommand
+
+
+class TclCommandParseProfile(TclCommand.TclCommandSignaled):
+    """
+    Tcl shell command to profile the parsing of a Gerber or Excellon file
+    """
+
+    # array of all command aliases, to be able use  old names for backward compatibility (add_poly, add_polygon)
+    aliases = ['parse_profile']
+
+    # dictionary of types from Tcl command, needs to be ordered
+    arg_names = collections.OrderedDict([
+        ('filename', str)
+    ])
+
+    # dictionary of types from Tcl command, needs to be ordered , this  is  for options  like -optionname value
+    option_types = collections.OrderedDict([
+        ('kind', str),
+        ('outfile', str)
+    ])
+
+    # array of mandatory options for current Tcl command: required = {'name','outname'}
+    required = ['filename']
+
+    # structured help for current command, args needs to be ordered
+    help = {
+        'main': "Parses a Gerber or Excellon file without opening it and reports lines per statement class, "
+                "time spent matching, creating geometry and joining it, and polygon counts.",
+        'args':  collections.OrderedDict([
+            ('filename', 'Path to file to parse.'),
+            ('kind', 'gerber or excellon. Detected from the file if not given.'),
+            ('outfile', 'Path to write the report to as JSON.')
+        ]),
+        'examples': ['parse_profile board.gtl -outfile board_profile.json']
+    }
+
+    def execute(self, args, unnamed_args):
+        """
+        execute current TCL shell command
+
+        :param args: array of known named arguments and options
+        :param unnamed_args: array of other values which were passed into command
+            without -somename and  we do not have them in known arg_names
+        :return: Report text
+        """
+
+        filename = args['filename']
+
+        if 'kind' in args:
+            kind = args['kind']
+        else:
+            try:
+                kind = detect_file_kind(filename)
+            except IOError:
+                self.raise_tcl_error('Failed to open file: %s' % filename)
+
+        if kind == 'gerber':
+            obj = Gerber()
+        elif kind == 'excellon':
+            obj = Excellon()
+        else:
+            self.raise_tcl_error('Expected a Gerber or Excellon file, got %s.' % kind)
+
+        obj.profile = ParseProfile(kind, filename)
+
+        try:
+            obj.parse_file(filename)
+            if kind == 'excellon':
+                obj.create_geometry()
+        except IOError:
+            self.raise_tcl_error('Failed to open file: %s' % filename)
+
+        if 'outfile' in args:
+            with open(args['outfile'], 'w') as f:
+                f.write(obj.profile.to_json())
+
+        return obj.profile.summary()
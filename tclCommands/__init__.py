@@ -13,6 +13,9 @@ import tclCommands.TclCommandInteriors
 import tclCommands.TclCommandIsolate
 import tclCommands.TclCommandNew
 import tclCommands.TclCommandOpenGerber
+import tclCommands.TclCommandOpenSet
+import tclCommands.TclCommandParseCache
+import tclCommands.TclCommandParseProfile
 
 
 __all__ = []
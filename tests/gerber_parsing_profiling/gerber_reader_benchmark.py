@@ -0,0 +1,46 @@
+# Compares the time it takes to split a large Gerber file into
+# statements with Gerber.line_statements() (line by line) and
+# Gerber.mapped_statements() (memory-mapped, single scan).
+# Run python gerber_reader_benchmark.py [copies]
+
+import sys
+import os
+import time
+import tempfile
+sys.path.append('../../')
+
+from camlib import *
+
+log = logging.getLogger('base2')
+log.setLevel(logging.WARNING)
+
+copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+with open("gerber1.gbr", 'rb') as f:
+    content = f.read()
+
+
+def run(name, text, copies):
+    fd, path = tempfile.mkstemp(suffix='.gbr')
+    with os.fdopen(fd, 'wb') as f:
+        for i in range(copies):
+            f.write(text)
+
+    print "%s: %.1f MB" % (name, os.path.getsize(path) / 1e6)
+
+    try:
+        for reader, mode in [(Gerber.line_statements, 'r'), (Gerber.mapped_statements, 'rb')]:
+            with open(path, mode) as f:
+                t = time.time()
+                n = 0
+                for statement in reader(f):
+                    n += 1
+                print "    %-18s %8d statements %8.3f s" % (reader.__name__, n, time.time() - t)
+    finally:
+        os.remove(path)
+
+run("One statement per line", content, copies)
+
+# Some exporters write the whole file in a single line. Splitting
+# it line by line is quadratic, so fewer copies here.
+run("Single line", content.replace('\r', '').replace('\n', ''), max(1, copies / 10))
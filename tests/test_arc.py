@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+from math import pi, cos, sin, ceil
+import camlib
+
+
+def legacy_arc(center, radius, start, stop, direction, steps_per_circ):
+    da_sign = {"cw": -1.0, "ccw": 1.0}
+    points = []
+    if direction == "ccw" and stop <= start:
+        stop += 2 * pi
+    if direction == "cw" and stop >= start:
+        stop -= 2 * pi
+    angle = abs(stop - start)
+    steps = max([int(ceil(angle / (2 * pi) * steps_per_circ)), 2])
+    delta_angle = da_sign[direction] * angle * 1.0 / steps
+    for i in range(steps + 1):
+        theta = start + delta_angle * i
+        points.append((center[0] + radius * cos(theta), center[1] + radius * sin(theta)))
+    return points
+
+
+class ArcTest(unittest.TestCase):
+
+    def max_error(self, points, center, radius):
+        # Distance from the middle of each segment to the circle.
+        mid = (points[1:] + points[:-1]) / 2
+        return np.max(radius - np.hypot(mid[:, 0] - center[0], mid[:, 1] - center[1]))
+
+    def test_steps_per_circ(self):
+        for args in [([0, 0], 1.0, 0.0, pi / 2, "ccw", 40),
+                     ([1.5, -2], 0.3, 1.0, -2.0, "cw", 40),
+                     ([0, 0], 2.0, 0.5, 0.5, "ccw", 20),
+                     ([3, 4], 5.0, 0.1, 0.2, "ccw", 40)]:
+            expected = legacy_arc(*args)
+            points = camlib.arc(*args)
+            self.assertEqual(len(points), len(expected))
+            np.testing.assert_allclose(points, expected, rtol=0, atol=1e-12)
+
+    def test_max_error(self):
+        for radius in [0.001, 0.01, 0.1, 1.0, 10.0, 100.0]:
+            points = camlib.arc_points([0, 0], radius, 0, pi, "ccw", 40, max_error=0.0001)
+            self.assertLessEqual(self.max_error(points, [0, 0], radius), 0.0001 * (1 + 1e-9))
+            self.assertAlmostEqual(points[-1][0], -radius)
+
+        # Tiny arcs get fewer segments, large ones more.
+        small = camlib.arc_points([0, 0], 0.001, 0, 0, "ccw", 40, max_error=0.0001)
+        large = camlib.arc_points([0, 0], 100.0, 0, 0, "ccw", 40, max_error=0.0001)
+        self.assertLess(len(small), 41)
+        self.assertGreater(len(large), 41)
+
+        # At least one segment per quarter circle.
+        self.assertEqual(len(camlib.arc_points([0, 0], 0.001, 0, 0, "ccw", 40, max_error=1.0)), 5)
+
+    def test_quadrant_segments(self):
+        self.assertEqual(camlib.quadrant_segments(1.0, 0.0), 16)
+        for radius in [0.01, 1.0, 50.0]:
+            n = camlib.quadrant_segments(radius, 0.0001)
+            self.assertLessEqual(radius * (1 - cos(pi / 4 / n)), 0.0001)
+
+    def test_circle_polygon(self):
+        circle = camlib.circle_polygon((1, 1), 2.0, 0.001)
+        self.assertTrue(circle.is_valid)
+        self.assertAlmostEqual(circle.area, pi * 4, delta=2 * pi * 2 * 0.001)
+
+    def test_gerber_tolerance(self):
+        filename = "tests/gerber_files/STM32F4-spindle.cmp"
+        gerber = camlib.Gerber()
+        gerber.parse_file(filename)
+
+        coarse = camlib.Gerber()
+        coarse.arc_tolerance = 0.0005
+        coarse.parse_file(filename)
+
+        self.assertAlmostEqual(coarse.solid_geometry.area, gerber.solid_geometry.area, places=2)
+        self.assertLess(sum(len(p.exterior.coords) for p in coarse.solid_geometry),
+                        sum(len(p.exterior.coords) for p in gerber.solid_geometry))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+
+import numpy as np
+from shapely.geometry import LineString, MultiLineString, Point
+
+import camlib
+
+
+def end_points(start, moves):
+    points = [tuple(start)] + [(x, y) for _, x, y, _, _ in moves]
+    return np.array(points)
+
+
+class FitArcsTest(unittest.TestCase):
+
+    def test_circle(self):
+        coords = camlib.arc_points((1, 2), 0.5, 0, np.pi * 1.5, "ccw", 128)
+        moves = camlib.fit_arcs(coords, 0.0005)
+        self.assertEqual([m[0] for m in moves], [3, 3])
+        self.assertTrue(np.allclose(end_points(coords[0], moves)[-1], coords[-1]))
+        # Centers, from where each arc starts.
+        for (g, x, y, i, j), start in zip(moves, end_points(coords[0], moves)):
+            self.assertTrue(np.allclose(start + (i, j), (1, 2)))
+
+    def test_clockwise(self):
+        coords = camlib.arc_points((0, 0), 1, np.pi / 2, 0, "cw", 40)
+        self.assertEqual([m[0] for m in camlib.fit_arcs(coords, 0.005)], [2])
+
+        # Segments of 9 degrees are 0.003 away from the arc in the middle.
+        self.assertEqual(len(camlib.fit_arcs(coords, 0.0005)), 10)
+
+    def test_straight(self):
+        coords = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1)]
+        moves = camlib.fit_arcs(coords, 0.0005)
+        self.assertEqual(moves, [(1, x, y, 0.0, 0.0) for x, y in coords[1:]])
+
+    def test_tolerance(self):
+        # A trace: straight sides and round ends.
+        ring = LineString([(0, 0), (1, 0)]).buffer(0.05).exterior
+        coords = np.asarray(ring.coords)
+        for tolerance in [0.0001, 0.0005, 0.002]:
+            moves = camlib.fit_arcs(coords, tolerance)
+            self.assertEqual(len([m for m in moves if m[0] == 2 or m[0] == 3]), 2)
+            self.assertTrue(np.allclose(end_points(coords[0], moves), coords[[0, 32, 33, 65, 66]]))
+
+        # No arc fits the 32 segments of each end.
+        self.assertEqual(len(camlib.fit_arcs(coords, 1e-9)), len(coords) - 1)
+
+    def test_reverse(self):
+        coords = np.asarray(LineString([(0, 0), (1, 0)]).buffer(0.05).exterior.coords)[:30]
+        moves = camlib.fit_arcs(coords, 0.0005)
+        back = camlib.reverse_moves(coords[0], moves)
+        self.assertTrue(np.allclose(end_points(coords[-1], back), end_points(coords[0], moves)[::-1]))
+        self.assertEqual([m[0] for m in back], [{1: 1, 2: 3, 3: 2}[m[0]] for m in moves[::-1]])
+        self.assertTrue(np.allclose(camlib.reverse_moves(coords[-1], back), moves))
+
+
+class ArcGCodeTest(unittest.TestCase):
+
+    tolerance = 0.0005
+
+    def setUp(self):
+        self.paths = [Point(1, 1).buffer(0.2).exterior,
+                      LineString([(0, 0), (1, 0), (1, 0.5)]).buffer(0.02).exterior,
+                      LineString(camlib.arc_points((0.5, 1.5), 0.3, 0, np.pi, "ccw", 100))]
+        self.geometry = camlib.Geometry()
+        self.geometry.solid_geometry = self.paths
+
+    def job(self, **kwargs):
+        job = camlib.CNCjob(z_cut=-0.05)
+        job.arc_fitting = self.tolerance
+        for attr, value in kwargs.items():
+            setattr(job, attr, value)
+        return job
+
+    def assertRoundTrip(self, job):
+        """
+        The parsed cuts are along the paths, within the tolerance
+        and the resolution of the G-code.
+        """
+        job.arc_tolerance = 1e-5
+        toolpath = job.gcode_parse()
+        cuts = [toolpath.coords(k) for k in range(len(toolpath)) if toolpath.kinds[k][0] == 'C']
+        paths = MultiLineString(self.paths)
+        for point in np.concatenate(cuts):
+            self.assertLess(paths.distance(Point(point)), self.tolerance + 1e-4)
+        cuts = MultiLineString(cuts)
+        for path in self.paths:
+            for point in path.coords:
+                self.assertLess(cuts.distance(Point(point)), self.tolerance + 1e-4)
+
+    def test_gcode(self):
+        job = self.job()
+        job.generate_from_geometry_2(self.geometry)
+        self.assertIn("G02 ", job.gcode)
+        self.assertIn("G03 ", job.gcode)
+        self.assertRoundTrip(job)
+
+        # Much shorter than cutting the segments.
+        plain = self.job(arc_fitting=0.0)
+        plain.generate_from_geometry_2(self.geometry)
+        self.assertNotIn("G02", plain.gcode)
+        self.assertLess(len(job.gcode) * 3, len(plain.gcode))
+
+    def test_modal(self):
+        job = self.job(modal_gcode=True)
+        job.generate_from_geometry_2(self.geometry)
+        self.assertRoundTrip(job)
+
+    def test_multidepth(self):
+        # The open path is cut back and forth.
+        for modal in [False, True]:
+            job = self.job(modal_gcode=modal)
+            job.generate_from_geometry_2(self.geometry, multidepth=True, depthpercut=0.02)
+            self.assertEqual(job.gcode.count("Z-0.0500"), 3)
+            self.assertRoundTrip(job)
+
+    def test_writer(self):
+        writer = camlib.GCodeWriter(coordinate_format="X%.3f Y%.3f")
+        writer.arc_moves([(1, 1, 0, 0, 0), (3, 0, 1, -1, 0)])
+        self.assertEqual(writer.getvalue(), "G01 X1.000 Y0.000\nG03 X0.000 Y1.000I-1.000 J0.000\n")
+
+        writer = camlib.GCodeWriter(modal=True)
+        writer.arc_moves([(1, 1, 0, 0, 0), (3, 0, 1, -1, 0), (3, 0, 1, 1, 1), (2, 1, 1, 1, 0)])
+        self.assertEqual(writer.getvalue(), "G01 X1.0000Y0.0000\nG03 X0.0000Y1.0000I-1.0000J0.0000\n"
+                                            "G02 X1.0000I1.0000J0.0000\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import time
+import unittest
+
+from shapely.geometry import LineString, Point, box
+
+import camlib
+
+
+def path_coords(paths):
+    return [list(geo.coords) for geo in paths]
+
+
+class ClearPolygonsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.polygons = [box(i * 2, 0, i * 2 + 1.5, 1).difference(Point(i * 2 + 0.7, 0.5).buffer(0.2))
+                         for i in range(6)]
+        self.serial = [path_coords(camlib.Geometry.clear_polygon(poly, 0.05, 0.15).get_objects())
+                       for poly in self.polygons]
+
+    def test_workers(self):
+        for workers in [1, 2]:
+            results = camlib.clear_polygons(self.polygons, 0.05, 0.15, workers=workers)
+            self.assertEqual([path_coords(paths) for paths in results], self.serial)
+
+    def test_progress(self):
+        calls = []
+        camlib.clear_polygons(self.polygons, 0.05, 0.15, workers=2,
+                              progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(i + 1, 6) for i in range(6)])
+
+    def test_failed(self):
+        # Not a polygon, so it is left out.
+        polygons = self.polygons[:2] + [LineString([(0, 0), (1, 1)])]
+        for workers in [1, 2]:
+            results = camlib.clear_polygons(polygons, 0.05, 0.15, workers=workers)
+            self.assertEqual([path_coords(paths) for paths in results[:2]], self.serial[:2])
+            self.assertIsNone(results[2])
+
+    def test_cancel(self):
+        for workers in [1, 2]:
+            self.assertIsNone(camlib.clear_polygons(self.polygons, 0.05, 0.15, workers=workers,
+                                                    cancelled=lambda: True))
+
+        # Stops while the workers are busy.
+        polygons = [Point(0, 0).buffer(10, 64)] * 4
+        calls = []
+        t0 = time.time()
+        results = camlib.clear_polygons(polygons, 0.001, 0.15, workers=2,
+                                        progress=lambda done, total: calls.append(done),
+                                        cancelled=lambda: time.time() - t0 > 0.5, poll=0.05)
+        self.assertIsNone(results)
+        self.assertEqual(calls, [])
+        self.assertLess(time.time() - t0, 5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
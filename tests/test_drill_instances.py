@@ -0,0 +1,59 @@
+import unittest
+
+from shapely.geometry import Point
+from shapely.ops import cascaded_union
+
+import camlib
+
+
+class DrillInstancesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.excellon = camlib.Excellon()
+        self.excellon.parse_file("tests/excellon_files/case1.drl")
+        self.excellon.create_geometry()
+
+    def test_lazy(self):
+        exc = self.excellon
+        self.assertIsNotNone(exc.instances)
+        self.assertEqual(len(exc.instances), len(exc.drills))
+        self.assertFalse(exc.is_empty())
+        exc.bounds()
+        self.assertIsNone(exc._solid_geometry)
+
+    def test_polygons(self):
+        exc = self.excellon
+        polygons = exc.solid_geometry
+        self.assertEqual(len(polygons), len(exc.drills))
+        for polygon, drill in zip(polygons, exc.drills):
+            radius = exc.tools[drill['tool']]['C'] / 2.0
+            expected = drill['point'].buffer(radius)
+            self.assertLess(polygon.symmetric_difference(expected).area, 1e-12)
+
+    def test_bounds(self):
+        exc = self.excellon
+        bounds = exc.bounds()
+        expected = cascaded_union(exc.instances.polygons()).bounds
+        for b, e in zip(bounds, expected):
+            self.assertAlmostEqual(b, e)
+
+    def test_groups(self):
+        groups = self.excellon.instances.groups()
+        self.assertEqual(sum(len(centers) for _, centers in groups), len(self.excellon.drills))
+        for template, _ in groups:
+            self.assertEqual(tuple(template[0]), tuple(template[-1]))
+
+    def test_setter_clears_instances(self):
+        exc = self.excellon
+        exc.solid_geometry = [Point(0, 0).buffer(1)]
+        self.assertIsNone(exc.instances)
+        self.assertEqual(len(exc.solid_geometry), 1)
+
+    def test_empty(self):
+        exc = camlib.Excellon()
+        exc.create_geometry()
+        self.assertTrue(exc.is_empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+import numpy as np
+
+import camlib
+
+
+class DrillOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.points = np.random.RandomState(0).rand(400, 2) * 10
+
+    def assertPermutation(self, order, n):
+        self.assertEqual(sorted(order.tolist()), range(n))
+
+    def test_travel(self):
+        points = np.array([[0, 1], [3, 5]])
+        self.assertAlmostEqual(camlib.drill_travel(points), 5.0)
+        self.assertAlmostEqual(camlib.drill_travel(points, start=(0, 0), end=(3, 0)), 11.0)
+        self.assertEqual(camlib.drill_travel(np.zeros((0, 2))), 0.0)
+
+    def test_nearest_neighbour(self):
+        points = np.array([[5, 0], [1, 0], [3, 0], [2, 0]])
+        order = camlib.nearest_neighbour_order(points, (0, 0))
+        self.assertEqual(order.tolist(), [1, 3, 2, 0])
+
+        order = camlib.nearest_neighbour_order(self.points)
+        self.assertPermutation(order, len(self.points))
+
+    def test_improve(self):
+        start = (0.0, 0.0)
+        order = camlib.nearest_neighbour_order(self.points, start)
+        improved = camlib.improve_drill_order(self.points, order, start, time_budget=10.0)
+        self.assertPermutation(improved, len(self.points))
+        self.assertLess(camlib.drill_travel(self.points[improved], start),
+                        camlib.drill_travel(self.points[order], start))
+
+    def test_methods(self):
+        for method in [None, "none", "nn", "2opt"]:
+            order = camlib.optimize_drill_order(self.points, method=method)
+            self.assertPermutation(order, len(self.points))
+        self.assertEqual(camlib.optimize_drill_order(self.points, method=None).tolist(),
+                         range(len(self.points)))
+        self.assertRaises(ValueError, camlib.optimize_drill_order, self.points, method="tsp")
+
+    def test_small(self):
+        for n in range(4):
+            order = camlib.optimize_drill_order(self.points[:n])
+            self.assertPermutation(order, n)
+
+
+class DrillOrderCNCjobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.excellon = camlib.Excellon()
+        self.excellon.parse_file("tests/excellon_files/case1.drl")
+
+    def holes(self, gcode):
+        return sorted(line for line in gcode.splitlines() if line.startswith("G00 X"))
+
+    def test_same_holes(self):
+        job = camlib.CNCjob()
+        job.generate_from_excellon_by_tool(self.excellon)
+        before, after = job.drill_travel
+        self.assertAlmostEqual(before, after)
+
+        ordered = camlib.CNCjob()
+        ordered.generate_from_excellon_by_tool(self.excellon, order="2opt")
+        self.assertEqual(self.holes(job.gcode), self.holes(ordered.gcode))
+        self.assertAlmostEqual(ordered.drill_travel[0], before)
+        self.assertLess(ordered.drill_travel[1], before)
+
+    def test_return_to_origin(self):
+        # The job ends at the origin, so the last tour includes that
+        # move and ordering never makes the travel longer.
+        rs = np.random.RandomState(1)
+        for i in range(30):
+            excellon = camlib.Excellon()
+            for tool in ["1", "2"]:
+                excellon.tools[tool] = {"C": 0.03}
+                excellon.drills.add_array(rs.rand(rs.randint(1, 12), 2) * 10, tool)
+            travel = {}
+            for method in [None, "nn", "2opt"]:
+                job = camlib.CNCjob()
+                job.generate_from_excellon_by_tool(excellon, order=method)
+                before, after = job.drill_travel
+                self.assertLessEqual(after, before + 1e-9)
+                travel[method] = after
+            self.assertLessEqual(travel["2opt"], travel[None] + 1e-9)
+
+        for i in range(30):
+            excellon = camlib.Excellon()
+            excellon.tools["1"] = {"C": 0.03}
+            excellon.drills.add_array(rs.rand(rs.randint(3, 15), 2) * 10, "1")
+            travel = {}
+            for method in ["nn", "2opt"]:
+                job = camlib.CNCjob()
+                job.generate_from_excellon_by_tool(excellon, order=method)
+                travel[method] = job.drill_travel[1]
+            self.assertLessEqual(travel["2opt"], travel["nn"] + 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import numpy as np
+import simplejson as json
+from shapely import affinity
+from shapely.geometry import Point
+
+import camlib
+from camlib import DrillStore
+
+
+class DrillStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.drills = [{'point': Point(i * 0.1, 1 - i * 0.05), 'tool': str(1 + i % 3)}
+                       for i in range(200)]
+        self.store = DrillStore(capacity=4)
+        for drill in self.drills:
+            self.store.append(drill)
+
+    def assertSameDrills(self, drills, expected):
+        drills = list(drills)
+        self.assertEqual(len(drills), len(expected))
+        for d1, d2 in zip(drills, expected):
+            self.assertEqual(d1['tool'], d2['tool'])
+            self.assertAlmostEqual(d1['point'].x, d2['point'].x, places=12)
+            self.assertAlmostEqual(d1['point'].y, d2['point'].y, places=12)
+
+    def test_compatibility_view(self):
+        self.assertEqual(len(self.store), 200)
+        self.assertSameDrills(self.store, self.drills)
+        self.assertEqual(self.store[5]['tool'], '3')
+        self.assertTrue(self.store[-1]['point'].equals(self.drills[-1]['point']))
+        self.assertRaises(IndexError, lambda: self.store[200])
+
+    def test_by_tool(self):
+        groups = self.store.by_tool()
+        self.assertEqual(sorted(groups.keys()), ['1', '2', '3'])
+        for tool in groups:
+            expected = [(d['point'].x, d['point'].y) for d in self.drills if d['tool'] == tool]
+            np.testing.assert_array_equal(groups[tool], expected)
+            np.testing.assert_array_equal(self.store.select(tool), expected)
+        self.assertEqual(len(self.store.select('99')), 0)
+
+    def test_transform_matches_affinity(self):
+        self.store.transform(-1.0, 1.0, 2 * 0.7, 0.0)
+        expected = [{'point': affinity.scale(d['point'], -1.0, 1.0, origin=(0.7, 0.3)), 'tool': d['tool']}
+                    for d in self.drills]
+        self.assertSameDrills(self.store, expected)
+
+    def test_extend_remaps_tools(self):
+        other = DrillStore()
+        other.add(5.0, 5.0, '3')
+        other.add(6.0, 6.0, '7')
+
+        self.store.extend(other)
+        self.assertEqual(len(self.store), 202)
+        self.assertEqual(self.store[200]['tool'], '3')
+        self.assertEqual(self.store[201]['tool'], '7')
+
+        # Copies, not views
+        other.transform(xoff=1.0)
+        self.assertEqual(self.store[201]['point'].x, 6.0)
+
+    def test_serialization(self):
+        store = DrillStore.from_dict(self.store.to_dict())
+        self.assertSameDrills(store, self.drills)
+
+        # Projects keep the list of dictionaries format.
+        decoded = json.loads(json.dumps(self.store, default=camlib.to_dict), object_hook=camlib.dict2obj)
+        self.assertSameDrills(decoded, self.drills)
+
+
+class ExcellonDrillsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.excellon = camlib.Excellon()
+        self.excellon.parse_file("tests/excellon_files/case1.drl")
+        self.drills = self.excellon.drills.to_list()
+
+    def test_assign_list(self):
+        excellon = camlib.Excellon()
+        excellon.tools = self.excellon.tools
+        excellon.drills = self.drills
+        self.assertIsInstance(excellon.drills, DrillStore)
+        self.assertEqual(len(excellon.drills), len(self.drills))
+
+        excellon.create_geometry()
+        self.assertEqual(len(excellon.solid_geometry), len(self.drills))
+        for poly, drill in zip(excellon.solid_geometry, self.drills):
+            expected = drill['point'].buffer(self.excellon.tools[drill['tool']]['C'] / 2.0)
+            self.assertLess(poly.symmetric_difference(expected).area, 1e-12)
+
+    def test_transformations(self):
+        self.excellon.scale(2.0)
+        self.excellon.offset((1.0, -2.0))
+        self.excellon.mirror("X", (0.5, 0.5))
+
+        for drill, original in zip(self.excellon.drills, self.drills):
+            point = affinity.scale(original['point'], 2.0, 2.0, origin=(0, 0))
+            point = affinity.translate(point, 1.0, -2.0)
+            point = affinity.scale(point, 1.0, -1.0, origin=(0.5, 0.5))
+            self.assertAlmostEqual(drill['point'].x, point.x, places=12)
+            self.assertAlmostEqual(drill['point'].y, point.y, places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
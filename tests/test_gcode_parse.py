@@ -0,0 +1,302 @@
+import unittest
+
+import numpy as np
+
+import camlib
+
+try:
+    from FlatCAMObj import FlatCAMObj
+except ImportError:
+    FlatCAMObj = None
+
+
+class GCodeTableTest(unittest.TestCase):
+
+    def test_words(self):
+        table = camlib.CNCjob.gcode_table("N10 G01 X1.5 Y-.25\nG00Z+2\n")
+        self.assertEqual(table['motion'].tolist(), [1.0, 0.0])
+        self.assertEqual(table['X'][0], 1.5)
+        self.assertEqual(table['Y'][0], -0.25)
+        self.assertEqual(table['Z'][1], 2.0)
+        self.assertTrue(np.isnan(table['Z'][0]))
+
+    def test_values_as_float(self):
+        values = ["0.3244", "-12.5", "1.", ".0005", "123456.789012", "-0"]
+        gcode = "".join("G01 X%s\n" % v for v in values)
+        table = camlib.CNCjob.gcode_table(gcode)
+        self.assertEqual(table['X'].tolist(), [float(v) for v in values])
+
+    def test_skipped_lines(self):
+        gcode = "(Comment G01 X5)\n%\nM03 S1000\nF3.0\nG04 P1\nG90 G01 X1 (c) Y5\n"
+        table = camlib.CNCjob.gcode_table(gcode)
+        self.assertEqual(len(table['X']), 1)
+        self.assertEqual(table['motion'][0], 1.0)
+        self.assertEqual(table['X'][0], 1.0)
+        self.assertTrue(np.isnan(table['Y'][0]))
+
+    def test_units(self):
+        table = camlib.CNCjob.gcode_table("G20\nG21 G00 X2\n")
+        self.assertEqual(table['units'].tolist(), [20.0, 21.0])
+        self.assertEqual(table['motion'][1], 0.0)
+
+    def test_nonmodal(self):
+        # Lines without coordinates are left out as usual.
+        gcode = "G01 X1\nG28 X0 Y0\nG92.1\nG4 P1\nG30.1 Y2\nG92 X1 2\n"
+        for chunk_size in [1 << 22, 1]:
+            table = camlib.CNCjob.gcode_table(gcode, chunk_size=chunk_size)
+            self.assertEqual(table['nonmodal'][1:].tolist(), [28.0, 30.1, 92.0])
+            self.assertTrue(np.isnan(table['motion'][1:]).all())
+            self.assertEqual(table['X'][3], 12.0)
+
+    def test_chunks(self):
+        gcode = "".join("G01 X%d Y%d\n" % (i, -i) for i in range(1000))
+        table = camlib.CNCjob.gcode_table(gcode, chunk_size=100)
+        self.assertEqual(table['X'].tolist(), list(range(1000)))
+        self.assertEqual(table['Y'].tolist(), [-i for i in range(1000)])
+
+    def test_odd_lines(self):
+        # Not plain words, read one at a time.
+        table = camlib.CNCjob.gcode_table("G01 X1 2\nG01 X 3 Y4\n")
+        self.assertEqual(table['X'].tolist(), [12.0, 3.0])
+        self.assertRaises(ValueError, camlib.CNCjob.gcode_table, "G01 X-1-2\n")
+
+
+class GCodeParseTest(unittest.TestCase):
+
+    def parse(self, gcode):
+        job = camlib.CNCjob()
+        job.gcode = gcode
+        toolpath = job.gcode_parse()
+        return job, toolpath
+
+    def test_paths(self):
+        job, toolpath = self.parse("G00 Z0.1\nG00 X1 Y1\nG01 Z-0.01\nG01 X2\nG01 Y2\n"
+                                   "G00 Z0.1\nG00 X0 Y0\n")
+        self.assertIs(job.toolpath, toolpath)
+        self.assertEqual(len(toolpath), 3)
+        self.assertEqual(toolpath.kinds.tolist(), ['TF', 'CS', 'TF'])
+        self.assertEqual(toolpath.coords(1).tolist(), [[1, 1], [2, 1], [2, 2]])
+        # A path starts where the previous one ends.
+        self.assertEqual(toolpath.coords(2).tolist(), [[2, 2], [0, 0]])
+        self.assertEqual(toolpath.path.tolist(), [0, 0, 1, 1, 1, 2, 2])
+
+    def test_gcode_parsed(self):
+        job, toolpath = self.parse("G00 Z0.1\nG00 X1 Y1\nG01 Z-0.01\nG01 X2\n")
+        self.assertIsNone(job._gcode_parsed)
+        parsed = job.gcode_parsed
+        self.assertEqual([p['kind'] for p in parsed], [['T', 'F'], ['C', 'S']])
+        self.assertEqual(list(parsed[1]['geom'].coords), [(1, 1), (2, 1)])
+
+        # Setting it drops the arrays, which no longer match.
+        job.gcode_parsed = parsed[1:]
+        self.assertIsNone(job.toolpath)
+        self.assertEqual(len(job.gcode_parsed), 1)
+
+    def test_motion_mode(self):
+        # Only G00 to G03 change it.
+        job, toolpath = self.parse("G01 Z-0.01\nX1\nG04 P1\nX2\nG00 X3\n")
+        self.assertEqual(toolpath.motion.tolist(), [0, 1, 1, 0])
+
+    def test_arc(self):
+        job, toolpath = self.parse("G01 Z-0.01\nG01 X1 Y0\nG03 X0 Y1 I-1 J0\n")
+        xy = toolpath.coords(0)
+        self.assertGreater(len(xy), 4)
+        self.assertTrue(np.allclose(xy[-1], [0.0, 1.0]))
+        radii = np.hypot(xy[1:, 0], xy[1:, 1])
+        self.assertTrue(np.allclose(radii, 1.0))
+
+    def test_nonmodal(self):
+        # Coordinates of G28 and G92 are not moves.
+        job, toolpath = self.parse("G00 Z0.1\nG00 X1 Y1\nG01 Z-0.01\nG01 X2\nG28 X0 Y0\n"
+                                   "G92 X0 Y0\nG01 X3\n")
+        self.assertEqual(toolpath.coords(1).tolist(), [[1, 1], [2, 1], [3, 0]])
+
+    def test_arc_without_center(self):
+        job, toolpath = self.parse("G01 Z-0.01\nG02 X1 Y1\n")
+        self.assertEqual(toolpath.coords(0).tolist(), [[0, 0], [1, 1]])
+
+    def test_units(self):
+        job, toolpath = self.parse("G21\nG00 X1\n")
+        self.assertEqual(job.units, "MM")
+
+    def test_empty(self):
+        job, toolpath = self.parse("")
+        self.assertEqual(len(toolpath), 0)
+        self.assertEqual(job.gcode_parsed, [])
+
+    def test_to_dict(self):
+        job, toolpath = self.parse("G00 X1 Y1\nG01 Z-0.01\nG02 X3 Y1 I1 J0\n")
+        copy = camlib.GCodeToolpath.from_dict(toolpath.to_dict())
+        for attr in ['x', 'y', 'z', 'motion', 'offsets', 'kinds']:
+            self.assertEqual(getattr(copy, attr).tolist(), getattr(toolpath, attr).tolist())
+
+    def test_offset(self):
+        job, toolpath = self.parse("G00 X1 Y1\nG01 Z-0.01\nG01 X2\n")
+        job.offset((1, 2))
+        self.assertIs(job.toolpath, toolpath)
+        self.assertEqual(toolpath.coords(1).tolist(), [[2, 3], [3, 3]])
+        self.assertEqual(list(job.gcode_parsed[1]['geom'].coords), [(2, 3), (3, 3)])
+
+
+class LazyGeometryTest(unittest.TestCase):
+
+    gcode = "G00 Z0.1\nG00 X1 Y1\nG01 Z-0.01\nG01 X3\nG02 X3 Y3 I0 J1\nG00 Z0.1\nG00 X0 Y0\n"
+
+    def setUp(self):
+        self.job = camlib.CNCjob()
+        self.job.gcode = self.gcode
+        self.job.gcode_parse()
+        self.job.create_geometry()
+
+    def union(self):
+        return camlib.cascaded_union([geo['geom'] for geo in self.job.gcode_parsed])
+
+    def test_bounds(self):
+        self.assertIsNone(self.job._solid_geometry)
+        self.assertTrue(np.allclose(self.job.bounds(), self.union().bounds))
+        self.assertFalse(self.job.is_empty())
+        self.assertIsNone(self.job._solid_geometry)
+
+    def test_solid_geometry(self):
+        self.assertTrue(self.job.solid_geometry.equals(self.union()))
+
+    def test_scale(self):
+        expected = camlib.affinity.scale(self.union(), 2, 2, origin=(0, 0))
+        self.job.scale(2)
+        self.assertIsNotNone(self.job.toolpath)
+        self.assertTrue(np.allclose(self.job.bounds(), expected.bounds))
+        self.assertTrue(self.job.solid_geometry.equals_exact(expected, 1e-9))
+
+    def test_offset(self):
+        expected = camlib.affinity.translate(self.union(), 1, -2)
+        self.job.offset((1, -2))
+        self.assertTrue(np.allclose(self.job.bounds(), expected.bounds))
+        self.assertTrue(self.job.solid_geometry.equals_exact(expected, 1e-9))
+
+    def test_without_toolpath(self):
+        # As loaded from a project.
+        expected = self.union()
+        self.job.gcode_parsed = self.job.gcode_parsed
+        self.job.create_geometry()
+        self.assertTrue(np.allclose(self.job.bounds(), expected.bounds))
+        self.job.offset((1, 1))
+        self.assertTrue(np.allclose(self.job.bounds(), np.array(expected.bounds) + 1))
+
+    def test_empty(self):
+        job = camlib.CNCjob()
+        job.gcode_parse()
+        job.create_geometry()
+        self.assertTrue(job.is_empty())
+        self.assertEqual(job.bounds(), (0, 0, 0, 0))
+
+    def test_to_dict(self):
+        d = self.job.to_dict()
+        self.assertIsNone(d['solid_geometry'])
+        self.assertIsNone(self.job._solid_geometry)
+        self.assertEqual(len(d['gcode_parsed']), 3)
+
+
+class PlotRecorder(object):
+    """
+    Stands in for a FlatCAMCNCjob, keeping what is plotted.
+    """
+
+    def __init__(self):
+        self.shapes = []
+        self.toolpaths = []
+        self.annotation = self
+        self.options = {'plot': True}
+        self.text = None
+
+    def add_shape(self, **kwargs):
+        self.shapes.append(kwargs)
+
+    def add_toolpath(self, **kwargs):
+        self.toolpaths.append(kwargs)
+
+    def set(self, text=None, pos=None, visible=True):
+        self.text = text
+
+
+class ToolpathCollection(object):
+    """
+    Stands in for a ShapeCollection, with the same arguments.
+    """
+
+    def __init__(self):
+        self.toolpaths = []
+
+    def add_toolpath(self, points=None, path=None, width=0, color=None, face_color=None, visible=True,
+                     update=False, layer=1, tolerance=0.01):
+        self.toolpaths.append({'layer': layer, 'tolerance': tolerance})
+
+
+class ToolpathObject(PlotRecorder):
+    """
+    PlotRecorder passing tool paths through FlatCAMObj.add_toolpath().
+    """
+
+    deleted = False
+    drawing_tolerance = 0.01
+
+    def __init__(self):
+        PlotRecorder.__init__(self)
+        self.shapes = ToolpathCollection()
+        self.add_shape = lambda **kwargs: None
+
+    if FlatCAMObj is not None:
+        add_toolpath = FlatCAMObj.add_toolpath.__func__
+
+
+class ToolpathPlotTest(unittest.TestCase):
+
+    def setUp(self):
+        gcode = "G00 Z0.1\n"
+        for i in range(5):
+            gcode += "G00 X%d Y0\nG01 Z-0.01\nG01 X%d Y1\nG01 X%d.5\nG00 Z0.1\n" % (2 * i, 2 * i, 2 * i)
+        self.job = camlib.CNCjob()
+        self.job.gcode = gcode
+        self.job.gcode_parse()
+
+    def test_path_bounds(self):
+        bounds = self.job.toolpath.path_bounds()
+        self.assertEqual(len(bounds), len(self.job.toolpath))
+        self.assertEqual(bounds[3].tolist(), [2, 0, 2.5, 1])
+        self.assertEqual(self.job.toolpath.paths_in((1.9, 0.5, 2.1, 0.6)).tolist(), [2, 3])
+
+    def test_batched(self):
+        obj = PlotRecorder()
+        self.job.plot2(tooldia=0.1, obj=obj)
+        self.assertEqual(obj.shapes, [])
+        self.assertEqual([t['layer'] for t in obj.toolpaths], [2, 1])
+
+        cuts = obj.toolpaths[1]
+        self.assertEqual(cuts['width'], 0.1)
+        self.assertEqual(len(np.unique(cuts['path'])), 5)
+        self.assertEqual(cuts['points'][:3].tolist(), [[0, 0], [0, 1], [0.5, 1]])
+        self.assertEqual(len(obj.text), len(self.job.toolpath))
+
+    @unittest.skipIf(FlatCAMObj is None, "Needs PyQt4")
+    def test_object_toolpath(self):
+        obj = ToolpathObject()
+        self.job.plot2(tooldia=0.1, obj=obj, tool_tolerance=0.001)
+        self.assertEqual(obj.shapes.toolpaths, [{'layer': 2, 'tolerance': 0.001}, {'layer': 1, 'tolerance': 0.001}])
+
+    def test_buffered_in_view(self):
+        obj = PlotRecorder()
+        self.job.plot2(tooldia=0.1, obj=obj, view=(1.9, 0.5, 2.1, 0.6))
+        self.assertEqual(len(obj.shapes), 2)
+        self.assertAlmostEqual(obj.shapes[1]['shape'].bounds[2], 2.55, places=3)
+        cuts = obj.toolpaths[1]
+        self.assertEqual(len(np.unique(cuts['path'])), 4)
+
+    def test_without_toolpath(self):
+        obj = PlotRecorder()
+        self.job.gcode_parsed = self.job.gcode_parsed
+        self.job.plot2(tooldia=0.1, obj=obj)
+        self.assertEqual(obj.toolpaths, [])
+        self.assertEqual(len(obj.shapes), len(self.job.gcode_parsed))
+
+
+if __name__ == '__main__':
+    unittest.main()
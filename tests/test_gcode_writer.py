@@ -0,0 +1,120 @@
+import unittest
+from cStringIO import StringIO
+
+from shapely.geometry import LineString, LinearRing, Point
+
+import camlib
+
+
+class GCodeWriterTest(unittest.TestCase):
+
+    def test_plain(self):
+        writer = camlib.GCodeWriter()
+        writer.move(0, 1, 2)
+        writer.move(0, 1, 2)
+        writer.move_z(1, -0.1)
+        writer.set_feedrate(3)
+        writer.moves(1, [(1, 3), (2, 3)])
+        self.assertEqual(writer.getvalue(),
+                         "G00 X1.0000Y2.0000\nG00 X1.0000Y2.0000\nG01 Z-0.1000\nF3.00\n"
+                         "G01 X1.0000Y3.0000\nG01 X2.0000Y3.0000\n")
+
+    def test_modal(self):
+        writer = camlib.GCodeWriter(modal=True)
+        writer.move(0, 1, 2)
+        writer.move(0, 1, 2)
+        writer.move_z(1, -0.1)
+        writer.move_z(1, -0.1)
+        writer.set_feedrate(3)
+        writer.set_feedrate(3)
+        writer.moves(1, [(1, 3), (2, 3), (2, 4)])
+        writer.move_z(0, 0.1)
+        writer.move(0, 0, 0)
+        self.assertEqual(writer.getvalue(),
+                         "G00 X1.0000Y2.0000\nG01 Z-0.1000\nF3.00\nY3.0000\nX2.0000\nY4.0000\n"
+                         "G00 Z0.1000\nX0.0000Y0.0000\n")
+
+    def test_modal_coordinate_format(self):
+        writer = camlib.GCodeWriter(modal=True, coordinate_format="X%.3f Y%.3f")
+        writer.move(1, 1, 2)
+        writer.move(1, 1, 3)
+        writer.move(1, 2, 4)
+        self.assertEqual(writer.getvalue(), "G01 X1.000 Y2.000\nY3.000\nX2.000 Y4.000\n")
+
+        # Not split into words, both are written.
+        writer = camlib.GCodeWriter(modal=True, coordinate_format="X%.3f,Y%.3f")
+        writer.move(1, 1, 2)
+        writer.move(1, 1, 2)
+        writer.move(1, 1, 3)
+        self.assertEqual(writer.getvalue(), "G01 X1.000,Y2.000\nX1.000,Y3.000\n")
+
+    def test_output(self):
+        output = StringIO()
+        writer = camlib.GCodeWriter(output, chunk_size=16)
+        for i in range(100):
+            writer.move(1, i, i)
+        self.assertGreater(len(output.getvalue()), 0)
+        writer.flush()
+        self.assertEqual(len(output.getvalue()), writer.size)
+        self.assertEqual(output.getvalue().count("\n"), 100)
+
+
+class CNCjobModalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.geometry = camlib.Geometry()
+        self.geometry.solid_geometry = [LineString([(0, 0), (1, 0), (1, 1)]),
+                                        LinearRing([(2, 2), (3, 2), (3, 3)]),
+                                        Point(4, 4)]
+
+    def paths(self, job):
+        job.gcode_parse()
+        paths = []
+        for item in job.gcode_parsed:
+            coords = [tuple(round(v, 4) for v in p) for p in item['geom'].coords]
+            coords = [p for i, p in enumerate(coords) if i == 0 or p != coords[i - 1]]
+            if len(coords) > 1:
+                paths.append(coords)
+        return paths
+
+    def generate(self, modal, **kwargs):
+        job = camlib.CNCjob(z_cut=-0.05, zdownrate=kwargs.pop("zdownrate", None))
+        job.modal_gcode = modal
+        job.generate_from_geometry_2(self.geometry, **kwargs)
+        return job
+
+    def test_same_paths(self):
+        for kwargs in [{}, {"multidepth": True, "depthpercut": 0.02}, {"zdownrate": 5.0}]:
+            plain = self.generate(False, **kwargs)
+            modal = self.generate(True, **kwargs)
+            self.assertLess(len(modal.gcode), len(plain.gcode))
+            self.assertEqual(self.paths(plain), self.paths(modal))
+
+    def test_excellon(self):
+        excellon = camlib.Excellon()
+        excellon.parse_file("tests/excellon_files/case1.drl")
+        jobs = []
+        for modal in [False, True]:
+            job = camlib.CNCjob()
+            job.modal_gcode = modal
+            job.generate_from_excellon_by_tool(excellon, toolchange=True)
+            jobs.append(job)
+        self.assertLess(len(jobs[1].gcode), len(jobs[0].gcode))
+        self.assertEqual(self.paths(jobs[0]), self.paths(jobs[1]))
+
+    def test_output(self):
+        job = self.generate(False)
+        output = StringIO()
+        streamed = camlib.CNCjob(z_cut=-0.05)
+        streamed.generate_from_geometry_2(self.geometry, output=output)
+        self.assertEqual(output.getvalue(), job.gcode)
+        self.assertEqual(streamed.gcode, "")
+
+    def test_linear2gcode(self):
+        job = camlib.CNCjob(z_cut=-0.05)
+        gcode = job.linear2gcode(LineString([(0, 0), (1, 0)]))
+        self.assertEqual(gcode, "G00 X0.0000Y0.0000\nG01 Z-0.0500\nG01 X1.0000Y0.0000\nG00 Z0.1000\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import camlib
+from shapely.geometry import Point
+
+
+class FlashTemplateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gerber = camlib.Gerber()
+        self.gerber.aperture_parse("10", "C", "0.05")
+        self.gerber.aperture_parse("11", "R", "0.05X0.12")
+        self.gerber.aperture_parse("12", "O", "0.12X0.05")
+        self.gerber.aperture_parse("13", "P", "0.1X5X30")
+
+        macro = camlib.ApertureMacro(name="THERMAL80")
+        macro.append("7,0,0,0.08,0.06,0.01,0")
+        self.gerber.aperture_macros["THERMAL80"] = macro
+        self.gerber.aperture_parse("14", "THERMAL80", None)
+
+    def assertSameGeometry(self, geo1, geo2):
+        self.assertEqual(geo1.geom_type, geo2.geom_type)
+        self.assertLess(geo1.symmetric_difference(geo2).area, 1e-12)
+
+    def test_flash_matches_direct_geometry(self):
+        cache = self.gerber.flash_cache
+        for apid in ["10", "11", "12", "13", "14"]:
+            aperture = self.gerber.apertures[apid]
+            for x, y in [(0.0, 0.0), (1.25, -0.5), (-3.0, 7.5)]:
+                expected = camlib.Gerber.create_flash_geometry(Point(x, y), aperture)
+                flash = cache.flash(apid, aperture, self.gerber.steps_per_circ, x, y)
+                self.assertSameGeometry(flash, expected)
+
+    def test_hits_and_misses(self):
+        cache = self.gerber.flash_cache
+        for i in range(10):
+            cache.flash("10", self.gerber.apertures["10"], 40, i, i)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 9)
+        self.assertEqual(cache.stats()['templates'], 1)
+
+    def test_aperture_redefinition(self):
+        cache = self.gerber.flash_cache
+        cache.flash("10", self.gerber.apertures["10"], 40, 0, 0)
+        self.gerber.aperture_parse("10", "C", "0.2")
+        flash = cache.flash("10", self.gerber.apertures["10"], 40, 0, 0)
+        self.assertEqual(cache.misses, 2)
+        self.assertAlmostEqual(flash.bounds[2], 0.1)
+
+    def test_steps_per_circ_change(self):
+        cache = self.gerber.flash_cache
+        cache.flash("10", self.gerber.apertures["10"], 40, 0, 0)
+        cache.flash("11", self.gerber.apertures["11"], 40, 0, 0)
+        cache.flash("10", self.gerber.apertures["10"], 64, 0, 0)
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(cache.stats()['templates'], 1)
+
+    def test_parse_file(self):
+        self.gerber = camlib.Gerber()
+        self.gerber.parse_file("tests/gerber_files/STM32F4-spindle.cmp")
+        cache = self.gerber.flash_cache
+        self.assertGreater(cache.hits, 0)
+        self.assertLessEqual(cache.misses, len(self.gerber.apertures))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import camlib
+from shapely.geometry import Point, Polygon, box
+
+
+class PolarityEngineTest(unittest.TestCase):
+
+    def layers(self):
+        # Pads with clear thermal-like cuts, alternating polarity.
+        for i in range(8):
+            for j in range(8):
+                yield 'D', Point(i, j).buffer(0.4)
+                yield 'C', box(i - 0.05, j - 0.5, i + 0.05, j + 0.5)
+        yield 'D', box(-1, 3.9, 8, 4.1)
+        yield 'C', Point(4, 4).buffer(1.5)
+
+    def test_matches_sequential(self):
+        expected = Polygon()
+        engine = camlib.PolarityEngine()
+        for polarity, geo in self.layers():
+            if polarity == 'D':
+                expected = expected.union(geo)
+            else:
+                expected = expected.difference(geo)
+            engine.apply(polarity, geo)
+
+        result = engine.geometry()
+        self.assertAlmostEqual(result.area, expected.area, places=9)
+        self.assertLess(result.symmetric_difference(expected).area, 1e-9)
+        self.assertEqual(len(result.geoms), len(expected.geoms))
+
+    def test_initial_geometry(self):
+        engine = camlib.PolarityEngine(box(0, 0, 2, 2))
+        engine.apply('C', box(1, 1, 3, 3))
+        self.assertAlmostEqual(engine.geometry().area, 3.0)
+
+    def test_empty(self):
+        engine = camlib.PolarityEngine()
+        engine.apply('C', box(0, 0, 1, 1))
+        self.assertTrue(engine.geometry().is_empty)
+
+    def test_parse_lines(self):
+        glines = ["%FSLAX24Y24*%", "%MOIN*%", "%ADD10C,0.0800*%", "%ADD11R,0.0200X0.1000*%"]
+        for i in range(5):
+            glines += ["%LPD*%", "D10*", "X%dY0D03*" % (i * 1000),
+                       "%LPC*%", "D11*", "X%dY0D03*" % (i * 1000)]
+        glines += ["M02*"]
+
+        gerber = camlib.Gerber()
+        gerber.parse_lines(glines)
+        pad = camlib.Gerber.create_flash_geometry(Point(0, 0), gerber.apertures["10"])
+        cut = camlib.Gerber.create_flash_geometry(Point(0, 0), gerber.apertures["11"])
+        expected = 5 * pad.difference(cut).area
+        self.assertAlmostEqual(gerber.solid_geometry.area, expected, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
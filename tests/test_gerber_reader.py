@@ -0,0 +1,53 @@
+import unittest
+import os
+import glob
+import tempfile
+import camlib
+
+
+class GerberReaderTest(unittest.TestCase):
+
+    def assertSameStatements(self, text):
+        fd, path = tempfile.mkstemp(suffix='.gbr')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(text)
+            with open(path, 'r') as f:
+                expected = [s.strip(' \r\n') for s in camlib.Gerber.line_statements(f)]
+            with open(path, 'rb') as f:
+                mapped = [s.strip(' \r\n') for s in camlib.Gerber.mapped_statements(f)]
+        finally:
+            os.remove(path)
+        self.assertEqual(mapped, expected)
+
+    def test_statements(self):
+        self.assertSameStatements("G54D11*G36*\n")
+        self.assertSameStatements("%FSLAX24Y24*%\r\n%MOIN*%\r\n")
+        self.assertSameStatements("  G04 comment*%ADD10C,0.1*%  \n\n\n")
+        self.assertSameStatements("X1Y1D03*X2Y2D03*X3Y3")
+        self.assertSameStatements("%AMTHERMAL*\n7,0,0,0.08,0.06,0.01,0*\n%\n")
+        self.assertSameStatements("G01* *\nD10*\t\n\t%LPC*%\n")
+        self.assertSameStatements("X1\rY1D03*\rG04 x\r\n")
+        self.assertSameStatements("G04 50%*X1D03*\nG04 %x%*%\n")
+
+    def test_empty(self):
+        self.assertSameStatements("")
+        self.assertSameStatements(" \r\n\n")
+
+    def test_files(self):
+        for filename in glob.glob('tests/gerber_files/*'):
+            with open(filename, 'rb') as f:
+                self.assertSameStatements(f.read())
+
+    def test_parse_file(self):
+        filename = 'tests/gerber_files/STM32F4-spindle.cmp'
+        mapped = camlib.Gerber()
+        mapped.parse_file(filename)
+        lines = camlib.Gerber()
+        lines.parse_file(filename, mapped=False)
+        self.assertEqual(mapped.solid_geometry.area, lines.solid_geometry.area)
+        self.assertEqual(sorted(mapped.apertures), sorted(lines.apertures))
+
+
+if __name__ == '__main__':
+    unittest.main()
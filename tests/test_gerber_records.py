@@ -0,0 +1,72 @@
+import unittest
+import camlib
+
+
+class GerberRecordsTest(unittest.TestCase):
+
+    filename = "tests/gerber_files/STM32F4-spindle.cmp"
+
+    def setUp(self):
+        self.gerber = camlib.Gerber()
+        self.gerber.parse_file(self.filename)
+
+    def test_records(self):
+        ops = set(record.op for record in self.gerber.records)
+        self.assertIn('stroke', ops)
+        self.assertIn('flash', ops)
+        for record in self.gerber.records:
+            self.assertIn(record.polarity, ['D', 'C'])
+            if record.op == 'stroke':
+                self.assertGreater(len(record.coords), 1)
+                self.assertEqual(record.shape, self.gerber.apertures[record.aperture]['size'])
+
+    def test_process_pool(self):
+        area = self.gerber.solid_geometry.area
+        self.gerber.build_workers = 2
+        self.gerber.build_geometry()
+        self.assertAlmostEqual(self.gerber.solid_geometry.area, area)
+
+    def test_follow(self):
+        follow = camlib.Gerber()
+        follow.parse_file(self.filename, follow=True)
+        self.gerber.build_geometry(follow=True)
+        self.assertEqual(len(self.gerber.solid_geometry), len(follow.solid_geometry))
+        self.assertAlmostEqual(sum(geo.length for geo in self.gerber.solid_geometry),
+                               sum(geo.length for geo in follow.solid_geometry))
+
+    def test_steps_per_circ(self):
+        glines = ["%FSLAX24Y24*%", "%MOIN*%", "%ADD10C,0.0100*%", "D10*", "G75*",
+                  "X0Y0D02*", "G01X10000Y0D01*",
+                  "G03X10000Y10000I0J5000D01*", "G01X0Y10000D01*", "M02*"]
+
+        gerber = camlib.Gerber()
+        gerber.parse_lines(glines)
+        self.assertTrue(any(record.arcs for record in gerber.records))
+
+        fine = camlib.Gerber(steps_per_circle=128)
+        fine.parse_lines(glines)
+
+        gerber.steps_per_circ = 128
+        gerber.build_geometry()
+        self.assertAlmostEqual(gerber.solid_geometry.area, fine.solid_geometry.area)
+        self.assertEqual(len(gerber.solid_geometry.exterior.coords),
+                         len(fine.solid_geometry.exterior.coords))
+
+    def test_undefined_aperture(self):
+        # Flash before selecting an aperture.
+        glines = ["%FSLAX24Y24*%", "%MOIN*%", "%ADD10C,0.0100*%", "X0Y0D02*",
+                  "X1000Y0D03*", "D10*", "X2000Y0D03*", "X3000Y0D03*", "M02*"]
+
+        # Reported at the flash, not at the end of the file.
+        gerber = camlib.Gerber()
+        with self.assertRaises(camlib.ParseError) as cm:
+            gerber.parse_lines(glines)
+        self.assertTrue(cm.exception[0].startswith("Line 5: "))
+
+        # Flashes are not drawn when following the paths.
+        gerber.parse_lines(glines, follow=True)
+        self.assertEqual([record.line for record in gerber.records if record.op == 'flash'], [5, 7, 8])
+
+
+if __name__ == '__main__':
+    unittest.main()
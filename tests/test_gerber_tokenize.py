@@ -0,0 +1,80 @@
+import os
+import unittest
+import camlib
+
+
+# Patterns in the order parse_lines() used to try them one after
+# the other, before tokenize().
+legacy_order = ['am1', 'lin', 'circ', 'opcode', 'quad', 'regionon', 'regionoff', 'ad',
+                'interp', 'tool', 'lpol', 'fmt', 'mode', 'units', 'absrel', 'comm', 'eof']
+
+
+def legacy_tokenize(gerber, gline):
+    """
+    Reference classification: first pattern in ``legacy_order``
+    that matches, as ``(token, match)`` or ``(None, None)``.
+    """
+    for token in legacy_order:
+        match = gerber.statement_patterns[token].search(gline)
+        if match:
+            return token, match
+    return None, None
+
+
+class GerberTokenizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gerber = camlib.Gerber()
+
+    def assertToken(self, gline, token):
+        self.assertEqual(self.gerber.tokenize(gline)[0], token)
+
+    def test_statements(self):
+        self.assertToken("%FSLAX24Y24*%", 'fmt')
+        self.assertToken("%MOIN*%", 'mode')
+        self.assertToken("%ADD10C,0.05*%", 'ad')
+        self.assertToken("%AMTHERMAL*7,0,0,0.08,0.06,0.01,0*%", 'am1')
+        self.assertToken("%LPC*%", 'lpol')
+        self.assertToken("G01X100Y200D01*", 'lin')
+        self.assertToken("X100D03*", 'lin')
+        self.assertToken("G03X100Y200I10J0D01*", 'circ')
+        self.assertToken("I10J0*", 'circ')
+        self.assertToken("D03*", 'opcode')
+        self.assertToken("D10*", 'tool')
+        self.assertToken("G54D10*", 'tool')
+        self.assertToken("G01*", 'interp')
+        self.assertToken("G75*", 'quad')
+        self.assertToken("G36*", 'regionon')
+        self.assertToken("G37*", 'regionoff')
+        self.assertToken("G70*", 'units')
+        self.assertToken("G90*", 'absrel')
+        self.assertToken("G04 Comment*", 'comm')
+        self.assertToken("M02*", 'eof')
+
+    def test_unrecognized(self):
+        self.assertEqual(self.gerber.tokenize(""), (None, None))
+        self.assertToken("%IPPOS*%", None)
+        self.assertToken("G01X1I1*", None)
+        self.assertToken("M00*", None)
+
+    def test_unanchored_format(self):
+        # FS was always searched anywhere in the line and
+        # took precedence over comments.
+        self.assertToken("G04 x %FSLAX24Y24*%", 'fmt')
+
+    def test_legacy_files(self):
+        path = os.path.join(os.path.dirname(__file__), 'gerber_files')
+        for filename in sorted(os.listdir(path)):
+            with open(os.path.join(path, filename), 'r') as gfile:
+                glines = list(camlib.Gerber.line_statements(gfile))
+            self.assertGreater(len(glines), 0)
+            for gline in glines:
+                token, match = self.gerber.tokenize(gline)
+                legacy_token, legacy_match = legacy_tokenize(self.gerber, gline)
+                self.assertEqual(token, legacy_token, "%s: %s" % (filename, gline))
+                if match is not None:
+                    self.assertEqual(match.groups(), legacy_match.groups(), "%s: %s" % (filename, gline))
+
+
+if __name__ == '__main__':
+    unittest.main()
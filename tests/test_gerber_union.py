@@ -0,0 +1,56 @@
+import unittest
+import camlib
+from shapely.geometry import Point, box
+
+
+class TiledUnionTest(unittest.TestCase):
+
+    def setUp(self):
+        # Overlapping pads and traces, many crossing tile borders.
+        self.polygons = []
+        for i in range(12):
+            for j in range(12):
+                self.polygons.append(Point(i * 0.5, j * 0.5).buffer(0.2 + 0.04 * ((i + j) % 3)))
+        for i in range(6):
+            self.polygons.append(box(0, i * 1.1, 6, i * 1.1 + 0.1))
+
+    def assertSameGeometry(self, geo1, geo2):
+        # Boolean ops between results of union by buffer are very
+        # slow, so compare their measures instead.
+        self.assertAlmostEqual(geo1.area, geo2.area, places=6)
+        self.assertAlmostEqual(geo1.length, geo2.length, places=6)
+        for b1, b2 in zip(geo1.bounds, geo2.bounds):
+            self.assertAlmostEqual(b1, b2, places=6)
+        self.assertEqual(len(getattr(geo1, 'geoms', [geo1])),
+                         len(getattr(geo2, 'geoms', [geo2])))
+
+    def test_matches_serial(self):
+        for use_buffer in [True, False]:
+            serial = camlib.union_polygons(self.polygons, use_buffer)
+            for tiles in [2, 3, 5]:
+                tiled = camlib.tiled_union(self.polygons, tiles=tiles, workers=1,
+                                           use_buffer=use_buffer)
+                self.assertSameGeometry(tiled, serial)
+
+    def test_process_pool(self):
+        serial = camlib.union_polygons(self.polygons)
+        tiled = camlib.tiled_union(self.polygons, tiles=4, workers=2)
+        self.assertSameGeometry(tiled, serial)
+
+    def test_disjoint(self):
+        polygons = [Point(i * 3, 0).buffer(1) for i in range(4)]
+        tiled = camlib.tiled_union(polygons, tiles=4, workers=1)
+        self.assertEqual(len(tiled.geoms), 4)
+
+    def test_parse_file(self):
+        serial = camlib.Gerber()
+        serial.parse_file("tests/gerber_files/STM32F4-spindle.cmp")
+        tiled = camlib.Gerber()
+        tiled.union_tiles = 3
+        tiled.union_workers = 2
+        tiled.parse_file("tests/gerber_files/STM32F4-spindle.cmp")
+        self.assertSameGeometry(tiled.solid_geometry, serial.solid_geometry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from numpy import cos, pi
+from shapely.geometry import LineString, Point, box
+
+import camlib
+
+
+class IsolationPassesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.geometry = camlib.Geometry()
+        self.geometry.solid_geometry = camlib.cascaded_union(
+            [box(0, 0, 1, 0.5), Point(2, 0.25).buffer(0.3), LineString([(0, 1), (2, 1.5)]).buffer(0.05),
+             Point(3, 3).buffer(0.1)])
+        dia, overlap = 0.1, 0.15
+        self.offsets = [(2 * i + 1) / 2.0 * dia - i * overlap * dia for i in range(6)]
+
+    def test_independent(self):
+        expected = [self.geometry.isolation_geometry(offset) for offset in self.offsets]
+        for workers in [1, 2]:
+            passes = self.geometry.isolation_passes(self.offsets, workers=workers)
+            self.assertEqual(len(passes), len(self.offsets))
+            for geo, exp in zip(passes, expected):
+                self.assertTrue(geo.equals_exact(exp, 1e-12))
+
+    def test_incremental(self):
+        passes = self.geometry.isolation_passes(self.offsets, incremental=True)
+        for geo, offset in zip(passes, self.offsets):
+            exp = self.geometry.isolation_geometry(offset)
+            self.assertEqual(len(geo.geoms), len(exp.geoms))
+            # About the error of the arcs in the buffer itself.
+            self.assertLess(geo.hausdorff_distance(exp), 2 * offset * (1 - cos(pi / 64)))
+
+        # Simplified before buffering again, the number of points
+        # does not grow from pass to pass.
+        points = [stats["points"] for stats in self.geometry.isolation_stats]
+        self.geometry.isolation_passes(self.offsets)
+        for p, q in zip(points, [stats["points"] for stats in self.geometry.isolation_stats]):
+            self.assertLess(p, 2.5 * q)
+
+    def test_not_growing(self):
+        # Passes that do not grow are buffered from the geometry.
+        offsets = [0.1, 0.05, 0.2]
+        passes = self.geometry.isolation_passes(offsets, incremental=True)
+        self.assertTrue(passes[1].equals_exact(self.geometry.isolation_geometry(0.05), 1e-12))
+        self.assertLess(passes[2].hausdorff_distance(self.geometry.isolation_geometry(0.2)), 2e-4)
+
+    def test_stats(self):
+        for incremental in [False, True]:
+            self.geometry.isolation_passes(self.offsets, incremental=incremental, workers=2)
+            stats = self.geometry.isolation_stats
+            self.assertEqual([s["offset"] for s in stats], self.offsets)
+            for s in stats:
+                self.assertGreaterEqual(s["time"], 0)
+                self.assertGreater(s["points"], 0)
+
+    def test_empty(self):
+        self.geometry.solid_geometry = camlib.MultiPolygon()
+        for incremental in [False, True]:
+            passes = self.geometry.isolation_passes(self.offsets, incremental=incremental, workers=2)
+            self.assertTrue(all(geo.is_empty for geo in passes))
+            self.assertEqual([s["points"] for s in self.geometry.isolation_stats], [0] * 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
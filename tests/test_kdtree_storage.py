@@ -0,0 +1,109 @@
+import unittest
+
+import numpy as np
+from shapely.geometry import LineString, LinearRing, Point
+
+from camlib import FlatCAMRTreeStorage, FlatCAMKDTreeStorage
+
+
+def get_pts(o):
+    return [o.coords[0], o.coords[-1]]
+
+
+def mkstorage(cls, paths):
+    storage = cls()
+    storage.get_points = get_pts
+    for p in paths:
+        storage.insert(p)
+    return storage
+
+
+def random_paths(n, seed=0):
+    rs = np.random.RandomState(seed)
+    return [LineString(rs.rand(2, 2) * 10) for _ in range(n)]
+
+
+class KDTreeStorageTest(unittest.TestCase):
+
+    def pop_all(self, storage, start=(0, 0)):
+        """
+        Takes the nearest path and moves to its other end until
+        the storage is empty.
+
+        :return: Distance of every step.
+        """
+        steps = []
+        current = start
+        try:
+            while True:
+                pt, geo = storage.nearest(current)
+                storage.remove(geo)
+                steps.append(Point(current).distance(Point(pt)))
+                current = geo.coords[-1] if pt == geo.coords[0] else geo.coords[0]
+        except StopIteration:
+            pass
+        return steps
+
+    def test_same_as_rtree(self):
+        paths = random_paths(500)
+        rtree = self.pop_all(mkstorage(FlatCAMRTreeStorage, paths))
+        kdtree = self.pop_all(mkstorage(FlatCAMKDTreeStorage, paths))
+        self.assertEqual(len(kdtree), 500)
+        self.assertTrue(np.allclose(kdtree, rtree))
+
+    def test_nearest(self):
+        paths = [LineString([(0, 0), (1, 0)]), LineString([(5, 5), (2, 2)]), LinearRing([(3, 0), (4, 0), (4, 1)])]
+        storage = mkstorage(FlatCAMKDTreeStorage, paths)
+        pt, geo = storage.nearest((2.5, 2.4))
+        self.assertEqual(pt, (2.0, 2.0))
+        self.assertIs(geo, paths[1])
+        self.assertIs(storage.nearest((3.1, 0.1))[1], paths[2])
+
+        storage.remove(paths[1])
+        self.assertIs(storage.nearest((2.5, 2.4))[1], paths[2])
+        self.assertEqual(list(storage.get_objects()), [paths[0], paths[2]])
+
+        storage.remove(paths[0])
+        storage.remove(paths[2])
+        self.assertRaises(StopIteration, storage.nearest, (0, 0))
+
+    def test_ties(self):
+        # The first inserted of equally near points.
+        paths = [LineString([(1, 0), (2, 0)]), LineString([(0, 1), (0, 2)]), LineString([(-1, 0), (-2, 0)])]
+        storage = mkstorage(FlatCAMKDTreeStorage, paths)
+        self.assertIs(storage.nearest((0, 0))[1], paths[0])
+        storage.neighbors = 1
+        storage.remove(paths[0])
+        self.assertIs(storage.nearest((0, 0))[1], paths[1])
+
+    def test_insert_after_build(self):
+        storage = mkstorage(FlatCAMKDTreeStorage, random_paths(100))
+        storage.nearest((0, 0))
+        line = LineString([(20, 20), (21, 21)])
+        storage.insert(line)
+        self.assertIs(storage.nearest((19, 19))[1], line)
+
+        # Not all in the tree.
+        self.assertLess(storage.built, storage.size)
+        self.assertEqual(len(self.pop_all(storage)), 101)
+
+    def test_rebuild(self):
+        storage = mkstorage(FlatCAMKDTreeStorage, random_paths(1000))
+        steps = self.pop_all(storage)
+        self.assertEqual(len(steps), 1000)
+        # Built again as paths were removed.
+        self.assertLess(len(storage.tree_ids), 1000)
+
+    def test_reinsert(self):
+        # As when editing a shape.
+        line = LineString([(0, 0), (1, 0)])
+        storage = mkstorage(FlatCAMKDTreeStorage, [line])
+        storage.remove(line)
+        line.coords = [(3, 3), (4, 4)]
+        storage.insert(line)
+        self.assertEqual(storage.nearest((0, 0)), ((3.0, 3.0), line))
+        self.assertEqual(list(storage.get_objects()), [line])
+
+
+if __name__ == '__main__':
+    unittest.main()
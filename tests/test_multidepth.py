@@ -0,0 +1,77 @@
+import unittest
+from decimal import Decimal
+
+from shapely.geometry import LineString, LinearRing
+
+import camlib
+
+
+class DepthScheduleTest(unittest.TestCase):
+
+    def test_schedule(self):
+        depths = camlib.CNCjob.depth_schedule(-0.05, 0.02)
+        self.assertEqual(depths, [Decimal('-0.02'), Decimal('-0.04'), Decimal('-0.05')])
+
+    def test_exact(self):
+        depths = camlib.CNCjob.depth_schedule(-0.3, 0.1)
+        self.assertEqual(len(depths), 3)
+        self.assertEqual(depths[-1], Decimal('-0.3'))
+
+    def test_single_pass(self):
+        self.assertEqual(camlib.CNCjob.depth_schedule(-0.05), [Decimal('-0.05')])
+        self.assertEqual(camlib.CNCjob.depth_schedule(-0.05, 0), [Decimal('-0.05')])
+
+    def test_above_material(self):
+        self.assertEqual(camlib.CNCjob.depth_schedule(0.1, 0.02), [])
+
+
+class MultiDepthPassesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.job = camlib.CNCjob(z_cut=-0.05)
+        self.depths = self.job.depth_schedule(self.job.z_cut, 0.02)
+
+    def passes(self, linear, zdownrate=None, modal=False):
+        self.job.zdownrate = zdownrate
+        self.job.modal_gcode = modal
+        writer = self.job.gcode_writer()
+        end = self.job.linear2gcode_passes(linear, self.depths, writer=writer)
+        return writer.getvalue(), end
+
+    def expected(self, linear, reverse):
+        gcode = ""
+        for depth in self.depths:
+            gcode += self.job.linear2gcode(linear, zcut=depth, up=False)
+            if reverse:
+                linear = LineString(list(linear.coords)[::-1])
+        return gcode
+
+    def test_open_path(self):
+        line = LineString([(0, 0), (1, 0), (1, 1)])
+        gcode, end = self.passes(line)
+        self.assertEqual(gcode, self.expected(line, True))
+        self.assertEqual(end, (1, 1))
+
+        self.depths = self.depths[:2]
+        gcode, end = self.passes(line)
+        self.assertEqual(end, (0, 0))
+
+    def test_closed_path(self):
+        ring = LinearRing([(0, 0), (1, 0), (1, 1)])
+        gcode, end = self.passes(ring, zdownrate=5.0)
+        self.assertEqual(gcode, self.expected(ring, False))
+        self.assertEqual(end, (0, 0))
+
+    def test_modal(self):
+        line = LineString([(0, 0), (1, 0), (1, 1)])
+        gcode, _ = self.passes(line, modal=True)
+        self.assertEqual(gcode, "G00 X0.0000Y0.0000\nG01 Z-0.0200\nX1.0000\nY1.0000\n"
+                                "Z-0.0400\nY0.0000\nX0.0000\n"
+                                "Z-0.0500\nX1.0000\nY1.0000\n")
+
+    def test_no_passes(self):
+        self.assertIsNone(self.job.linear2gcode_passes(LineString([(0, 0), (1, 0)]), []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -96,6 +96,21 @@ class PaintConnectTest(PaintTestCase):
 
         # self.plot_summary_A(paths, tooldia, result, "WALK expected.")
 
+    def test_walk_along_edge(self):
+        print "Test: WALK along the edge Expected"
+        # Lines ending on the slanted edge of the paint margin, as
+        # made by clear_polygon2().
+        boundary = Polygon([[0, 0], [5, 0], [5, 1], [0, 4]])
+        tooldia = 0.2
+        margin = boundary.buffer(-tooldia / 2)
+        paths = [margin.intersection(LineString([[-1, y], [6, y]])) for y in [1.5, 1.8, 2.1, 2.4, 2.7]]
+
+        result = Geometry.paint_connect(mkstorage(deepcopy(paths)), boundary, tooldia)
+
+        result = list(result.get_objects())
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(result[0].coords), 10)
+
     def test_no_jump1(self):
         print "Test: FLY Expected"
         paths = [
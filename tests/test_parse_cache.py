@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import camlib
+from FlatCAMParseCache import ParseCache, parse_file_encoded
+
+
+class ParseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ParseCache(os.path.join(self.path, 'parse_cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def parse_gerber(self, filename, settings=None):
+        gerber = camlib.Gerber()
+        hit = self.cache.parse(gerber, "gerber", filename, settings or {},
+                               lambda: gerber.parse_file(filename))
+        return gerber, hit
+
+    def test_gerber_roundtrip(self):
+        filename = "tests/gerber_files/STM32F4-spindle.cmp"
+        parsed, hit = self.parse_gerber(filename)
+        self.assertFalse(hit)
+
+        cached, hit = self.parse_gerber(filename)
+        self.assertTrue(hit)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+        self.assertEqual(cached.units, parsed.units)
+        self.assertEqual(sorted(cached.apertures.keys()), sorted(parsed.apertures.keys()))
+        self.assertEqual(cached.solid_geometry.area, parsed.solid_geometry.area)
+        self.assertTrue(cached.solid_geometry.equals_exact(parsed.solid_geometry, 0))
+
+    def test_aperture_macros(self):
+        gerber = camlib.Gerber()
+        macro = camlib.ApertureMacro(name="THERMAL80")
+        macro.append("7,0,0,0.08,0.06,0.01,0")
+        gerber.aperture_macros["THERMAL80"] = macro
+        gerber.aperture_parse("14", "THERMAL80", None)
+
+        decoded = ParseCache.decode(ParseCache.encode(gerber.apertures))
+        self.assertIsInstance(decoded["14"]["macro"], camlib.ApertureMacro)
+        self.assertEqual(decoded["14"]["macro"].raw, macro.raw)
+
+    def test_excellon_roundtrip(self):
+        filename = "tests/excellon_files/case1.drl"
+
+        def parse_excellon():
+            excellon = camlib.Excellon()
+
+            def parse():
+                excellon.parse_file(filename)
+                excellon.create_geometry()
+
+            return excellon, self.cache.parse(excellon, "excellon", filename, {}, parse)
+
+        parsed, hit = parse_excellon()
+        self.assertFalse(hit)
+        cached, hit = parse_excellon()
+        self.assertTrue(hit)
+
+        self.assertEqual(cached.tools, parsed.tools)
+        self.assertEqual(len(cached.drills), len(parsed.drills))
+        for d1, d2 in zip(cached.drills, parsed.drills):
+            self.assertEqual(d1['tool'], d2['tool'])
+            self.assertTrue(d1['point'].equals(d2['point']))
+
+    def test_settings_change_key(self):
+        filename = "tests/gerber_files/simple1.gbr"
+        self.parse_gerber(filename, {"steps_per_circ": 40})
+        _, hit = self.parse_gerber(filename, {"steps_per_circ": 64})
+        self.assertFalse(hit)
+        self.assertEqual(len(self.cache.entries()), 2)
+
+    def test_lru_eviction(self):
+        files = ["tests/gerber_files/simple1.gbr",
+                 "tests/gerber_files/detector_contour.gbr",
+                 "tests/gerber_files/detector_copper_top.gbr"]
+        for filename in files:
+            self.parse_gerber(filename)
+        entries = self.cache.entries()
+        self.assertEqual(len(entries), 3)
+
+        # Use the first one so the second becomes the oldest.
+        past = time.time() - 100
+        for i, (key, _, _) in enumerate(entries):
+            os.utime(self.cache.entry_path(key), (past + i, past + i))
+        self.parse_gerber(files[0])
+
+        self.cache.max_size = self.cache.size() - 1
+        self.assertEqual(self.cache.evict(), 1)
+        remaining = [e[0] for e in self.cache.entries()]
+        self.assertNotIn(entries[1][0], remaining)
+        self.assertIn(entries[0][0], remaining)
+
+    def test_clear(self):
+        self.parse_gerber("tests/gerber_files/simple1.gbr")
+        self.assertEqual(self.cache.clear(), 1)
+        self.assertEqual(self.cache.entries(), [])
+        _, hit = self.parse_gerber("tests/gerber_files/simple1.gbr")
+        self.assertFalse(hit)
+
+
+class OpenSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_detect_file_kind(self):
+        self.assertEqual(camlib.detect_file_kind("tests/gerber_files/STM32F4-spindle.cmp"), "gerber")
+        self.assertEqual(camlib.detect_file_kind("tests/gerber_files/detector_drill.txt"), "excellon")
+        self.assertEqual(camlib.detect_file_kind("tests/excellon_files/case1.drl"), "excellon")
+
+        gcode = os.path.join(self.path, "job.txt")
+        with open(gcode, 'w') as f:
+            f.write("G20\nG90\nG00 Z0.1\nG00 X1.0 Y2.0\nG01 Z-0.002 F3.0\nM05\n")
+        self.assertEqual(camlib.detect_file_kind(gcode), "cncjob")
+
+        unknown = os.path.join(self.path, "readme.txt")
+        with open(unknown, 'w') as f:
+            f.write("Board revision 2\n")
+        self.assertIsNone(camlib.detect_file_kind(unknown))
+
+        # Falls back to the extension
+        drills = os.path.join(self.path, "empty.drl")
+        open(drills, 'w').close()
+        self.assertEqual(camlib.detect_file_kind(drills), "excellon")
+
+    def test_parse_file_encoded(self):
+        filename = "tests/gerber_files/simple1.gbr"
+        parsed = camlib.Gerber()
+        parsed.parse_file(filename)
+
+        settings = {"units": parsed.units, "steps_per_circ": parsed.steps_per_circ, "arc_tolerance": 0.0,
+                    "use_buffer_for_union": True, "follow": False}
+        data, error = parse_file_encoded(("gerber", filename, settings))
+        self.assertIsNone(error)
+
+        gerber = camlib.Gerber()
+        ParseCache.restore(gerber, "gerber", data)
+        self.assertTrue(gerber.solid_geometry.equals_exact(parsed.solid_geometry, 0))
+
+        data, error = parse_file_encoded(("gerber", os.path.join(self.path, "missing.gbr"), settings))
+        self.assertIsNone(data)
+        self.assertIn("IOError", error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import unittest
+
+import camlib
+
+
+class ParseProfileTest(unittest.TestCase):
+
+    def test_disabled_by_default(self):
+        gerber = camlib.Gerber()
+        gerber.parse_file("tests/gerber_files/simple1.gbr")
+        self.assertIsNone(gerber.profile)
+
+    def test_gerber(self):
+        filename = "tests/gerber_files/STM32F4-spindle.cmp"
+        gerber = camlib.Gerber()
+        gerber.profile = camlib.ParseProfile("gerber", filename)
+        gerber.parse_file(filename)
+
+        statements = list(camlib.Gerber.line_statements(open(filename)))
+        report = gerber.profile.report()
+        self.assertEqual(report['lines'], len(statements))
+        self.assertEqual(report['statements']['ad'], len(gerber.apertures))
+        self.assertEqual(report['statements']['am1'], len(gerber.aperture_macros))
+        self.assertEqual(report['polygons_after_union'], len(gerber.solid_geometry.geoms))
+        self.assertGreater(report['polygons_before_union'], report['polygons_after_union'])
+
+        times = report['times']
+        self.assertGreater(times['union'], 0)
+        self.assertLessEqual(times['regex'] + times['geometry'] + times['union'], times['total'])
+
+        self.assertEqual(json.loads(gerber.profile.to_json()), json.loads(json.dumps(report)))
+
+    def test_excellon(self):
+        filename = "tests/gerber_files/detector_drill.txt"
+        excellon = camlib.Excellon()
+        excellon.profile = camlib.ParseProfile("excellon", filename)
+        excellon.parse_file(filename)
+        excellon.create_geometry()
+
+        report = excellon.profile.report()
+        self.assertEqual(report['lines'], len(open(filename).readlines()))
+        self.assertEqual(report['statements']['toolset'], len(excellon.tools))
+        self.assertEqual(report['statements']['coordsnoperiod'] + report['statements'].get('coordsperiod', 0),
+                         len(excellon.drills))
+        self.assertEqual(report['polygons_after_union'], len(excellon.drills))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+
+import numpy as np
+from shapely.geometry import LineString, LinearRing, Point
+
+import camlib
+
+
+def random_paths(n, seed=0):
+    rs = np.random.RandomState(seed)
+    paths = [LineString(rs.rand(3, 2) + rs.rand(2) * 10) for _ in range(n)]
+    paths += [LinearRing(rs.rand(1, 2) * 10 + 0.2 * np.array([[np.cos(a), np.sin(a)]
+                                                                for a in np.linspace(0, 6, 12)]))
+              for _ in range(n)]
+    paths += [Point(rs.rand(2) * 10) for _ in range(n // 4)]
+    return paths
+
+
+class PathOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = random_paths(100)
+
+    def assertSamePaths(self, ordered, paths=None, rings=False):
+        """
+        Same paths, open ones maybe reversed and closed ones
+        maybe entered at another vertex if ``rings``.
+        """
+        def key(geo):
+            coords = list(geo.coords)
+            if camlib.is_closed_path(geo):
+                if rings:
+                    coords = sorted(coords[:-1])
+            else:
+                coords = min(coords, coords[::-1])
+            return type(geo).__name__, coords
+
+        self.assertEqual(sorted(key(geo) for geo in ordered),
+                         sorted(key(geo) for geo in (self.paths if paths is None else paths)))
+
+    def test_travel(self):
+        paths = [LineString([(0, 1), (0, 2)]), Point(3, 2)]
+        self.assertAlmostEqual(camlib.path_travel(paths), 4.0)
+        self.assertAlmostEqual(camlib.path_travel(paths, end=(3, 0)), 6.0)
+        self.assertAlmostEqual(camlib.path_travel(paths, returns=True), 1 + 10 ** 0.5)
+        self.assertEqual(camlib.path_travel([]), 0.0)
+
+    def test_greedy(self):
+        paths = [LineString([(5, 0), (6, 0)]), LineString([(2, 0), (1, 0)]), LinearRing([(3, 0), (3, 1), (4, 1)])]
+        ordered = camlib.greedy_path_order(paths)
+        self.assertEqual([list(geo.coords) for geo in ordered],
+                         [[(1, 0), (2, 0)], [(3, 0), (3, 1), (4, 1), (3, 0)], [(5, 0), (6, 0)]])
+
+    def test_rings(self):
+        paths = [LinearRing([(3, 3), (1, 0), (3, 0)])]
+        ordered = camlib.greedy_path_order(paths, rings=True)
+        self.assertEqual(list(ordered[0].coords), [(1, 0), (3, 0), (3, 3), (1, 0)])
+        self.assertEqual(type(ordered[0]), LinearRing)
+
+    def test_returns(self):
+        # Back at (0, 1) after the first path, so (0, 2) is nearest.
+        paths = [LineString([(0, 1), (5, 1)]), LineString([(0, 2), (4, 2)]), LineString([(5, 2), (6, 2)])]
+        ordered = camlib.greedy_path_order(paths, returns=True)
+        self.assertEqual(list(ordered[1].coords), [(0, 2), (4, 2)])
+
+    def test_methods(self):
+        greedy = camlib.path_travel(camlib.order_paths(self.paths))
+        for method in ["2opt", "rings"]:
+            for returns in [False, True]:
+                ordered = camlib.order_paths(self.paths, method=method, time_budget=10.0, returns=returns)
+                self.assertSamePaths(ordered, rings=(method == "rings"))
+                if not returns:
+                    self.assertLess(camlib.path_travel(ordered), greedy)
+        self.assertRaises(ValueError, camlib.order_paths, self.paths, method="tsp")
+
+    def test_end(self):
+        # Never longer than the greedy order, with the move to the end.
+        for seed in range(40):
+            paths = random_paths(5 + seed % 20, seed)
+            for returns in [False, True]:
+                greedy = camlib.order_paths(paths, returns=returns)
+                improved = camlib.order_paths(paths, method="2opt", time_budget=10.0, returns=returns, end=(0, 0))
+                self.assertSamePaths(improved, paths)
+                self.assertLessEqual(camlib.path_travel(improved, end=(0, 0), returns=returns),
+                                     camlib.path_travel(greedy, end=(0, 0), returns=returns) + 1e-9)
+
+    def test_ring_direction(self):
+        # Closed paths are never reversed.
+        ordered = camlib.order_paths(self.paths, method="2opt", time_budget=10.0)
+        rings = dict((sorted(geo.coords[:-1])[0], geo.is_ccw) for geo in self.paths if type(geo) == LinearRing)
+        for geo in ordered:
+            if type(geo) == LinearRing:
+                self.assertEqual(geo.is_ccw, rings[sorted(geo.coords[:-1])[0]])
+
+    def test_small(self):
+        for n in range(4):
+            for method in ["greedy", "2opt", "rings"]:
+                ordered = camlib.order_paths(self.paths[:n], method=method)
+                self.assertSamePaths(ordered, self.paths[:n], rings=True)
+
+
+class PathOrderCNCjobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.geometry = camlib.Geometry()
+        self.geometry.solid_geometry = random_paths(30)
+
+    def test_stats(self):
+        for order in ["greedy", "2opt", "rings"]:
+            job = camlib.CNCjob(z_cut=-0.05)
+            job.generate_from_geometry_2(self.geometry, order=order)
+            self.assertEqual(job.order_stats['method'], order)
+            self.assertEqual(job.order_stats['lifts'], len(self.geometry.solid_geometry))
+            self.assertGreater(job.order_stats['travel'], 0)
+            self.assertEqual(job.gcode.count("G01 Z"), len(self.geometry.solid_geometry))
+
+    def test_travel(self):
+        # The reported travel is that of the G-code.
+        job = camlib.CNCjob(z_cut=-0.05)
+        job.generate_from_geometry_2(self.geometry, order="2opt")
+        job.gcode_parse()
+        travel = sum(geo['geom'].length for geo in job.gcode_parsed if geo['kind'][0] == 'T')
+        self.assertAlmostEqual(travel, job.order_stats['travel'], places=3)
+
+    def test_empty(self):
+        job = camlib.CNCjob(z_cut=-0.05)
+        job.generate_from_geometry_2(camlib.Geometry())
+        self.assertEqual(job.order_stats['lifts'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
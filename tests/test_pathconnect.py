@@ -4,7 +4,7 @@ from shapely.geometry import LineString, Polygon
 from shapely.ops import cascaded_union, unary_union
 from matplotlib.pyplot import plot, subplot, show, cla, clf, xlim, ylim, title
 from camlib import *
-from random import random
+from random import random, shuffle
 
 
 def mkstorage(paths):
@@ -84,5 +84,77 @@ class PathConnectTest1(unittest.TestCase):
         matches = [p for p in result if p.equals(LineString([[0, 0], [1, 1], [2, 1]]))]
         self.assertEqual(len(matches), 1)
 
+    def test_long_chain(self):
+        # Shuffled and some reversed.
+        points = [[i, i % 2] for i in range(2001)]
+        paths = [LineString([points[i], points[i + 1]]) for i in range(2000)]
+        paths = [LineString(p.coords[::-1]) if i % 3 == 0 else p for i, p in enumerate(paths)]
+        shuffle(paths)
+        storage = mkstorage(paths)
+
+        result = Geometry.path_connect(storage)
+
+        result = list(result.get_objects())
+        self.assertEqual(len(result), 1)
+        # Joints only once and starting near the origin.
+        self.assertEqual([list(c) for c in result[0].coords], points)
+        self.assertEqual(list(storage.get_objects()), [])
+
+    def test_branch(self):
+        # Three lines meeting at (1, 1) make two paths.
+        paths = [
+            LineString([[0, 0], [1, 1]]),
+            LineString([[1, 1], [2, 1]]),
+            LineString([[1, 1], [1, 2]])
+        ]
+
+        result = Geometry.path_connect(mkstorage(paths))
+
+        result = list(result.get_objects())
+        self.assertEqual(len(result), 2)
+        self.assertEqual(sorted(len(p.coords) for p in result), [2, 3])
+        self.assertTrue(unary_union(result).equals(unary_union(paths)))
+
+    def test_loop(self):
+        paths = [
+            LineString([[0, 0], [1, 0]]),
+            LineString([[1, 1], [1, 0]]),
+            LineString([[1, 1], [0, 1]]),
+            LineString([[0, 1], [0, 0]])
+        ]
+
+        result = Geometry.path_connect(mkstorage(paths))
+
+        result = list(result.get_objects())
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(result[0].coords), 5)
+        self.assertEqual(result[0].coords[0], result[0].coords[-1])
+
+    def test_closed_line(self):
+        # A closed line is joined to others, but not to itself.
+        paths = [
+            LineString([[0, 0], [1, 0], [1, 1], [0, 0]]),
+            LineString([[0, 0], [-1, 0]])
+        ]
+
+        result = Geometry.path_connect(mkstorage(paths))
+
+        result = list(result.get_objects())
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(result[0].coords), 5)
+
+    def test_right_end(self):
+        # Joined at the start of the first path, found from its end.
+        paths = [
+            LineString([[2, 0], [3, 0]]),
+            LineString([[4, 0], [2, 0]])
+        ]
+
+        result = Geometry.path_connect(mkstorage(paths))
+
+        result = list(result.get_objects())
+        self.assertEqual(len(result), 1)
+        self.assertTrue(result[0].equals(LineString([[4, 0], [2, 0], [3, 0]])))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
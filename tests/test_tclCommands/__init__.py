@@ -15,4 +15,5 @@ from test_TclCommandNew import *
 from test_TclCommandNewGeometry  import *
 from test_TclCommandOpenExcellon import *
 from test_TclCommandOpenGerber import *
+from test_TclCommandOpenSet import *
 from test_TclCommandPaintPolygon import *
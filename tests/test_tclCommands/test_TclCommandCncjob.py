@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 from FlatCAMObj import FlatCAMGerber, FlatCAMGeometry, FlatCAMObj
 from test_TclCommandIsolate import *
 
@@ -14,4 +17,43 @@ def test_cncjob(self):
     self.fc.exec_command_test('cncjob %s_iso -tooldia 0.5 -z_cut 0.05 -z_move 3 -feedrate 300' % self.gerber_top_name)
     cam_top_obj = self.fc.collection.get_by_name(self.gerber_top_name + '_iso_cnc')
     self.assertTrue(isinstance(cam_top_obj, FlatCAMObj), "Expected FlatCAMObj, instead, %s is %s"
-                    % (self.gerber_top_name + '_iso_cnc', type(cam_top_obj)))
\ No newline at end of file
+                    % (self.gerber_top_name + '_iso_cnc', type(cam_top_obj)))
+
+def test_cncjob_order(self):
+    """
+    Test cncjob with optimized path order
+    :param self:
+    :return:
+    """
+
+    # reuse isolate tests
+    test_isolate(self)
+
+    self.fc.exec_command_test('cncjob %s_iso -tooldia 0.5 -z_cut 0.05 -z_move 3 -feedrate 300 -order 2opt'
+                              ' -outname %s_iso_ordered' % (self.gerber_top_name, self.gerber_top_name))
+    cam_top_obj = self.fc.collection.get_by_name(self.gerber_top_name + '_iso_ordered')
+    self.assertTrue(isinstance(cam_top_obj, FlatCAMObj), "Expected FlatCAMObj, instead, %s is %s"
+                    % (self.gerber_top_name + '_iso_ordered', type(cam_top_obj)))
+    self.assertEqual(cam_top_obj.order_stats['method'], '2opt')
+    self.assertGreater(cam_top_obj.order_stats['lifts'], 0)
+
+def test_cncjob_output(self):
+    """
+    Test cncjob written straight to a file
+    :param self:
+    :return:
+    """
+
+    # reuse isolate tests
+    test_isolate(self)
+
+    with tempfile.NamedTemporaryFile(prefix='unittest.', suffix="." + self.gerber_top_name + '.gcode', delete=True)\
+            as tmp_file:
+        output_filename = tmp_file.name
+    self.fc.exec_command_test('cncjob %s_iso -tooldia 0.5 -z_cut 0.05 -z_move 3 -feedrate 300'
+                              ' -outname %s_iso_file -output "%s"'
+                              % (self.gerber_top_name, self.gerber_top_name, output_filename))
+    self.assertIsNone(self.fc.collection.get_by_name(self.gerber_top_name + '_iso_file'))
+    with open(output_filename) as f:
+        self.assertIn("M05", f.read())
+    os.remove(output_filename)
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 from FlatCAMObj import FlatCAMObj
 from test_TclCommandOpenExcellon import *
 
@@ -16,3 +19,42 @@ def test_drillcncjob(self):
     cam_top_obj = self.fc.collection.get_by_name(self.excellon_name + '_cnc')
     self.assertTrue(isinstance(cam_top_obj, FlatCAMObj), "Expected FlatCAMObj, instead, %s is %s"
                     % (self.excellon_name + '_cnc', type(cam_top_obj)))
+
+
+def test_drillcncjob_order(self):
+    """
+    Test cncjob with optimized drill order
+    :param self:
+    :return:
+    """
+    # reuse open excellontests
+    test_open_excellon(self)
+
+    self.fc.exec_command_test('drillcncjob %s -tools all -drillz 0.5 -travelz 3 -feedrate 300 -order 2opt'
+                              ' -outname %s_ordered' % (self.excellon_name, self.excellon_name))
+    cam_top_obj = self.fc.collection.get_by_name(self.excellon_name + '_ordered')
+    self.assertTrue(isinstance(cam_top_obj, FlatCAMObj), "Expected FlatCAMObj, instead, %s is %s"
+                    % (self.excellon_name + '_ordered', type(cam_top_obj)))
+    before, after = cam_top_obj.drill_travel
+    self.assertLessEqual(after, before)
+
+
+def test_drillcncjob_output(self):
+    """
+    Test cncjob written straight to a file
+    :param self:
+    :return:
+    """
+    # reuse open excellontests
+    test_open_excellon(self)
+
+    with tempfile.NamedTemporaryFile(prefix='unittest.', suffix="." + self.excellon_name + '.gcode', delete=True)\
+            as tmp_file:
+        output_filename = tmp_file.name
+    self.fc.exec_command_test('drillcncjob %s -tools all -drillz 0.5 -travelz 3 -feedrate 300'
+                              ' -outname %s_file -output "%s"'
+                              % (self.excellon_name, self.excellon_name, output_filename))
+    self.assertIsNone(self.fc.collection.get_by_name(self.excellon_name + '_file'))
+    with open(output_filename) as f:
+        self.assertIn("M05", f.read())
+    os.remove(output_filename)
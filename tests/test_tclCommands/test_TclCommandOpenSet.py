@@ -0,0 +1,20 @@
+from FlatCAMObj import FlatCAMGerber, FlatCAMExcellon
+
+
+def test_open_set(self):
+    """
+    Test open all files in a directory
+    :param self:
+    :return:
+    """
+
+    self.fc.exec_command_test('open_set %s' % self.gerber_files)
+
+    for filename in [self.copper_top_filename, self.copper_bottom_filename, self.cutout_filename]:
+        gerber_obj = self.fc.collection.get_by_name(filename)
+        self.assertTrue(isinstance(gerber_obj, FlatCAMGerber), "Expected FlatCAMGerber, instead, %s is %s"
+                        % (filename, type(gerber_obj)))
+
+    excellon_obj = self.fc.collection.get_by_name(self.excellon_filename)
+    self.assertTrue(isinstance(excellon_obj, FlatCAMExcellon), "Expected FlatCAMExcellon, instead, %s is %s"
+                    % (self.excellon_filename, type(excellon_obj)))
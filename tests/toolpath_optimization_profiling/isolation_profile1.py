@@ -0,0 +1,24 @@
+# Compares independent and incremental isolation passes on the
+# test boards, pass by pass.
+import sys
+import time
+sys.path.append('../../')
+from camlib import *
+
+log.setLevel(logging.WARNING)
+
+dia = 0.008
+overlap = 0.15
+passes = 6
+offsets = [(2 * i + 1) / 2.0 * dia - i * overlap * dia for i in range(passes)]
+
+for filename in ["../gerber_files/STM32F4-spindle.cmp", "../gerber_files/detector_copper_top.gbr"]:
+    gerber = Gerber()
+    gerber.parse_file(filename)
+
+    for incremental, workers in [(False, 1), (False, 0), (True, 1)]:
+        t0 = time.time()
+        gerber.isolation_passes(offsets, incremental=incremental, workers=workers)
+        print "%s incremental=%s workers=%d: %.3f s" % (filename, incremental, workers, time.time() - t0)
+        for stats in gerber.isolation_stats:
+            print "    %(offset).4f: %(points)6d points, %(time).3f s" % stats
@@ -0,0 +1,22 @@
+import sys
+import time
+import cProfile
+import pstats
+sys.path.append('../../')
+from camlib import *
+from shapely.geometry import Point
+
+# Isolation-like rings around pads plus the lines clearing a polygon.
+paths = [Point(i % 40 * 0.1, i // 40 * 0.1).buffer(0.03).exterior for i in range(1600)]
+poly = Point(2, 2).buffer(1.5).difference(Point(2, 2).buffer(0.5))
+paths += list(Geometry.clear_polygon(poly, 0.05).get_objects())
+
+for method in ["greedy", "2opt", "rings"]:
+    t0 = time.time()
+    ordered = order_paths(paths, method=method)
+    print "%s: travel %.4f in %.3f s" % (method, path_travel(ordered), time.time() - t0)
+
+cProfile.run('result = order_paths(paths, method="2opt")',
+             'path_order_profile', sort='cumtime')
+p = pstats.Stats('path_order_profile')
+p.sort_stats('cumulative').print_stats(.1)
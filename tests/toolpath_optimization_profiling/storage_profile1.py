@@ -0,0 +1,37 @@
+# Compares the path storages on the "take the nearest and remove it"
+# workload of the path chaining loops.
+import sys
+import time
+sys.path.append('../../')
+from camlib import *
+from numpy.random import RandomState
+
+
+def get_pts(o):
+    return [o.coords[0], o.coords[-1]]
+
+
+def chain(storage):
+    current_pt = (0, 0)
+    try:
+        while True:
+            pt, geo = storage.nearest(current_pt)
+            storage.remove(geo)
+            current_pt = geo.coords[-1] if pt == geo.coords[0] else geo.coords[0]
+    except StopIteration:
+        pass
+
+
+rs = RandomState(0)
+for n in [1000, 10000]:
+    paths = [LineString(rs.rand(2, 2) * 100) for _ in range(n)]
+    for cls in [FlatCAMRTreeStorage, FlatCAMKDTreeStorage]:
+        t0 = time.time()
+        storage = cls()
+        storage.get_points = get_pts
+        for geo in paths:
+            storage.insert(geo)
+        t1 = time.time()
+        chain(storage)
+        t2 = time.time()
+        print "%s %d paths: insert %.3f s, chain %.3f s" % (cls.__name__, n, t1 - t0, t2 - t1)